@@ -2,27 +2,26 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import yt_dlp
-from yt_dlp.utils import download_range_func
 import threading
-import concurrent.futures
 import os
 import sys
-import re
-import sqlite3
 import shutil
-import tempfile
-import datetime
 import subprocess
+import tempfile
 import psutil
 import time
 import socket
+import unicodedata
 from PIL import Image, ImageDraw
 
+from download_engine import (DownloadEngine, DEFAULT_DB_PATH, get_ffmpeg_path,
+                             estimate_size, format_size_simple, format_bytes_per_sec)
+from remote_server import RemoteServer, SERVER_AVAILABLE
+from job_trace import timeline_text
+from batch_import import BatchImport, parse_links, read_links, progress_text
 
 try:
-    from flask import Flask, request, jsonify, render_template_string
     import qrcode
-    SERVER_AVAILABLE = True
 except ImportError:
     SERVER_AVAILABLE = False
 
@@ -64,32 +63,6 @@ def _safe_copy2(src, dst, *args, **kwargs):
 shutil.copy2 = _safe_copy2
 
 
-class StopDownloadException(Exception):
-    """Custom exception to stop yt-dlp download gracefully."""
-    pass
-
-class YTDLLogger:
-    """Custom logger that checks for cancellation at every message."""
-    def __init__(self, app, item_id):
-        self.app = app
-        self.item_id = item_id
-
-    def debug(self, msg): self._check_cancel()
-    def info(self, msg): 
-        # print(f"YT-DLP Info: {msg}") # Uncomment to see all info logs
-        self._check_cancel()
-        
-    def warning(self, msg): self._check_cancel()
-    
-    def error(self, msg): 
-        print(f"YT-DLP Error: {msg}")
-        self._check_cancel()
-
-    def _check_cancel(self):
-        if self.app.stop_all_flag or self.app.active_downloads.get(self.item_id, False):
-            print(f"YTDLLogger: Cancel detected for {self.item_id}")
-            raise StopDownloadException()
-
 class CTkContextMenu(ctk.CTkToplevel):
     def __init__(self, master, x, y, commands):
         super().__init__(master)
@@ -162,277 +135,265 @@ class CTkTooltip:
             self.tooltip_window.destroy()
             self.tooltip_window = None
 
-# --- HTML TEMPLATE FOR REMOTE ---
-REMOTE_HTML = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
-    <title>MDP Remote</title>
-    <style>
-        :root { --bg: #0F0F14; --panel: #1A1A24; --accent: #2196F3; --text: #FFFFFF; --text-dim: #A0A0A0; --danger: #F44336; --success: #4CAF50;}
-        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; background: var(--bg); color: var(--text); margin: 0; padding: 15px; }
-        .header { text-align: center; margin-bottom: 20px; }
-        .header h2 { margin: 0; font-size: 22px; color: var(--accent); }
-        .card { background: var(--panel); border-radius: 12px; padding: 15px; margin-bottom: 15px; box-shadow: 0 4px 6px rgba(0,0,0,0.3); }
-        input[type="text"] { width: 100%; box-sizing: border-box; padding: 12px; border-radius: 8px; border: 1px solid #333; background: #000; color: #fff; margin-bottom: 10px; font-size: 16px; }
-        button { background: var(--accent); color: white; border: none; padding: 12px; border-radius: 8px; font-size: 16px; font-weight: bold; width: 100%; cursor: pointer; transition: 0.2s; }
-        button:active { opacity: 0.8; }
-        .btn-group { display: flex; gap: 10px; margin-top: 10px; }
-        .btn-danger { background: var(--danger); }
-        .btn-success { background: var(--success); }
-        .item { border-bottom: 1px solid #333; padding: 12px 0; }
-        .item:last-child { border-bottom: none; }
-        .item-title { font-weight: 500; font-size: 14px; margin-bottom: 5px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; display: block; }
-        .item-meta { font-size: 12px; color: var(--text-dim); display: flex; justify-content: space-between; }
-        .progress-bar { height: 4px; background: #333; border-radius: 2px; margin-top: 8px; overflow: hidden; }
-        .progress-fill { height: 100%; background: var(--accent); width: 0%; transition: width 0.3s; }
-        .status-badge { font-size: 10px; padding: 2px 6px; border-radius: 4px; background: #333; }
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h2>🚀 Media Downloader Pro</h2>
-        <div id="global_status" style="font-size: 12px; color: var(--text-dim); margin-top: 5px;">Connecting...</div>
-    </div>
-    
-    <div class="card">
-        <input type="text" id="url_input" placeholder="Paste YouTube link here...">
-        <button onclick="addLink()">🔗 Add Download</button>
-    </div>
-    
-    <div class="card">
-        <div style="font-size: 14px; font-weight: bold; margin-bottom: 10px;">Control Panel</div>
-        <div class="btn-group">
-            <button class="btn-success" onclick="sendCommand('resume_all')">⏵ Resume</button>
-            <button style="background: #FF9800;" onclick="sendCommand('pause_all')">⏸ Pause</button>
-            <button class="btn-danger" onclick="sendCommand('stop_all')">⏹ Stop</button>
-        </div>
-    </div>
-
-    <div class="card" id="queue_container" style="display: none;">
-        <div style="font-size: 14px; font-weight: bold; margin-bottom: 10px;">📁 Queue</div>
-        <div id="items_list"></div>
-    </div>
-
-    <script>
-        function sendCommand(cmd, item_id=null, url=null) {
-            fetch('/api/action', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({command: cmd, item_id: item_id, url: url})
-            });
-        }
-        
-        function addLink() {
-            const input = document.getElementById('url_input');
-            const url = input.value.trim();
-            if (url) {
-                sendCommand('add_link', null, url);
-                input.value = ''; // clear
-            }
-        }
+class VirtualTreeview:
+    """Shows a long list of keys in a ttk.Treeview, materializing only the rows in
+    and around the viewport. Row contents come from row_values(key, pos), which
+    returns (values, tags); selection is tracked here so it survives rows being
+    scrolled out of the widget."""
+    MIN_MARGIN = 30  # rows kept above and below the viewport
+
+    def __init__(self, tree, scrollbar, row_values, row_height=36, iid_prefix="row_"):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_values = row_values
+        self.row_height = row_height
+        self.iid_prefix = iid_prefix
+
+        self.keys = []      # display order
+        self.pos = {}       # key -> index in keys
+        self.selected = set()
+        self.removed = set()
+        self.stale = set()  # materialized but off-screen rows whose data changed
+        self.start = self.end = 0  # materialized slice of keys
+        self.top = 0
+        self.render_pending = False
+
+        scrollbar.configure(command=self.on_scrollbar)
+        tree.configure(yscrollcommand=self.on_tree_scroll)
+        tree.bind("<<TreeviewSelect>>", self.on_select, add="+")
+        tree.bind("<ButtonPress-1>", self.on_press, add="+")
+        tree.bind("<Configure>", lambda e: self.render(self.top, force=True), add="+")
+
+    # --- Keys ---
+    def iid(self, key):
+        return f"{self.iid_prefix}{key}"
+
+    def key(self, iid):
+        raw = iid[len(self.iid_prefix):]
+        return int(raw) if raw.isdigit() else raw
+
+    def set_keys(self, keys, top=None):
+        """Replaces the whole list. top is the first visible row (default: unchanged)."""
+        self.keys = list(keys)
+        self.pos = {key: i for i, key in enumerate(self.keys)}
+        self.selected &= set(self.pos)
+        self.removed.clear()
+        self.render(self.top if top is None else top, force=True)
+
+    def append(self, key):
+        if key in self.pos: return
+        pos = len(self.keys)
+        self.pos[key] = pos
+        self.keys.append(key)
+        if pos == self.end and pos < self.top + self.page_size() + self.margin():
+            values, tags = self.row_values(key, pos)
+            self.tree.insert("", "end", iid=self.iid(key), values=values, tags=tags)
+            self.end = pos + 1
+        self.update_scrollbar()
+
+    def remove(self, key):
+        """Drops key. Positions are compacted once per burst of removals."""
+        if key not in self.pos or key in self.removed: return
+        self.removed.add(key)
+        self.selected.discard(key)
+        if self.tree.exists(self.iid(key)): self.tree.delete(self.iid(key))
+        if not self.render_pending:
+            self.render_pending = True
+            self.tree.after_idle(self._compact)
+
+    def _compact(self):
+        self.render_pending = False
+        if not self.removed: return
+        self.set_keys([k for k in self.keys if k not in self.removed])
+
+    def __len__(self):
+        return len(self.keys) - len(self.removed)
+
+    def __iter__(self):
+        return (k for k in self.keys if k not in self.removed)
+
+    # --- Rendering ---
+    def page_size(self):
+        return max(1, self.tree.winfo_height() // self.row_height)
+
+    def margin(self):
+        return max(self.page_size(), self.MIN_MARGIN)
+
+    def render(self, top, force=False):
+        """Scrolls so row top is first, rebuilding the materialized slice if top
+        moved too close to its edges."""
+        total, page, margin = len(self.keys), self.page_size(), self.margin()
+        top = max(0, min(top, total - page))
+        near_edge = ((top - self.start < page // 2 and self.start > 0) or
+                     (self.end - (top + page) < page // 2 and self.end < total))
+        if force or near_edge:
+            self.stale.clear()
+            start, end = max(0, top - margin), min(total, top + page + margin)
+            children = self.tree.get_children()
+            if children: self.tree.delete(*children)
+            for pos in range(start, end):
+                key = self.keys[pos]
+                if key in self.removed: continue
+                values, tags = self.row_values(key, pos)
+                self.tree.insert("", "end", iid=self.iid(key), values=values, tags=tags)
+            self.tree.selection_set([self.iid(k) for k in self.keys[start:end] if k in self.selected])
+            self.start, self.end = start, end
+        self.top = top
+        if self.stale:
+            for key in self.visible_keys():
+                if key in self.stale: self.refresh(key)
+        if self.end > self.start:
+            self.tree.yview_moveto((top - self.start) / (self.end - self.start))
+        self.update_scrollbar()
+
+    def refresh(self, key, visible_only=False):
+        """Redraws key's row if it is materialized. With visible_only, rows in the
+        off-screen margin are only marked and redrawn when scrolled into view."""
+        iid = self.iid(key)
+        if not self.tree.exists(iid): return
+        pos = self.pos[key]
+        if visible_only and not self.top <= pos < self.top + self.page_size():
+            self.stale.add(key)
+            return
+        self.stale.discard(key)
+        values, tags = self.row_values(key, pos)
+        self.tree.item(iid, values=values, tags=tags)
+
+    def refresh_all(self):
+        for key in self.keys[self.start:self.end]:
+            self.refresh(key)
+
+    def update_scrollbar(self):
+        total = len(self.keys)
+        if not total:
+            self.scrollbar.set(0, 1)
+            return
+        self.scrollbar.set(self.top / total, min(1, (self.top + self.page_size()) / total))
+
+    def see(self, key):
+        pos = self.pos.get(key)
+        if pos is None: return
+        page = self.page_size()
+        if pos < self.top:
+            self.render(pos)
+        elif pos >= self.top + page:
+            self.render(pos - page + 1)
+
+    def see_end(self):
+        self.render(len(self.keys))
+
+    def visible_keys(self):
+        """Keys currently on screen, e.g. to skip updates for scrolled-away rows."""
+        return self.keys[self.top:self.top + self.page_size()]
+
+    # --- Scrolling ---
+    def on_scrollbar(self, *args):
+        total, page = len(self.keys), self.page_size()
+        if args[0] == "moveto":
+            self.render(int(float(args[1]) * total))
+        elif args[0] == "scroll":
+            step = page if args[2] == "pages" else 1
+            self.render(self.top + int(args[1]) * step)
+
+    def on_tree_scroll(self, first, last):
+        """The Treeview scrolled itself (wheel, arrow keys, drag): follow it."""
+        if self.end <= self.start: return
+        top = self.start + round(float(first) * (self.end - self.start))
+        if top != self.top:
+            self.tree.after_idle(lambda: self.render(top))
+
+    # --- Selection ---
+    def on_press(self, event):
+        # A plain click replaces the selection, including rows scrolled out of view
+        if not event.state & 0x0005:  # Shift / Control
+            self.selected = {k for k in self.keys[self.start:self.end] if k in self.selected}
 
-        async function updateStatus() {
-            try {
-                const res = await fetch('/api/status');
-                const data = await res.json();
-                
-                document.getElementById('global_status').innerText = data.global_status || 'Ready';
-                
-                const list = document.getElementById('items_list');
-                const container = document.getElementById('queue_container');
-                
-                if (data.items.length > 0) {
-                    container.style.display = 'block';
-                    let html = '';
-                    data.items.forEach(item => {
-                        let isDone = item.status.includes('Done');
-                        let isError = item.status.includes('Error');
-                        let isDownloading = item.status.includes('Downloading');
-                        let color = isDone ? 'var(--success)' : (isError ? 'var(--danger)' : 'var(--accent)');
-                        
-                        let actionBtn = '';
-                        if (!isDone && !isError) {
-                            if (isDownloading) {
-                                actionBtn = `<button onclick="sendCommand('pause_item', '${item.id}')" style="width: auto; padding: 4px 10px; font-size: 10px; background: #FF9800; margin-left: 5px;">⏸</button>`;
-                            } else {
-                                actionBtn = `<button onclick="sendCommand('resume_item', '${item.id}')" style="width: auto; padding: 4px 10px; font-size: 10px; background: var(--success); margin-left: 5px;">⏵</button>`;
-                            }
-                        }
-
-                        html += `
-                            <div class="item">
-                                <div class="item-title">${item.title || 'Fetching...'}</div>
-                                <div class="item-meta">
-                                    <span>${item.size || '---'}</span>
-                                    <div style="display: flex; align-items: center;">
-                                        <span class="status-badge" style="color: ${color}">${item.status}</span>
-                                        ${actionBtn}
-                                    </div>
-                                </div>
-                                <div class="progress-bar">
-                                    <div class="progress-fill" style="width: ${item.progress}%; background: ${color};"></div>
-                                </div>
-                            </div>
-                        `;
-                    });
-                    list.innerHTML = html;
-                } else {
-                    container.style.display = 'none';
-                }
-            } catch (e) {
-                document.getElementById('global_status').innerText = 'Connection Lost';
-            }
-        }
-        
-        // Poll every 1.5 seconds
-        setInterval(updateStatus, 1500);
-        updateStatus(); // Initial call
-    </script>
-</body>
-</html>
-"""
-
-class RemoteServer:
-    def __init__(self, app_instance):
-        self.app_instance = app_instance
-        self.flask_app = Flask(__name__)
-        self.setup_routes()
-        
-    def setup_routes(self):
-        @self.flask_app.route('/')
-        def index():
-            return render_template_string(REMOTE_HTML)
-            
-        @self.flask_app.route('/api/status')
-        def status():
-            # Gather state from app_instance
-            tree = self.app_instance.tree
-            items = []
-            if tree and self.app_instance.root.winfo_exists():
-                for item_id in tree.get_children():
-                    vals = tree.item(item_id, "values")
-                    if vals:
-                        try:
-                            db_id = int(item_id.replace("db_", ""))
-                            perc = 0
-                            spd = ""
-                            status_text = vals[7]
-                            if "(" in status_text and "%" in status_text: # e.g. 45.2% (1.5MiB/s)
-                                parts = status_text.split("(", 1)
-                                try: perc = float(parts[0].replace("%", "").strip())
-                                except: pass
-                                spd = parts[1].replace(")", "").strip()
-                                
-                            items.append({
-                                "id": db_id,
-                                "tree_id": item_id,
-                                "title": vals[2],
-                                "size": vals[6],
-                                "status": status_text,
-                                "progress": perc,
-                                "speed": spd
-                            })
-                        except Exception as e:
-                            print(f"Error parsing item for remote: {e}")
-                            pass
-            
-            return jsonify({
-                "items": items,
-                "global_progress": self.app_instance.progress_var.get(),
-                "global_status": self.app_instance.status_label.cget("text")
-            })
-            
-        @self.flask_app.route('/api/action', methods=['POST'])
-        def action():
-            data = request.json
-            cmd = data.get('command')
-            item_id = data.get('item_id') # Optional, for specific item
-            
-            def dispatch():
-                if cmd == 'stop_all': self.app_instance.stop_all()
-                elif cmd == 'pause_all':
-                    # Select all downloading and pause
-                    active = [i for i in self.app_instance.tree.get_children() if "Downloading" in self.app_instance.tree.item(i, "values")[7]]
-                    self.app_instance.tree.selection_set(active)
-                    self.app_instance.pause_selected()
-                elif cmd == 'resume_all':
-                    # Select queued/paused and resume
-                    paused = [i for i in self.app_instance.tree.get_children() if self.app_instance.tree.item(i, "values")[7] in ["Paused", "Queued", "Error", "Stopped"]]
-                    self.app_instance.tree.selection_set(paused)
-                    self.app_instance.resume_selected()
-                elif cmd == 'pause_item' and item_id:
-                    tree_id = f"db_{item_id}"
-                    if self.app_instance.tree.exists(tree_id):
-                        self.app_instance.tree.selection_set((tree_id,))
-                        self.app_instance.pause_selected()
-                elif cmd == 'resume_item' and item_id:
-                    tree_id = f"db_{item_id}"
-                    if self.app_instance.tree.exists(tree_id):
-                        self.app_instance.tree.selection_set((tree_id,))
-                        self.app_instance.resume_selected()
-                elif cmd == 'add_link':
-                    url = data.get('url')
-                    if url: self.app_instance.fetch_and_add(url, "Full Video")
-            
-            # Must run UI commands on main thread
-            self.app_instance.root.after(0, dispatch)
-            return jsonify({"status": "ok"})
-
-    def run(self):
-        # Run on 0.0.0.0 to allow LAN access
-        import logging
-        log = logging.getLogger('werkzeug')
-        log.setLevel(logging.ERROR) # Quiet the output
-        self.flask_app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
-
-# Default config
-
-def get_ffmpeg_path():
-    """Locates and returns the path to the ffmpeg executable or 'ffmpeg'."""
-    if hasattr(sys, '_MEIPASS'):
-        base_dir = sys._MEIPASS
-    else:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Priority: 1. Application Directory, 2. 'bin' subdirectory
-    search_paths = [base_dir, os.path.join(base_dir, 'bin'), os.path.join(base_dir, 'ffmpeg')]
-    for path in search_paths:
-        exe = os.path.join(path, 'ffmpeg.exe')
-        if os.path.exists(exe):
-            return os.path.abspath(exe)
-            
-    # Check system PATH
-    try:
-        if subprocess.run(['ffmpeg', '-version'], capture_output=True).returncode == 0:
-            return 'ffmpeg'
-    except: pass
-        
-    return None
+    def on_select(self, event=None):
+        window = self.keys[self.start:self.end]
+        self.selected.difference_update(window)
+        self.selected.update(self.key(iid) for iid in self.tree.selection())
+
+    def selection(self):
+        """Selected keys in display order."""
+        return sorted((k for k in self.selected if k in self.pos), key=self.pos.get)
+
+    def select(self, keys):
+        self.selected = set(keys) & set(self.pos)
+        self.tree.selection_set([self.iid(k) for k in self.keys[self.start:self.end] if k in self.selected])
+
+    def select_all(self):
+        self.select(self.keys)
+
+
+class Bitset:
+    """Growable set of entry indices packed one bit per index, e.g. the checked
+    rows of a 50k-entry channel in 6 KB."""
+    def __init__(self):
+        self.size = 0
+        self.bits = bytearray()
 
-def parse_time(time_str):
-    """Converts hh:mm:ss or mm:ss into total seconds for yt-dlp."""
-    if not time_str or time_str.strip().lower() == "end":
-        return None
-    parts = time_str.strip().split(':')
-    parts.reverse()
-    total_seconds = 0
-    for i, part in enumerate(parts):
-        total_seconds += int(part) * (60 ** i)
-    return total_seconds
+    def __getitem__(self, i):
+        return bool(self.bits[i >> 3] >> (i & 7) & 1)
+
+    def __setitem__(self, i, value):
+        if value:
+            self.bits[i >> 3] |= 1 << (i & 7)
+        else:
+            self.bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+    def extend(self, n, value=False):
+        """Adds n indices, all set to value."""
+        start = self.size
+        self.size += n
+        self.bits.extend(bytes((self.size + 7) // 8 - len(self.bits)))
+        if value: self.fill(True, start)
+
+    def fill(self, value, start=0):
+        """Sets every index from start on to value."""
+        first = (start + 7) // 8  # first whole byte
+        for i in range(start, min(self.size, first * 8)):
+            self[i] = value
+        if first * 8 >= self.size: return
+        self.bits[first:] = (b"\xff" if value else b"\x00") * (len(self.bits) - first)
+        if value and self.size % 8:
+            self.bits[-1] &= (1 << (self.size % 8)) - 1  # keep the padding clear for count()
+
+    def count(self):
+        return bin(int.from_bytes(self.bits, "little")).count("1")
+
+    def indices(self, exclude=None):
+        """Set indices in ascending order, skipping those set in exclude."""
+        for n, byte in enumerate(self.bits):
+            if exclude is not None and n < len(exclude.bits): byte &= ~exclude.bits[n]
+            while byte:
+                low = byte & -byte
+                yield n * 8 + low.bit_length() - 1
+                byte ^= low
+
+
+def normalize_title(title):
+    """Case- and width-folded title for filtering."""
+    return unicodedata.normalize("NFKC", title).casefold()
 
 
 class PlaylistCrawlerDialog(ctk.CTkToplevel):
+    FILTER_DELAY = 150  # ms after the last keystroke before the list is filtered
+
     def __init__(self, master, on_add_callback, playlist_title="Crawling Link...", entries=None):
         super().__init__(master)
         C = DownloadManagerApp.COLORS
         self.title(playlist_title)
-        self.entries = entries
+        self.entries = []
+        self.titles = []                 # normalize_title() of each entry
+        self.selected = Bitset()
+        self.queued = Bitset()           # indices already handed to on_add_callback
+        self.query = ""                  # filter the list currently shows
+        self.filter_job = None
+        self.crawling = False
+        self.cancelled = threading.Event()  # set when the user stops the crawl or closes the dialog
         self.on_add_callback = on_add_callback
         self.search_var = tk.StringVar()
-        self.search_var.trace_add("write", lambda *a: self.refresh_view())
+        self.search_var.trace_add("write", lambda *a: self._schedule_filter())
         self._is_loading = False
         
         self.configure(fg_color=C["bg"])
@@ -510,11 +471,11 @@ class PlaylistCrawlerDialog(ctk.CTkToplevel):
         self.tree.column("Title", width=500, stretch=True)
         
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=8, pady=8)
-        scroll = ctk.CTkScrollbar(list_frame, command=self.tree.yview,
-                                  button_color=C["border"], button_hover_color=C["text_dim"])
+        scroll = ctk.CTkScrollbar(list_frame, button_color=C["border"], button_hover_color=C["text_dim"])
         scroll.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 6), pady=8)
-        self.tree.configure(yscroll=scroll.set)
         self.tree.bind("<ButtonRelease-1>", self.on_click)
+        # Keys are entry indices; only the rows around the viewport exist in the Treeview
+        self.view = VirtualTreeview(self.tree, scroll, self._row_values, row_height=36, iid_prefix="e_")
         
         # Footer
         footer = ctk.CTkFrame(self.main_container, fg_color="transparent")
@@ -531,12 +492,21 @@ class PlaylistCrawlerDialog(ctk.CTkToplevel):
                       fg_color="transparent", border_color=C["border"],
                       text_color=C["text_dim"],
                       hover_color=C["surface_hover"]).pack(side=tk.RIGHT, padx=10)
+        self.stop_btn = ctk.CTkButton(footer, text="Stop Crawling", command=self.stop_crawl,
+                                      border_width=1, width=120, corner_radius=8,
+                                      fg_color="transparent", border_color=C["border"],
+                                      text_color=C["text_dim"], hover_color=C["surface_hover"])
         
-        if self.entries:
-            self.show_entries(playlist_title, self.entries)
+        if entries:
+            self.show_entries(playlist_title, entries)
         else:
             self.show_loading()
 
+    def destroy(self):
+        self.cancelled.set()
+        if self.filter_job: self.after_cancel(self.filter_job)
+        super().destroy()
+
     def _center_window(self, width, height):
         self.update_idletasks()
         master_x = self.master.winfo_rootx()
@@ -548,42 +518,72 @@ class PlaylistCrawlerDialog(ctk.CTkToplevel):
         self.geometry(f"{width}x{height}+{x}+{y}")
         self.minsize(width, height)
 
+    # --- Filtering ---
+    def _schedule_filter(self):
+        if self.filter_job: self.after_cancel(self.filter_job)
+        self.filter_job = self.after(self.FILTER_DELAY, self.refresh_view)
+
     def refresh_view(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        
-        query = self.search_var.get().lower()
-        if not self.entries: return
-        for i, entry in enumerate(self.entries):
-            title = entry.get('title', 'Unknown Title')
-            if query in title.lower():
-                sel = "☑" if self.selected_states.get(i, False) else "â˜"
-                self.tree.insert("", "end", iid=str(i), values=(sel, i+1, title))
+        """Shows the entries matching the filter. A query that extends the last
+        one only narrows down the rows already shown."""
+        self.filter_job = None
+        query = normalize_title(self.search_var.get())
+        if query == self.query: return
+        if not query:
+            keys = range(len(self.entries))
+        elif self.query and query.startswith(self.query):
+            keys = [i for i in self.view.keys if query in self.titles[i]]
+        else:
+            keys = [i for i, title in enumerate(self.titles) if query in title]
+        self.query = query
+        self.view.set_keys(keys, top=0)
+        self.update_count()
+
+    def _add_rows(self, start):
+        """Appends the rows from entries[start:] that match the filter."""
+        for i in range(start, len(self.entries)):
+            if not self.query or self.query in self.titles[i]:
+                self.view.append(i)
+
+    def _row_values(self, i, pos):
+        if self.queued[i]:
+            sel = "✔"
+        else:
+            sel = "☑" if self.selected[i] else "â˜"
+        return (sel, i + 1, self.entries[i].get('title') or 'Unknown Title'), ()
 
     def on_click(self, event):
         item = self.tree.identify_row(event.y)
         column = self.tree.identify_column(event.x)
         if item and column == "#1": # Select column
-            idx = int(item)
-            self.selected_states[idx] = not self.selected_states.get(idx, False)
-            self.refresh_view()
+            idx = self.view.key(item)
+            if self.queued[idx]: return
+            self.selected[idx] = not self.selected[idx]
+            self.view.refresh(idx)
 
     def select_all(self):
-        self.selected_states = {i: True for i in range(len(self.entries))}
-        self.refresh_view()
+        self.selected.fill(True)
+        self.view.refresh_all()
 
     def unselect_all(self):
-        self.selected_states = {i: False for i in range(len(self.entries))}
-        self.refresh_view()
+        self.selected.fill(False)
+        self.view.refresh_all()
 
     def add_selected(self):
-        selected_entries = [self.entries[i] for i, state in self.selected_states.items() if state]
-        if not selected_entries:
-            messagebox.showwarning("Empty Selection", "Please select at least one video.")
+        indices = list(self.selected.indices(exclude=self.queued))
+        if not indices:
+            messagebox.showwarning("Empty Selection", "Please select at least one video.", parent=self)
             return
         
-        self.on_add_callback(selected_entries)
-        self.destroy()
+        self.on_add_callback([self.entries[i] for i in indices])
+        if not self.crawling:
+            self.destroy()
+            return
+        # Still crawling: keep the dialog open for the entries yet to come
+        for i in indices:
+            self.queued[i] = True
+            self.view.refresh(i)
+        self.update_count()
 
     def show_loading(self):
         self._is_loading = True
@@ -599,16 +599,54 @@ class PlaylistCrawlerDialog(ctk.CTkToplevel):
         self.after(80, lambda: self._animate_spinner(idx + 1))
 
     def show_entries(self, title, entries):
+        self.begin_entries(title)
+        self.append_entries(entries)
+        self.finish_entries()
+
+    # --- Streaming ---
+    # A crawl calls begin_entries once, append_entries per page and finish_entries at the end
+    def begin_entries(self, title):
+        if not self.winfo_exists(): return
         self._is_loading = False
-        self.entries = entries
+        self.crawling = True
+        self.playlist_title = title
         self.title(f"Playlist: {title}")
         self.title_label.configure(text=f"📋 {title}")
-        self.count_label.configure(text=f"{len(self.entries)} items found")
-        self.selected_states = {i: True for i in range(len(self.entries))}
-        
+        self.stop_btn.pack(side=tk.LEFT)
+
         self.loading_frame.pack_forget()
         self.main_container.pack(fill=tk.BOTH, expand=True)
-        self.refresh_view()
+        self.update_count()
+
+    def append_entries(self, entries):
+        if not self.winfo_exists(): return
+        start = len(self.entries)
+        self.entries.extend(entries)
+        self.titles.extend(normalize_title(e.get('title') or 'Unknown Title') for e in entries)
+        self.selected.extend(len(entries), True)
+        self.queued.extend(len(entries))
+        self._add_rows(start)
+        self.update_count()
+
+    def finish_entries(self, error=None):
+        if not self.winfo_exists(): return
+        self.crawling = False
+        self.stop_btn.pack_forget()
+        self.update_count(error)
+
+    def stop_crawl(self):
+        self.cancelled.set()
+        self.finish_entries()
+
+    def update_count(self, error=None):
+        text = f"{len(self.entries)} items found"
+        if self.query: text += f", {len(self.view)} shown"
+        queued = self.queued.count()
+        if queued: text += f", {queued} added to queue"
+        if self.crawling: text += " (still crawling...)"
+        elif self.cancelled.is_set(): text += " (crawl stopped)"
+        if error: text += f" (crawl failed: {error})"
+        self.count_label.configure(text=text)
 
 class RangeSlider(ctk.CTkCanvas):
     def __init__(self, master, min_val=0, max_val=100, start_val=None, end_val=None, command=None, **kwargs):
@@ -771,6 +809,8 @@ class MediaTrimmerDialog(ctk.CTkToplevel):
         self.minsize(width, height)
 
 class DownloadManagerApp:
+    UI_FLUSH_MS = 66  # row updates are drawn in one batched pass per frame (~15 Hz)
+
     # --- Modern Design System ---
     COLORS = {
         "bg":             "#0D1117",
@@ -808,8 +848,8 @@ class DownloadManagerApp:
         self.font_heading = ("Segoe UI", 14, "bold")
         
         # Core Settings
-        self.db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "downloader_history.db")
-        self.init_db()
+        self.db_path = DEFAULT_DB_PATH
+        self.engine = DownloadEngine(self.db_path)
 
         self.download_folder = self.get_setting("download_folder", os.path.join(os.path.expanduser("~"), "Downloads"))
         self.embed_metadata = tk.BooleanVar(value=self.get_setting("embed_metadata", "True") == "True") 
@@ -837,19 +877,15 @@ class DownloadManagerApp:
         }
         self.ffmpeg_preset = tk.StringVar(value="⚖️ Medium (Default)")
         
-        # Download State Tracking
-        self.active_downloads = {}
-        self.stop_all_flag = False
-        self.metadata_cache = {}
-        self.download_lock = threading.Lock()
-        self.completed_items = 0
-        self.total_items = 0
+        # Keep the engine in step with the settings widgets
+        for var in (self.embed_metadata, self.download_subs, self.speed_limit, self.browser_cookie,
+                    self.concurrent_downloads, self.use_aria2, self.proxy_url, self.ffmpeg_preset):
+            var.trace_add("write", self.sync_engine_settings)
+        self.sync_engine_settings()
+        
         self.is_dragging = False
         
         # Dashboard State
-        self.active_speeds = {}
-        self.active_downloaded = {}
-        self.session_downloaded_finished = 0
         self.speed_history = [0] * 60
         self.peak_speed = 0
         self.current_speed_avg = 0
@@ -860,9 +896,17 @@ class DownloadManagerApp:
         
         # Build the UI
         self.setup_ui()
+        self.pending_rows = {}  # db_id -> latest Job from job_updated, drawn by flush_row_updates
+        self.engine.subscribe(self.on_engine_event)
+        self.flush_row_updates()
         
         # Load saved history into the tree
         self.load_history_from_db()
+
+        # Resume downloads that a crash or forced quit left unfinished
+        interrupted = self.engine.recover()
+        if interrupted:
+            self.engine.start(interrupted)
         
         # Start dashboard updater
         self.update_dashboard_stats()
@@ -1123,9 +1167,8 @@ class DownloadManagerApp:
             self.tree.heading(col_id, text=heading)
             self.tree.column(col_id, width=width, minwidth=minw, anchor=anchor, stretch=stretch)
 
-        tree_scroll = ctk.CTkScrollbar(list_frame, command=self.tree.yview,
+        tree_scroll = ctk.CTkScrollbar(list_frame,
                                        button_color=C["border"], button_hover_color=C["text_dim"])
-        self.tree.configure(yscroll=tree_scroll.set)
         
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(8, 0), pady=8)
         tree_scroll.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 6), pady=8)
@@ -1135,6 +1178,8 @@ class DownloadManagerApp:
         self.tree.bind("<B1-Motion>", self.on_tree_drag)
         self.tree.bind("<ButtonRelease-1>", self.on_tree_click)
         self.tree.bind("<Button-3>", self.show_context_menu)
+        # Only the rows around the viewport exist in the Treeview
+        self.job_view = VirtualTreeview(self.tree, tree_scroll, self._job_row, row_height=36, iid_prefix="db_")
 
         # ─── DASHBOARD TAB ────────────────────────────────────────
         self.setup_dashboard_ui()
@@ -1176,7 +1221,7 @@ class DownloadManagerApp:
         if isinstance(self.root.focus_get(), (ctk.CTkEntry, ctk.CTkTextbox, tk.Entry, tk.Text)):
             return
         # Perform UI selection (blue highlight) instead of checking boxes
-        self.tree.selection_set(self.tree.get_children())
+        self.job_view.select_all()
         return "break"
 
     def on_ctrl_v(self, event):
@@ -1202,17 +1247,16 @@ class DownloadManagerApp:
 
     def _apply_cookies(self, ydl_opts):
         """Apply browser cookie settings to yt-dlp opts."""
-        browser = self.browser_cookie.get()
-        if browser != "None":
-            ydl_opts['cookiesfrombrowser'] = (browser,)
+        self.engine.apply_cookies(ydl_opts)
 
     def start_remote_server(self):
         if not SERVER_AVAILABLE: return
         try:
-            self.remote_server = RemoteServer(self)
+            self.remote_server = RemoteServer(
+                self.engine, on_add_link=lambda url: self.root.after(0, lambda: self.fetch_and_add(url, "Full Video")))
             self.remote_thread = threading.Thread(target=self.remote_server.run, daemon=True)
             self.remote_thread.start()
-            print("Remote Server started on port 5000")
+            print(f"Remote Server started on {self.remote_server.host}:{self.remote_server.port}")
         except Exception as e:
             print(f"Failed to start remote server: {e}")
 
@@ -1228,7 +1272,8 @@ class DownloadManagerApp:
             
     def show_remote_qr(self):
         ip = self.get_local_ip()
-        url = f"http://{ip}:5000"
+        port = self.remote_server.port if getattr(self, 'remote_server', None) else 5000
+        url = f"http://{ip}:{port}"
         
         qr_win = ctk.CTkToplevel(self.root)
         qr_win.title("Remote Control")
@@ -1267,54 +1312,27 @@ class DownloadManagerApp:
         ctk.CTkLabel(qr_win, text=f"Or visit on your phone's browser:\n{url}", font=self.font_main).pack(pady=(10, 20))
 
     # --- Database Methods ---
-    def init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            # Settings Table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT
-                )
-            ''')
-            # Downloads Table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS downloads (
-                    db_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sel TEXT,
-                    title TEXT,
-                    url TEXT,
-                    time_range TEXT,
-                    media_type TEXT,
-                    status TEXT,
-                    file_path TEXT,
-                    timestamp TEXT
-                )
-            ''')
-            
-            # Migration: Add file_size column if it doesn't exist
-            cursor.execute("PRAGMA table_info(downloads)")
-            columns = [info[1] for info in cursor.fetchall()]
-            if 'file_size' not in columns:
-                try:
-                    cursor.execute('ALTER TABLE downloads ADD COLUMN file_size TEXT')
-                except Exception as e:
-                    print(f"Migration Error: {e}")
-            
-            conn.commit()
-
     def save_setting(self, key, value):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, str(value)))
-            conn.commit()
+        self.engine.save_setting(key, value)
 
     def get_setting(self, key, default=None):
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                row = conn.execute('SELECT value FROM settings WHERE key=?', (key,)).fetchone()
-                return row[0] if row else default
-        except Exception:
-            return default
+        return self.engine.get_setting(key, default)
+
+    def sync_engine_settings(self, *args):
+        """Pushes the current settings widgets into the engine."""
+        speed = self.speed_limit.get().strip()
+        concurrent = self.concurrent_downloads.get().strip()
+        self.engine.configure(
+            download_folder=self.download_folder,
+            embed_metadata=self.embed_metadata.get(),
+            download_subs=self.download_subs.get(),
+            speed_limit=int(speed) if speed.isdigit() else 0,
+            browser_cookie=self.browser_cookie.get(),
+            concurrent_downloads=int(concurrent) if concurrent.isdigit() and int(concurrent) > 0 else 1,
+            use_aria2=self.use_aria2.get(),
+            proxy_url=self.proxy_url.get(),
+            ffmpeg_preset=self.PRESET_MAP.get(self.ffmpeg_preset.get(), 'medium'),
+        )
 
     def update_yt_dlp(self, button=None):
         """Runs pip install -U yt-dlp with a premium in-button spinner animation."""
@@ -1361,100 +1379,28 @@ class DownloadManagerApp:
 
     def refresh_list(self):
         """Forces a sync between the DB and the Treeview, checking if files still exist."""
-        updated = 0
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT db_id, file_path, status FROM downloads')
-            rows = cursor.fetchall()
-            
-            for db_id, path, status in rows:
-                new_status = status
-                if status == "Done" or status == "File Missing":
-                    # Normalize path for robust checking
-                    norm_path = os.path.normpath(path).strip() if path else None
-                    if norm_path and os.path.exists(norm_path):
-                        new_status = "Done"
-                    else:
-                        new_status = "File Missing"
-                
-                if new_status != status:
-                    cursor.execute('UPDATE downloads SET status=? WHERE db_id=?', (new_status, db_id))
-                    updated += 1
-            conn.commit()
-        
+        updated = self.engine.refresh_file_status()
         self.load_history_from_db()
         self.status_label.configure(text=f"List refreshed. {updated} items updated.")
 
-    def update_db_item(self, values, db_id=None):
-        # values: (sel, title, url, range, type, status, file_path)
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            if db_id:
-                cursor.execute('''
-                    UPDATE downloads SET sel=?, title=?, url=?, time_range=?, media_type=?, status=?, file_path=?, file_size=?
-                    WHERE db_id=?
-                ''', (*values, db_id))
-            else:
-                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                cursor.execute('''
-                    INSERT INTO downloads (sel, title, url, time_range, media_type, status, file_path, file_size, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (*values, timestamp))
-                db_id = cursor.lastrowid
-            conn.commit()
-        return db_id
-
-    def delete_db_item(self, db_id):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM downloads WHERE db_id=?', (db_id,))
-            conn.commit()
-
     def load_history_from_db(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        
         query = self.search_query.get().strip()
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            sql = "SELECT db_id, sel, title, url, time_range, media_type, status, file_path, file_size, timestamp FROM downloads"
-            if query:
-                cursor.execute(sql + " WHERE title LIKE ? OR url LIKE ? OR status LIKE ?", (f'%{query}%', f'%{query}%', f'%{query}%'))
-            else:
-                cursor.execute(sql)
-            
-            rows = cursor.fetchall()
-            
-            for i, row in enumerate(rows):
-                db_id, sel, title, url, time_range, media_type, status, file_path, file_size, timestamp = row
-                idx = len(self.tree.get_children()) + 1
-                tag = 'evenrow' if i % 2 == 0 else 'oddrow'
-                
-                # Default size to "---" if empty
-                display_size = file_size if file_size else "---"
-                
-                # We store db_id in the 'text' attribute of the item for easy reference
-                self.tree.insert("", "end", iid=f"db_{db_id}", 
-                                 values=(sel, idx, title, url, time_range, media_type, display_size, status),
-                                 tags=(tag,))
-            
-            # Auto-scroll to bottom on load
-            children = self.tree.get_children()
-            if children:
-                self.tree.see(children[-1])
+        db_ids = [job.db_id for job in self.engine.search(query)]
+        # Auto-scroll to bottom on load
+        self.job_view.set_keys(db_ids, top=len(db_ids))
 
     # --- Context Menu Methods ---
     def show_context_menu(self, event):
         item = self.tree.identify_row(event.y)
         if item:
-            self.tree.selection_set(item)
-            
+            self.job_view.select([self.job_view.key(item)])
+                        
             menu_x = event.x_root
             menu_y = event.y_root
             
             # Identify if it's already a range
-            current_range = self.tree.item(item, "values")[4]
+            job = self.engine.get_job(int(item.replace("db_", "")))
+            current_range = job.time_range if job else "Full Video"
             trim_label = "âœ‚ï¸ Trim Media (Visual)"
             if current_range != "Full Video":
                 trim_label = "âœ‚ï¸ Edit Trim (Visual)"
@@ -1465,9 +1411,11 @@ class DownloadManagerApp:
                 "separator",
                 (trim_label, self.ctx_trim_visual),
                 ("🔄 Re-download", self.ctx_redownload),
+                ("⏫ Download Next", self.ctx_download_next),
                 ("🗑 Delete from List", self.ctx_delete_list),
                 ("🔥 Delete from Disk", self.ctx_delete_disk),
                 "separator",
+                ("⏱ Export List Timeline", self.ctx_export_trace),
                 ("ℹ Properties", self.ctx_properties)
             ]
             
@@ -1483,109 +1431,85 @@ class DownloadManagerApp:
                 "or install it and add it to your system PATH.")
             return
 
-        item = self.tree.selection()[0]
-        url = self.tree.item(item, "values")[3]
-        title = self.tree.item(item, "values")[2]
-        db_id = int(item.replace("db_", ""))
-        
+        db_id = self.get_selected_db_id()
+        job = self.engine.get_job(db_id)
+        if not job: return
+        url = job.url
+        title = job.title
+
         self.status_label.configure(text="Fetching duration for trimmer...")
         
         def fetch_duration():
-            ydl_opts = {'quiet': True, 'extract_flat': True, 'no_warnings': True}
-            self._apply_cookies(ydl_opts)
             try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    duration = info.get('duration')
-                    if duration:
-                        def launch():
-                            MediaTrimmerDialog(self.root, title, duration, 
-                                              lambda r: self.save_trim_result(item, db_id, r))
-                        self.root.after(0, launch)
-                        self.root.after(0, lambda: self.status_label.configure(text="Ready"))
-                    else:
-                        self.root.after(0, lambda: messagebox.showerror("Error", "Could not fetch media duration."))
+                info = self.engine.lookup(url)
+                duration = info.get('duration')
+                if duration:
+                    def launch():
+                        MediaTrimmerDialog(self.root, title, duration, 
+                                          lambda r: self.save_trim_result(db_id, r))
+                    self.root.after(0, launch)
+                    self.root.after(0, lambda: self.status_label.configure(text="Ready"))
+                else:
+                    self.root.after(0, lambda: messagebox.showerror("Error", "Could not fetch media duration."))
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to fetch metadata: {str(e)}"))
         
         threading.Thread(target=fetch_duration, daemon=True).start()
 
-    def save_trim_result(self, item_id, db_id, range_str):
-        # Update Treeview
-        current_values = list(self.tree.item(item_id, "values"))
-        current_values[4] = range_str # Range column
-        current_values[7] = "Queued"  # Reset status to Queued
-        self.tree.item(item_id, values=current_values)
-        
-        # Update Database
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('UPDATE downloads SET time_range=?, status="Queued" WHERE db_id=?', (range_str, db_id))
-            conn.commit()
-        
+    def save_trim_result(self, db_id, range_str):
+        # Reset status to Queued with the new range
+        self.engine.update_job(db_id, time_range=range_str, status="Queued")
+
         self.status_label.configure(text=f"Range saved: {range_str}")
 
     def get_selected_db_id(self):
-        selection = self.tree.selection()
-        if not selection: return None
-        item_id = selection[0]
-        return int(item_id.replace("db_", ""))
+        selection = self.job_view.selection()
+        return selection[0] if selection else None
+
+    def get_selected_file_path(self):
+        job = self.engine.get_job(self.get_selected_db_id())
+        return job.file_path if job else None
 
     def ctx_open_file(self):
-        db_id = self.get_selected_db_id()
-        if not db_id: return
-        with sqlite3.connect(self.db_path) as conn:
-            path = conn.execute('SELECT file_path FROM downloads WHERE db_id=?', (db_id,)).fetchone()[0]
+        path = self.get_selected_file_path()
         if path and os.path.exists(path):
             os.startfile(path)
         else:
             messagebox.showerror("Error", "File not found or not yet downloaded.")
 
     def ctx_open_folder(self):
-        db_id = self.get_selected_db_id()
-        if not db_id: return
-        with sqlite3.connect(self.db_path) as conn:
-            path = conn.execute('SELECT file_path FROM downloads WHERE db_id=?', (db_id,)).fetchone()[0]
+        path = self.get_selected_file_path()
         if path and os.path.exists(path):
             os.system(f'explorer /select,"{os.path.normpath(path)}"')
         else:
             messagebox.showerror("Error", "Folder/File not found.")
 
     def ctx_redownload(self):
-        selection = self.tree.selection()
+        db_id = self.get_selected_db_id()
+        if not db_id: return
+        self.engine.update_job(db_id, status="Queued")
+        self.engine.start([db_id])
+
+    def ctx_download_next(self):
+        selection = self.job_view.selection()
         if not selection: return
-        item_id = selection[0]
-        db_id = int(item_id.replace("db_", ""))
-        
-        current_values = list(self.tree.item(item_id, "values"))
-        current_values[7] = "Queued" # Status
-        self.tree.item(item_id, values=current_values)
-        
-        # Update DB status
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('UPDATE downloads SET status="Queued" WHERE db_id=?', (db_id,))
-            conn.commit()
-            
-        self._start_download_batch([item_id])
+        self.engine.prioritize(selection)
 
     def ctx_delete_list(self):
-        selection = self.tree.selection()
+        selection = self.job_view.selection()
         if not selection: return
-        for item_id in selection:
-            db_id = int(item_id.replace("db_", ""))
-            self.delete_db_item(db_id)
-            self.tree.delete(item_id)
+        self.engine.remove_jobs(selection)
 
     def ctx_delete_disk(self):
-        selection = self.tree.selection()
+        selection = self.job_view.selection()
         if not selection: return
         if not messagebox.askyesno("Confirm", "Are you sure you want to delete these files from your computer?"):
             return
             
-        for item_id in selection:
-            db_id = int(item_id.replace("db_", ""))
-            with sqlite3.connect(self.db_path) as conn:
-                path = conn.execute('SELECT file_path FROM downloads WHERE db_id=?', (db_id,)).fetchone()[0]
-            
+        for db_id in selection:
+            job = self.engine.get_job(db_id)
+            path = job.file_path if job else None
+
             if path:
                 # Normalize path
                 norm_path = os.path.normpath(path).strip()
@@ -1596,22 +1520,18 @@ class DownloadManagerApp:
                         messagebox.showerror("Error", f"Could not delete {norm_path}: {str(e)}")
                 else:
                     messagebox.showwarning("File Not Found", f"Could not find file on disk: {norm_path}")
-            
-            self.delete_db_item(db_id)
-            self.tree.delete(item_id)
+
+            self.engine.remove_jobs([db_id])
 
     def ctx_properties(self):
-        db_id = self.get_selected_db_id()
-        if not db_id: return
-        with sqlite3.connect(self.db_path) as conn:
-            row = conn.execute('SELECT db_id, sel, title, url, time_range, media_type, status, file_path, file_size, timestamp FROM downloads WHERE db_id=?', (db_id,)).fetchone()
-        
-        if not row: return
-        _, sel, title, url, time_range, media_type, status, file_path, file_size, timestamp = row
-        
+        job = self.engine.get_job(self.get_selected_db_id())
+        if not job: return
+        title, url, time_range, media_type = job.title, job.url, job.time_range, job.media_type
+        status, file_path, file_size, timestamp = job.status, job.file_path, job.file_size, job.timestamp
+
         prop_win = ctk.CTkToplevel(self.root)
         prop_win.title("Download Properties")
-        self.center_toplevel(prop_win, 550, 450)
+        self.center_toplevel(prop_win, 620, 720)
         prop_win.transient(self.root)
         
         ctk.CTkLabel(prop_win, text="Item Properties", font=self.font_title).pack(pady=20)
@@ -1638,6 +1558,34 @@ class DownloadManagerApp:
             v_box.configure(state="disabled")
             v_box.grid(row=i, column=1, padx=5, pady=10, sticky="w")
 
+        # Stage timeline: where this item's time went, per attempt
+        spans = self.engine.job_spans([job.db_id])
+        head = ctk.CTkFrame(prop_win, fg_color="transparent")
+        head.pack(padx=20, fill=tk.X)
+        ctk.CTkLabel(head, text="Timeline", font=self.font_bold).pack(side=tk.LEFT)
+        ctk.CTkButton(head, text="Export Trace...", width=120, height=28, font=self.font_small,
+                      command=lambda: self.export_trace([job.db_id], prop_win)).pack(side=tk.RIGHT)
+        t_box = ctk.CTkTextbox(prop_win, height=180, font=("Consolas", 11), wrap="none")
+        t_box.insert("1.0", timeline_text(spans))
+        t_box.configure(state="disabled")
+        t_box.pack(padx=20, pady=(5, 20), fill=tk.BOTH)
+
+    def ctx_export_trace(self):
+        self.export_trace(list(self.job_view))
+
+    def export_trace(self, db_ids, parent=None):
+        """Saves the stage timelines of db_ids as Chrome trace JSON (chrome://tracing, ui.perfetto.dev)."""
+        path = filedialog.asksaveasfilename(parent=parent or self.root, title="Export Timeline",
+                                            defaultextension=".json", initialfile="media_downloader_trace.json",
+                                            filetypes=[("Chrome Trace", "*.json")])
+        if not path: return
+        try:
+            count = self.engine.export_trace(db_ids, path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save trace: {e}")
+            return
+        self.status_label.configure(text=f"Exported {count} timeline spans to {os.path.basename(path)}")
+
     def center_toplevel(self, window, width, height):
         self.root.update_idletasks()
         x = self.root.winfo_x() + (self.root.winfo_width() // 2) - (width // 2)
@@ -1669,29 +1617,18 @@ class DownloadManagerApp:
         if region == "cell":
             column = self.tree.identify_column(event.x)
             item_id = self.tree.identify_row(event.y)
-            if column == "#1": # Sel column
-                current_values = list(self.tree.item(item_id, "values"))
-                new_sel = "☑" if current_values[0] == "â˜" else "â˜"
-                current_values[0] = new_sel
-                self.tree.item(item_id, values=current_values)
-                
-                # Update DB
+            if column == "#1" and item_id: # Sel column
                 db_id = int(item_id.replace("db_", ""))
-                with sqlite3.connect(self.db_path) as conn:
-                    conn.execute('UPDATE downloads SET sel=? WHERE db_id=?', (new_sel, db_id))
-                    conn.commit()
+                job = self.engine.get_job(db_id)
+                if not job: return
+                new_sel = "☑" if job.sel == "â˜" else "â˜"
+                self.engine.update_job(db_id, sel=new_sel)
 
     def select_all_items(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('UPDATE downloads SET sel="☑"')
-            conn.commit()
-        self.load_history_from_db()
+        self.engine.set_all_selected("☑")
 
     def unselect_all_items(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('UPDATE downloads SET sel="â˜"')
-            conn.commit()
-        self.load_history_from_db()
+        self.engine.set_all_selected("â˜")
 
     # --- UI Logic Methods ---
     def update_format_options(self, event=None):
@@ -1712,39 +1649,23 @@ class DownloadManagerApp:
             self.bitrate_combo.pack_forget()
 
     def auto_update_all(self, *args):
-        if not hasattr(self, 'tree'): return
-        all_items = self.tree.get_children()
-        if not all_items: return 
-            
+        if not hasattr(self, 'job_view'): return
+        if not len(self.job_view): return
+
         new_media_type = self.get_current_media_type_str()
-        updated_count = 0
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            for item in all_items:
-                db_id = int(item.replace("db_", ""))
-                current_values = list(self.tree.item(item, "values"))
-                current_status = current_values[7]
-                
-                if "Downloading" not in current_status and "Done" not in current_status:
-                    # Update Treeview
-                    current_values[5] = new_media_type
-                    
-                    # Try to get size from cache
-                    new_size = "---"
-                    if db_id in self.metadata_cache:
-                        new_size = self.estimate_size(self.metadata_cache[db_id], new_media_type)
-                    
-                    current_values[6] = new_size
-                    current_values[7] = "Queued"
-                    self.tree.item(item, values=current_values)
-                    
-                    # Update DB
-                    cursor.execute('UPDATE downloads SET media_type=?, status=?, file_size=? WHERE db_id=?', 
-                                 (new_media_type, "Queued", new_size, db_id))
-                    updated_count += 1
-            conn.commit()
-            
+        changes = {}
+
+        for db_id in self.job_view:
+            job = self.engine.get_job(db_id)
+            if not job or job.status == "Done" or db_id in self.engine.active_downloads:
+                continue
+
+            # Try to get size from the metadata cache (survives restarts)
+            new_size = self.estimate_size(self.engine.metadata.get(job.url), new_media_type)
+            changes[db_id] = {"media_type": new_media_type, "status": "Queued", "file_size": new_size}
+
+        self.engine.update_jobs(changes)
+        updated_count = len(changes)
         if updated_count > 0:
             self.status_label.configure(text=f"Updated {updated_count} items to {new_media_type}.")
 
@@ -1791,6 +1712,7 @@ class DownloadManagerApp:
             if folder:
                 self.download_folder = folder
                 self.save_setting("download_folder", folder)
+                self.sync_engine_settings()
                 path_var.set(folder)
                 self.location_label.configure(text=f"📂  {self.download_folder}")
         ctk.CTkButton(path_inner, text="Browse", width=70, command=change_folder,
@@ -1973,21 +1895,18 @@ class DownloadManagerApp:
             self.status_label.configure(text="Fetching media for trimmer...")
             
             def fetch_and_launch():
-                ydl_opts = {'quiet': True, 'extract_flat': True, 'no_warnings': True}
-                self._apply_cookies(ydl_opts)
                 try:
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        info = ydl.extract_info(val, download=False)
-                        duration = info.get('duration')
-                        title = info.get('title', 'Unknown Title')
-                        if duration:
-                            def launch():
-                                MediaTrimmerDialog(self.root, title, duration, 
-                                                  lambda r: self.fetch_and_add(val, r))
-                            self.root.after(0, launch)
-                            self.root.after(0, lambda: self.status_label.configure(text="Ready"))
-                        else:
-                            self.root.after(0, lambda: messagebox.showerror("Error", "Could not fetch media duration."))
+                    info = self.engine.lookup(val)
+                    duration = info.get('duration')
+                    title = info.get('title', 'Unknown Title')
+                    if duration:
+                        def launch():
+                            MediaTrimmerDialog(self.root, title, duration, 
+                                              lambda r: self.fetch_and_add(val, r))
+                        self.root.after(0, launch)
+                        self.root.after(0, lambda: self.status_label.configure(text="Ready"))
+                    else:
+                        self.root.after(0, lambda: messagebox.showerror("Error", "Could not fetch media duration."))
                 except Exception as e:
                     self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to fetch metadata: {str(e)}"))
 
@@ -2044,7 +1963,7 @@ class DownloadManagerApp:
                 
             dialog.destroy()
             if val: 
-                crawler = PlaylistCrawlerDialog(self.root, lambda sel: self.add_entries_to_ui(sel, "Full Video"))
+                crawler = PlaylistCrawlerDialog(self.root, lambda sel: self.add_entries_to_ui(sel, "Full Video", crawler.playlist_title))
                 self.fetch_and_add(val, "Full Video", crawler)
                 
         ctk.CTkButton(dialog, text="Start Crawling", command=submit, font=self.font_bold,
@@ -2080,118 +1999,98 @@ class DownloadManagerApp:
         text_box.pack(pady=(0, 14), padx=18, fill=tk.BOTH, expand=True)
         
         def process_batch():
-            urls = text_box.get("1.0", tk.END).strip().split('\n')
+            text = text_box.get("1.0", tk.END)
+            batch_win.destroy()
+            self.import_links(parse_links(text))
+
+        def import_file():
+            path = filedialog.askopenfilename(parent=batch_win, title="Import Links",
+                                              filetypes=[("Link lists", "*.txt *.csv *.jsonl *.ndjson"),
+                                                         ("All files", "*.*")])
+            if not path: return
             batch_win.destroy()
-            for url in urls:
-                if url.strip(): self.fetch_and_add(url.strip(), "Full Video")
-                    
-        ctk.CTkButton(batch_win, text="Add All to Queue", command=process_batch,
+            self.import_links(read_links(path))
+
+        btn_frame = ctk.CTkFrame(batch_win, fg_color="transparent")
+        btn_frame.pack(pady=(0, 20), fill=tk.X, padx=20)
+
+        ctk.CTkButton(btn_frame, text="Add All to Queue", command=process_batch,
                       font=self.font_bold, height=42, corner_radius=8,
-                      fg_color=C["success"], hover_color=self._darken(C["success"]),
-                      width=200).pack(pady=(0, 20))
+                      fg_color=C["success"], hover_color=self._darken(C["success"])).pack(
+                          side=tk.LEFT, padx=(0, 8), fill=tk.X, expand=True)
+        ctk.CTkButton(btn_frame, text="Import File...", command=import_file,
+                      font=self.font_bold, height=42, corner_radius=8,
+                      fg_color=C["accent"], hover_color=C["accent_hover"]).pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+    def import_links(self, links):
+        """Queues links (an iterable, read lazily) on a bounded extraction pool,
+        skipping duplicates. Playlists and channels open the crawler."""
+        self.status_label.configure(text="Importing links...")
+        def on_progress(stats):
+            self.root.after(0, lambda: self.status_label.configure(text=progress_text(stats)))
+        BatchImport(self.engine, links, "Full Video", self.get_current_media_type_str(), on_progress=on_progress,
+                    on_playlist=lambda url: self.root.after(0, lambda: self.fetch_and_add(url, "Full Video"))).start()
 
     def remove_selected(self):
-        with sqlite3.connect(self.db_path) as conn:
-            for item in self.tree.selection():
-                db_id = int(item.replace("db_", ""))
-                conn.execute('DELETE FROM downloads WHERE db_id=?', (db_id,))
-                self.tree.delete(item)
-            conn.commit()
+        self.engine.remove_jobs(self.job_view.selection())
 
     def clear_all(self):
         if messagebox.askyesno("Clear Queue", "Are you sure you want to remove all items from the list?"):
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute('DELETE FROM downloads')
-                conn.commit()
-            for item in self.tree.get_children(): self.tree.delete(item)
+            self.engine.clear_jobs()
 
     # --- Core Downloader Logic ---
     def fetch_and_add(self, url, range_str, crawler_dialog=None):
         self.status_label.configure(text="Fetching info...")
-        # If it's a single video, we can afford full extraction for size
-        is_single = "playlist" not in url.lower() and "channel" not in url.lower() and "/user/" not in url.lower()
-        threading.Thread(target=self._fetch_thread, args=(url, range_str, crawler_dialog, is_single), daemon=True).start()
-
-    def _fetch_thread(self, url, range_str, crawler_dialog=None, full_extract=False):
-        ydl_opts = {'extract_flat': not full_extract, 'quiet': not crawler_dialog, 'no_warnings': True}
-        self._apply_cookies(ydl_opts)
-
+        threading.Thread(target=self._fetch_thread, args=(url, range_str, crawler_dialog), daemon=True).start()
+
+    def _fetch_thread(self, url, range_str, crawler_dialog=None):
+        # Playlist pages stream into the crawler dialog as they arrive; Tk calls are
+        # queued with after() and run in order, so the dialog exists before its first page
+        dialog = [crawler_dialog]
+        pages = self.engine.crawl(url, quiet=not crawler_dialog)
+        started = False
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-            if info.get('_type') == 'playlist':
-                playlist_title = info.get('title', 'Unknown Playlist')
-                entries = info.get('entries', [])
-                
-                # Channel Detection: If we only find sub-playlists (tabs like Videos, Shorts)
-                # we should try to extract the videos from them instead.
-                tabs = [e for e in entries if e.get('_type') == 'url' and e.get('title') in ["Videos", "Shorts", "Live"]]
-                if tabs:
-                    self.status_label.configure(text="Expanding channel tabs...")
-                    if crawler_dialog: self.root.after(0, lambda: crawler_dialog.title("Expanding Channel..."))
-                    
-                    expanded_entries = []
-                    # Prioritize 'Videos' tab, then add others if needed
-                    for tab in tabs[:2]:
-                        try:
-                            with yt_dlp.YoutubeDL(ydl_opts) as tab_ydl:
-                                tab_info = tab_ydl.extract_info(tab['url'], download=False)
-                                expanded_entries.extend(tab_info.get('entries', []))
-                        except: continue
-                    if expanded_entries: entries = expanded_entries
-
-                if crawler_dialog:
-                    self.root.after(0, lambda: crawler_dialog.show_entries(playlist_title, entries))
-                else:
-                    self.root.after(0, lambda: PlaylistCrawlerDialog(self.root, 
-                                                                    lambda selected: self.add_entries_to_ui(selected, range_str),
-                                                                    playlist_title, entries))
-                self.root.after(0, lambda: self.status_label.configure(text="Ready"))
-            else:
-                if crawler_dialog: self.root.after(0, crawler_dialog.destroy)
-                info['size_str'] = self.estimate_size(info, self.get_current_media_type_str())
-                self.add_entries_to_ui([info], range_str)
-                
+            for playlist_title, entries in pages:
+                if playlist_title is None:
+                    if crawler_dialog: self.root.after(0, crawler_dialog.destroy)
+                    self.root.after(0, lambda: self.add_entries_to_ui(entries, range_str))
+                    return
+                if dialog[0] and dialog[0].cancelled.is_set():
+                    break
+                if not started:
+                    started = True
+                    self.root.after(0, lambda t=playlist_title: self._begin_crawl(dialog, t, range_str))
+                    self.root.after(0, lambda: self.status_label.configure(text="Ready"))
+                self.root.after(0, lambda page=entries: dialog[0].append_entries(page))
+            if started:
+                self.root.after(0, lambda: dialog[0].finish_entries())
+            elif not (crawler_dialog and crawler_dialog.cancelled.is_set()):
+                raise yt_dlp.utils.DownloadError("Playlist is empty")
         except Exception as e:
+            if started:
+                self.root.after(0, lambda err=str(e): dialog[0].finish_entries(err))
+                return
             if crawler_dialog: self.root.after(0, crawler_dialog.destroy)
             self.root.after(0, lambda: self.status_label.configure(text="Error fetching link (Try linking browser cookies)"))
-
-    def add_entries_to_ui(self, entries, range_str):
-        if self.media_type.get() == "Audio":
-            current_format = f"Audio ({self.format_var.get()} - {self.bitrate_var.get()}k)"
-        elif self.media_type.get() == "Video":
-            current_format = f"Video ({self.format_var.get()})"
-        else:
-            current_format = f"Thumb ({self.format_var.get()})"
-            
-        new_item_ids = []
-        for entry in entries:
-            title = entry.get('title', 'Unknown Title')
-            vid_url = entry.get('webpage_url') or entry.get('original_url') or entry.get('url')
-            if not vid_url and entry.get('id'): vid_url = f"https://www.youtube.com/watch?v={entry['id']}"
-            
-            if vid_url:
-                idx = len(self.tree.get_children()) + 1
-                # Estimate size if we have metadata
-                size_str = entry.get('size_str', '---')
-                
-                # Save to DB first to get an ID
-                db_values = ("☑", title, vid_url, range_str, current_format, "Queued", "", size_str)
-                db_id = self.update_db_item(db_values)
-                
-                # Cache metadata for live updates
-                self.metadata_cache[db_id] = entry
-                
-                # Insert into the tree
-                item_id = self.tree.insert("", "end", iid=f"db_{db_id}", 
-                                         values=("☑", idx, title, vid_url, range_str, current_format, size_str, "Queued"))
-                new_item_ids.append(item_id)
-                
-        if new_item_ids: 
-            self.tree.selection_set(new_item_ids)
-            self.tree.see(new_item_ids[-1]) # Auto-scroll to newly added
-        self.root.after(0, lambda: self.status_label.configure(text="Ready"))
+        finally:
+            pages.close()  # stops yt-dlp from requesting further pages
+
+    def _begin_crawl(self, dialog, playlist_title, range_str):
+        if dialog[0] is None:
+            dialog[0] = PlaylistCrawlerDialog(self.root,
+                                              lambda selected: self.add_entries_to_ui(selected, range_str, playlist_title))
+        dialog[0].begin_entries(playlist_title)
+
+    def add_entries_to_ui(self, entries, range_str, source=""):
+        jobs = self.engine.add_entries(entries, range_str, self.get_current_media_type_str(), source)
+        # Rows normally arrive via job_added events; add them now so they can be selected
+        new_ids = [job.db_id for job in jobs]
+        for db_id in new_ids:
+            self.job_view.append(db_id)
+        if new_ids:
+            self.job_view.select(new_ids)
+            self.job_view.see(new_ids[-1]) # Auto-scroll to newly added
+        self.status_label.configure(text="Ready")
 
     def get_current_media_type_str(self):
         if self.media_type.get() == "Audio":
@@ -2203,395 +2102,123 @@ class DownloadManagerApp:
 
     def estimate_size(self, info, media_type):
         """Attempts to estimate file size based on selected media_type."""
-        if not info or 'formats' not in info:
-            return "---"
-            
-        formats = info.get('formats', [])
-        if not formats: return "---"
-        
-        try:
-            # Audio Mode
-            if "Audio" in media_type:
-                audio_formats = [f for f in formats if f.get('vcodec') == 'none' or f.get('acodec') != 'none']
-                if not audio_formats: return "---"
-                
-                # Try to find a format with filesize
-                with_size = [f for f in audio_formats if f.get('filesize') or f.get('filesize_approx')]
-                if not with_size: return "---"
-                
-                best_audio = max(with_size, key=lambda f: f.get('abr', 0) or 0)
-                size = best_audio.get('filesize') or best_audio.get('filesize_approx')
-                return self.format_size_simple(size)
-                
-            # Video Mode
-            elif "Video" in media_type:
-                res_str = re.search(r'\((.*?)\)', media_type).group(1) 
-                res_val = int(res_str.replace("p", ""))
-                
-                # Find best video format for this resolution
-                video_formats = [f for f in formats if f.get('height') == res_val]
-                if not video_formats:
-                    video_formats = [f for f in formats if f.get('height') and f.get('height') <= res_val]
-                
-                if not video_formats: return "---"
-                
-                # Sort by height then bitrate
-                video_formats.sort(key=lambda f: (f.get('height', 0), f.get('tbr', 0)), reverse=True)
-                best_video = video_formats[0]
-                
-                v_size = best_video.get('filesize') or best_video.get('filesize_approx')
-                
-                # Find an audio format to add to it if it's video-only
-                if best_video.get('vcodec') != 'none' and best_video.get('acodec') == 'none':
-                    audio_formats = [f for f in formats if f.get('vcodec') == 'none']
-                    if audio_formats:
-                        best_audio = max(audio_formats, key=lambda f: f.get('abr', 0) or 0)
-                        a_size = best_audio.get('filesize') or best_audio.get('filesize_approx')
-                        if v_size and a_size:
-                            return self.format_size_simple(v_size + a_size)
-                
-                return self.format_size_simple(v_size) if v_size else "---"
-        except:
-            return "---"
-            
-        return "---"
+        return estimate_size(info, media_type)
 
     # --- Download Control Logic ---
+    def _checked_db_ids(self):
+        """db_ids of the rows whose Sel box is ticked, in queue order."""
+        jobs = (self.engine.get_job(db_id) for db_id in self.job_view)
+        return [job.db_id for job in jobs if job and job.sel == "☑"]
+
+    def _selection_db_ids(self):
+        selection = self.job_view.selection()
+        if selection:
+            return selection
+        # Fallback to selected marked items if no Treeview selection
+        return self._checked_db_ids()
+
     def resume_selected(self):
-        selection = self.tree.selection()
-        if not selection:
-            # Fallback to selected marked items if no Treeview selection
-            all_items = self.tree.get_children()
-            selection = [item for item in all_items if self.tree.item(item, "values")[0] == "☑"]
-            
-        if not selection:
+        db_ids = self._selection_db_ids()
+        if not db_ids:
             messagebox.showwarning("Warning", "No items selected to resume.", parent=self.root)
             return
-
-        for item_id in selection:
-            self.active_downloads[item_id] = False # Reset cancel flag
-            current_values = list(self.tree.item(item_id, "values"))
-            if current_values[7] != "Done":
-                current_values[7] = "Queued"
-                self.tree.item(item_id, values=current_values)
-                db_id = int(item_id.replace("db_", ""))
-                with sqlite3.connect(self.db_path) as conn:
-                    conn.execute('UPDATE downloads SET status="Queued" WHERE db_id=?', (db_id,))
-                    conn.commit()
-
-        self.stop_all_flag = False
-        self._start_download_batch(selection)
+        self.engine.resume(db_ids)
 
     def pause_selected(self):
-        selection = self.tree.selection()
-        if not selection:
-            all_items = self.tree.get_children()
-            selection = [item for item in all_items if self.tree.item(item, "values")[0] == "☑"]
-            
-        if not selection: return
+        db_ids = self._selection_db_ids()
+        if not db_ids: return
 
-        count = 0
-        for item_id in selection:
-            if item_id in self.active_downloads:
-                self.active_downloads[item_id] = True
-                count += 1
-                self.tree.set(item_id, "Status", "Pausing...")
-        
+        count = self.engine.pause(db_ids)
         if count > 0:
             self.status_label.configure(text=f"Requested pause for {count} downloads.")
             self.send_notification("Downloads Paused", f"Paused {count} active download(s).")
 
     def stop_all(self):
-        self.stop_all_flag = True
-        for item_id in self.active_downloads:
-            self.active_downloads[item_id] = True
-        self.status_label.configure(text="Stopping all active downloads...")
+        self.engine.stop_all()
 
     def download_selected(self):
-        all_items = self.tree.get_children()
-        selected_items = [item for item in all_items if self.tree.item(item, "values")[0] == "☑"]
-        
-        if not selected_items:
+        selected_ids = self._checked_db_ids()
+        if not selected_ids:
             messagebox.showwarning("Warning", "No items selected for download.", parent=self.root)
             return
-            
-        self.stop_all_flag = False
-        self._start_download_batch(selected_items)
+        self.engine.start(selected_ids)
 
     def download_all(self):
-        all_items = self.tree.get_children()
-        if not all_items:
+        all_ids = list(self.job_view)
+        if not all_ids:
             messagebox.showwarning("Warning", "The queue is empty.", parent=self.root)
             return
-            
-        self.stop_all_flag = False
-        self._start_download_batch(all_items)
-
-    def _start_download_batch(self, items):
-        self.status_label.configure(text="Processing Batch...")
-        self.progress_bar.set(0)
-        self.completed_items = 0
-        self.total_items = len(items)
-        
-        # Start the thread pool executor in the background
-        threading.Thread(target=self._run_thread_pool, args=(items,), daemon=True).start()
-
-    def _run_thread_pool(self, items):
-        max_workers = int(self.concurrent_downloads.get())
-        
-        # NEW: Concurrent execution using ThreadPoolExecutor
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(self._download_single_item, item) for item in items]
-            concurrent.futures.wait(futures)
-            
-        # When all threads are completely finished
-        if self.stop_all_flag:
-            msg = "Batch Stopped"
-            detail = "The download batch was terminated by user."
-            status_text = "Stopped"
-            color = "#EF4444"
-        else:
-            msg = "All Downloads Complete"
-            detail = f"Successfully processed {self.total_items} item(s)."
-            status_text = "All downloads in queue complete!"
-            color = "#34D399"
-
-        self.root.after(0, lambda: self.status_label.configure(text=status_text, text_color=color))
-        self.root.after(0, lambda: self.progress_bar.set(1)) 
-        self.root.after(0, lambda: self.send_notification(msg, detail))
-
-        if self.shutdown_pc.get() and not self.stop_all_flag:
-            os.system("shutdown /s /t 10") 
-
-    def _download_single_item(self, item):
-        values = self.tree.item(item, "values")
-        # Indices update due to Selection column at index 0
-        sel, idx, title, url, time_range, media_type, file_size, status = values
-        
-        if status == "Done" or status == "Pausing...":
-            self._increment_global_progress()
-            return 
-            
-        self.root.after(0, lambda i=item: self.tree.set(i, "Status", "Starting..."))
-        
-        # Track as active
-        self.active_downloads[item] = False
-        db_id = int(item.replace("db_", ""))
-        safe_title = re.sub(r'[\\/*?:"<>|]', "", title).strip()
-        
-        # --- Base Options ---
-        ffmpeg_exe = get_ffmpeg_path()
-        ffmpeg_dir = os.path.dirname(ffmpeg_exe) if ffmpeg_exe and os.path.isabs(ffmpeg_exe) else None
-
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'logger': YTDLLogger(self, item),
-            'ffmpeg_location': ffmpeg_dir if ffmpeg_dir else None,
-            'ignoreerrors': True,
-            'progress_hooks': [self.create_per_item_hook(item)],
-            'concurrent_fragment_downloads': 5,
-            'prefer_ffmpeg': True,
-            'postprocessor_args': {
-                'ffmpeg': ['-threads', '0']
-            },
-        }
-        
-        if "Video" in media_type:
-            ydl_opts['postprocessor_args']['ffmpeg'].extend(['-preset', self.PRESET_MAP.get(self.ffmpeg_preset.get(), 'medium')])
-
-        # Extensions and paths logic...
-        ext_choice = "mp4"
-        if "Thumb" in media_type:
-            ext_choice = re.search(r'\((.*?)\)', media_type).group(1)
-        elif "Audio" in media_type:
-            if "wav" in media_type: ext_choice = "wav"
-            elif "m4a" in media_type: ext_choice = "m4a"
-            else: ext_choice = "mp3"
-        
-        final_file_path = ""
-        if time_range != "Full Video":
-            try:
-                if time_range.startswith("*"): # Visual Trimmer Range: *HH:MM:SS-HH:MM:SS
-                    range_clean = time_range[1:]
-                    start_str, end_str = range_clean.split("-")
-                else: # Manual Range: HH:MM:SS to HH:MM:SS
-                    start_str, end_str = time_range.split(" to ")
-                
-                start_sec = parse_time(start_str)
-                end_sec = parse_time(end_str)
-                s = start_sec if start_sec is not None else 0
-                e = end_sec if end_sec is not None else float('inf')
-                
-                # Standard yt-dlp range logic requires ffmpeg_location to be a directory
-                ydl_opts['download_ranges'] = download_range_func(None, [(s, e)])
-                ydl_opts['force_keyframes_at_cuts'] = True
-                
-                # Update UI to indicate progress is blind during trimming
-                self.root.after(0, lambda i=item: self.tree.set(i, "Status", "Trimming (No Progress Bar)..."))
-
-                # Ensure external downloader args are clean
-                if 'external_downloader' in ydl_opts:
-                    del ydl_opts['external_downloader']
-            except Exception as ex:
-                print(f"Error parsing range {time_range}: {ex}")
-
-        self._apply_cookies(ydl_opts)
-        if self.speed_limit.get().isdigit() and int(self.speed_limit.get()) > 0:
-            ydl_opts['ratelimit'] = int(self.speed_limit.get()) * 1024 * 1024 
-        
-        # --- NEW: Native Aggressive Concurrency ---
-        if self.use_aria2.get():
-            ydl_opts['concurrent_fragment_downloads'] = 16
-        else:
-            ydl_opts['concurrent_fragment_downloads'] = 5 # Default
-            
-        # --- NEW: Proxy Support ---
-        if self.proxy_url.get().strip():
-            ydl_opts['proxy'] = self.proxy_url.get().strip()
-
-        if self.download_subs.get() and "Thumb" not in media_type:
-            ydl_opts['writesubtitles'] = True
-            ydl_opts['writeautomaticsub'] = True
-            ydl_opts['subtitleslangs'] = ['en']
-
-        if "Thumb" in media_type:
-            final_file_path = os.path.join(self.download_folder, f'{safe_title}.{ext_choice}')
-            ydl_opts['outtmpl'] = final_file_path
-            ydl_opts['skip_download'] = True 
-            ydl_opts['writethumbnail'] = True
-            ydl_opts['postprocessors'] = [{'key': 'FFmpegThumbnailsConvertor', 'format': ext_choice, 'when': 'before_dl'}]
-        elif "Audio" in media_type:
-            final_file_path = os.path.join(self.download_folder, f'{safe_title}.{ext_choice}')
-            ydl_opts['outtmpl'] = final_file_path
-            bitrate = re.search(r'- (\d+)k', media_type).group(1)
-            ydl_opts['format'] = 'bestaudio/best'
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': ext_choice,
-                'preferredquality': bitrate,
-            }]
-            if self.embed_metadata.get():
-                ydl_opts['writethumbnail'] = True
-                ydl_opts['postprocessors'].extend([{'key': 'EmbedThumbnail'}, {'key': 'FFmpegMetadata'}])
-        else: 
-            res = re.search(r'\((.*?)\)', media_type).group(1) 
-            final_file_path = os.path.join(self.download_folder, f'{safe_title}_{res}.{ext_choice}')
-            ydl_opts['outtmpl'] = final_file_path
-            
-            if res.lower() == "best quality":
-                ydl_opts['format'] = 'bestvideo+bestaudio/best'
+        self.engine.start(all_ids)
+
+    # --- Engine Events ---
+    def on_engine_event(self, event, payload):
+        """Engine subscriber. Called from worker threads, so hop onto the Tk loop."""
+        if event == "job_updated":
+            # Progress arrives many times a second per job; only the latest state is drawn
+            self.pending_rows[payload.db_id] = payload
+            return
+        try:
+            self.root.after(0, lambda: self._handle_engine_event(event, payload))
+        except (RuntimeError, tk.TclError):
+            pass # Window already closed
+
+    def _handle_engine_event(self, event, payload):
+        if event == "job_added":
+            self.job_view.append(payload.db_id)
+        elif event == "job_removed":
+            self.job_view.remove(payload.db_id)
+        elif event == "jobs_updated":
+            self.job_view.refresh_all()
+        elif event == "jobs_reloaded":
+            self.load_history_from_db()
+        elif event == "status":
+            self.status_label.configure(text=payload)
+        elif event == "batch_progress":
+            total = payload["total"]
+            self.progress_bar.set(payload["completed"] / total if total else 0)
+            if payload["completed"]:
+                self.status_label.configure(text=f"Completed {payload['completed']} of {total} files")
+        elif event == "batch_finished":
+            if payload["stopped"]:
+                msg = "Batch Stopped"
+                detail = "The download batch was terminated by user."
+                status_text = "Stopped"
+                color = "#EF4444"
             else:
-                res_map = {"4K": 2160, "1440p": 1440, "1080p": 1080, "720p": 720, "480p": 480, "360p": 360, "240p": 240}
-                target_height = 1080
-                for key, val in res_map.items():
-                    if key in media_type:
-                        target_height = val
-                        break
-                # Video format selection: prioritize best quality up to target height, allowing modern codecs
-                # Fallback 1: Pre-muxed video up to target height
-                # Fallback 2: Best video + best audio (ignores height filter, prevents failing on vertical videos)
-                # Fallback 3: Best pre-muxed video (ignores height filter)
-                # Fallback 4: Any video / any audio
-                ydl_opts['format'] = f'bestvideo[height<={target_height}]+bestaudio/best[height<={target_height}]/bestvideo+bestaudio/best/bestvideo/bestaudio'
-                
-            ydl_opts['merge_output_format'] = 'mp4'
-            if self.embed_metadata.get():
-                ydl_opts['writethumbnail'] = True
-                ydl_opts['postprocessors'] = [{'key': 'EmbedThumbnail'}, {'key': 'FFmpegMetadata'}]
-
+                msg = "All Downloads Complete"
+                detail = f"Successfully processed {payload['total']} item(s)."
+                status_text = "All downloads in queue complete!"
+                color = "#34D399"
+            self.status_label.configure(text=status_text, text_color=color)
+            self.progress_bar.set(1)
+            self.send_notification(msg, detail)
+
+            if self.shutdown_pc.get() and not payload["stopped"]:
+                os.system("shutdown /s /t 10") 
+
+    def _job_row_values(self, job, idx):
+        # Default size to "---" if empty
+        display_size = job.file_size if job.file_size else "---"
+        return (job.sel, idx, job.title, job.url, job.time_range, job.media_type, display_size, job.display_status)
+
+    def flush_row_updates(self):
+        """Draws every row changed since the last frame in one pass. Rows scrolled
+        out of view are redrawn when they come back."""
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Re-fetch info to get sizes for the specific selected quality
-                info = ydl.extract_info(url, download=False)
-                self.metadata_cache[db_id] = info # Update cache with full info
-                size_str = self.estimate_size(info, media_type)
-                self.root.after(0, lambda i=item, s=size_str: self.tree.set(i, "Size", s))
-                
-                info = ydl.extract_info(url, download=True)
-                
-                # Capture the ACTUAL final path from info dict
-                if 'requested_downloads' in info and info['requested_downloads']:
-                    # Prioritize the file that matches our ext_choice or is the largest
-                    downloads = info['requested_downloads']
-                    best_dl = downloads[0]
-                    for dl in downloads:
-                        if dl.get('ext') == ext_choice:
-                            best_dl = dl
-                            break
-                    final_file_path = best_dl.get('filepath', final_file_path)
-                elif '_filename' in info:
-                    final_file_path = info['_filename']
-                
-                # Final check: if we got a webp but expected mp4/mp3, and video exists, use it
-                if final_file_path.endswith(".webp") and not ext_choice.endswith("webp"):
-                    base_p = final_file_path.rsplit(".", 1)[0]
-                    if os.path.exists(base_p + "." + ext_choice):
-                        final_file_path = base_p + "." + ext_choice
-
-            # Check if we stopped mid-download
-            if self.stop_all_flag or self.active_downloads.get(item, False):
-                raise StopDownloadException()
-
-            self.root.after(0, lambda i=item: self.tree.set(i, "Status", "Done"))
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute('UPDATE downloads SET status="Done", file_path=? WHERE db_id=?', (final_file_path, db_id))
-                conn.commit()
-        except StopDownloadException:
-            new_status = "Stopped" if self.stop_all_flag else "Paused"
-            self.root.after(0, lambda i=item, s=new_status: self.tree.set(i, "Status", s))
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute('UPDATE downloads SET status=? WHERE db_id=?', (new_status, db_id))
-                conn.commit()
-        except Exception:
-            self.root.after(0, lambda i=item: self.tree.set(i, "Status", "Error"))
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute('UPDATE downloads SET status="Error" WHERE db_id=?', (db_id,))
-                conn.commit()
-        finally:
-            if item in self.active_downloads:
-                del self.active_downloads[item]
-            if item in self.active_speeds:
-                del self.active_speeds[item]
-            
-        self._increment_global_progress()
-
-    def _increment_global_progress(self):
-        with self.download_lock:
-            self.completed_items += 1
-            progress = self.completed_items / self.total_items
-            self.root.after(0, lambda p=progress: self.progress_bar.set(p))
-            self.root.after(0, lambda c=self.completed_items, t=self.total_items: self.status_label.configure(text=f"Completed {c} of {t} files"))
-
-    def create_per_item_hook(self, item_id):
-        def hook(d):
-            # Check for cancellation
-            if self.stop_all_flag or self.active_downloads.get(item_id, False):
-                print(f"Hook: Cancel detected for {item_id}")
-                raise StopDownloadException()
-
-            if d['status'] == 'downloading':
-                percent = d.get('_percent_str', '0%').strip()
-                speed_str = d.get('_speed_str', 'N/A').strip()
-                
-                # Safely get native float values from yt-dlp
-                raw_speed = d.get('speed')
-                if raw_speed is not None:
-                    self.active_speeds[item_id] = float(raw_speed)
-                    
-                dl_bytes = d.get('downloaded_bytes')
-                if dl_bytes is not None:
-                    self.active_downloaded[item_id] = float(dl_bytes)
-
-                # Update the specific row with its own live stats
-                self.root.after(0, lambda i=item_id, p=percent, s=speed_str: self.tree.set(i, "Status", f"{p} ({s})"))
-                
-            elif d['status'] == 'finished':
-                if item_id in self.active_speeds: del self.active_speeds[item_id]
-                if item_id in self.active_downloaded:
-                    self.session_downloaded_finished += self.active_downloaded.pop(item_id, 0)
-                self.root.after(0, lambda i=item_id: self.tree.set(i, "Status", "Finalizing/Converting..."))
-        return hook
+            for db_id in list(self.pending_rows):
+                # pop after listing: a newer update written meanwhile is still drawn
+                self.pending_rows.pop(db_id, None)
+                self.job_view.refresh(db_id, visible_only=True)
+        except Exception as e:
+            print(f"Row update error: {e}")
+        self.root.after(self.UI_FLUSH_MS, self.flush_row_updates)
+
+    def _job_row(self, db_id, pos):
+        """VirtualTreeview row callback: values and stripe tag for the row at pos."""
+        job = self.engine.get_job(db_id)
+        tag = 'evenrow' if pos % 2 == 0 else 'oddrow'
+        if not job: return ("", pos + 1, "", "", "", "", "", ""), (tag,)
+        return self._job_row_values(job, pos + 1), (tag,)
 
     # --- Dashboard Methods ---
     def setup_dashboard_ui(self):
@@ -2668,7 +2295,10 @@ class DownloadManagerApp:
                      text_color=C["text_dim"]).pack(pady=(14, 4))
         self.sys_info_label = ctk.CTkLabel(self.sys_frame, text="Scanning…",
                                            font=self.font_small, text_color=C["text"])
-        self.sys_info_label.pack(pady=(0, 14))
+        self.sys_info_label.pack(pady=(0, 4))
+        self.encode_info_label = ctk.CTkLabel(self.sys_frame, text="Conversions: idle",
+                                              font=self.font_small, text_color=C["text_dim"])
+        self.encode_info_label.pack(pady=(0, 14))
 
 
 
@@ -2678,7 +2308,7 @@ class DownloadManagerApp:
         try:
             # 1. Update Speed History
             # Use list() to avoid "dictionary changed size during iteration"
-            current_active_speeds = list(self.active_speeds.values())
+            current_active_speeds = list(self.engine.active_speeds.values())
             self.current_speed_avg = sum(current_active_speeds)
             
             if self.current_speed_avg > self.peak_speed:
@@ -2693,8 +2323,8 @@ class DownloadManagerApp:
             # Peak Speed
             self.metric_cards[1].configure(text=self.format_bytes_per_sec(self.peak_speed))
             # Total Downloaded (Live Calculation)
-            total_active_dl = sum(list(self.active_downloaded.values()))
-            total_data = self.session_downloaded_finished + total_active_dl
+            total_active_dl = sum(list(self.engine.active_downloaded.values()))
+            total_data = self.engine.session_downloaded_finished + total_active_dl
             self.metric_cards[2].configure(text=self.format_size_simple(total_data))
             # Session Time
             elapsed = int(time.time() - self.session_start_time)
@@ -2714,6 +2344,14 @@ class DownloadManagerApp:
                 
                 # System
                 self.sys_info_label.configure(text=f"CPU: {psutil.cpu_percent()}% | RAM: {psutil.virtual_memory().percent}%")
+
+            # FFmpeg postprocess pool
+            pp = self.engine.postprocess_metrics()
+            encode_text = (f"Conversions: {pp['running']}/{pp['workers']} running, {pp['pending']} queued"
+                           f" | {pp['threads']} FFmpeg threads")
+            if pp["encode_speed"]:
+                encode_text += f" | {self.format_bytes_per_sec(pp['encode_speed'])}, {pp['encode_seconds']:.1f}s avg"
+            self.encode_info_label.configure(text=encode_text)
         except Exception as e:
             print(f"Dashboard Update Error: {e}")
 
@@ -2748,18 +2386,13 @@ class DownloadManagerApp:
                 self.speed_canvas.create_line(0, y_grid, w, y_grid, fill=C["border"], dash=(4, 4))
         except Exception:
             pass
-    # get_session_total_size replaced by self.active_downloaded dynamic tracking above
+    # get_session_total_size replaced by engine.active_downloaded dynamic tracking above
 
     def format_bytes_per_sec(self, b):
-        if b < 1024: return f"{b:.1f} B/s"
-        if b < 1024 * 1024: return f"{b/1024:.1f} KB/s"
-        return f"{b/(1024*1024):.1f} MB/s"
+        return format_bytes_per_sec(b)
 
     def format_size_simple(self, b):
-        if b is None: return "---"
-        if b < 1024 * 1024: return f"{b/1024:.1f} KB"
-        if b < 1024 * 1024 * 1024: return f"{b/(1024*1024):.1f} MB"
-        return f"{b/(1024*1024*1024):.1f} GB"
+        return format_size_simple(b)
 
     # --- Tray & Notification Methods ---
     def on_minimize(self, event):
@@ -2818,6 +2451,9 @@ class DownloadManagerApp:
         """Completely exit the application."""
         if self.tray_icon:
             self.tray_icon.stop()
+        if getattr(self, 'remote_server', None):
+            self.remote_server.stop()
+        self.engine.close()
         self.root.destroy()
         sys.exit(0)
 
@@ -0,0 +1,281 @@
+"""Batch link import for Media Downloader Pro.
+
+Links from a paste or a file are read lazily, deduplicated by what they point
+at (the extractor and id yt-dlp resolves them to, found without a request)
+and fetched by a few workers, so a large import neither floods the site with
+extractions nor holds the whole file in memory:
+
+    batch = BatchImport(engine, read_links("links.csv"), "Full Video", "Audio (mp3 - 320k)")
+    batch.start()
+    batch.wait()
+"""
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+import threading
+import queue
+import json
+import time
+import csv
+import re
+
+from yt_dlp.extractor import gen_extractor_classes
+
+IMPORT_WORKERS = 3          # links extracted at once
+IMPORT_BACKLOG = 16         # links read ahead of the workers
+IMPORT_ADD_BATCH = 50       # entries queued per database transaction...
+IMPORT_ADD_INTERVAL = 1.0   # ...or after this many seconds, whichever comes first
+PROGRESS_INTERVAL = 0.25    # seconds between on_progress calls
+
+URL_RE = re.compile(r'https?://[^\s"\'<>,]+')
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|si|feature|fbclid|gclid)$')
+
+HOST_MISS_LIMIT = 3         # unclaimed links after which a host skips the extractor scan
+KEY_CACHE_SIZE = 10000
+
+_extractors = None
+_host_misses = {}           # host -> unclaimed links, or None once an extractor claimed one
+_keys = {}                  # normalized URL -> canonical key
+_extractors_lock = threading.Lock()
+
+
+# --- Canonical Links ---
+def _normalize(url):
+    """url with a lowercase scheme and host, and no fragment or tracking parameters."""
+    parts = urlparse(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAMS.match(k)]
+    return urlunparse((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.params,
+                       urlencode(query), ""))
+
+
+def canonical_key(url):
+    """Dedup key for a link, e.g. 'Youtube:dQw4w9WgXcQ' for its watch, youtu.be
+    and shorts URLs alike. Extractors are tried in yt-dlp's own order. Links
+    no extractor claims are keyed by their normalized URL; once a host has had
+    HOST_MISS_LIMIT of those and no claimed ones, its links skip the scan of
+    every extractor's pattern. That only affects duplicate detection: the
+    links are still fetched through yt-dlp as usual."""
+    global _extractors
+    normalized = _normalize(url)
+    host = urlparse(normalized).hostname
+    with _extractors_lock:
+        if normalized in _keys: return _keys[normalized]
+        if _extractors is None:
+            _extractors = [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+        scan = (_host_misses.get(host) or 0) < HOST_MISS_LIMIT
+    key = normalized
+    claimed = False
+    if scan:
+        for ie in _extractors:
+            if not ie.suitable(url): continue
+            video_id = ie.get_temp_id(url)
+            key = f"{ie.ie_key()}:{video_id}" if video_id else f"{ie.ie_key()}:{normalized}"
+            claimed = True
+            break
+    with _extractors_lock:
+        if claimed:
+            _host_misses[host] = None
+        elif scan and _host_misses.get(host, 0) is not None:
+            _host_misses[host] = _host_misses.get(host, 0) + 1
+        if len(_keys) >= KEY_CACHE_SIZE: _keys.clear()
+        _keys[normalized] = key
+    return key
+
+
+# --- Sources ---
+def parse_links(text):
+    """Links in pasted text, one or more per line."""
+    for line in text.splitlines():
+        yield from URL_RE.findall(line)
+
+
+def read_links(path):
+    """Links from a .txt, .csv or .jsonl file, read as they are needed. CSV takes
+    the first link in each row; JSONL takes each object's url or webpage_url,
+    or a plain string."""
+    lower = path.lower()
+    with open(path, encoding="utf-8-sig", errors="replace", newline="") as f:
+        if lower.endswith(".csv"):
+            for row in csv.reader(f):
+                for cell in row:
+                    match = URL_RE.search(cell)
+                    if match:
+                        yield match.group(0)
+                        break
+        elif lower.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if not line.strip(): continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(item, dict):
+                    item = item.get("url") or item.get("webpage_url") or item.get("original_url")
+                if isinstance(item, str) and URL_RE.match(item):
+                    yield item
+        else:
+            for line in f:
+                if not line.lstrip().startswith("#"):
+                    yield from URL_RE.findall(line)
+
+
+# --- Import ---
+class BatchImport:
+    """Fetches links on a bounded pool and queues their entries on the engine.
+
+    on_progress(stats) is called at most every PROGRESS_INTERVAL seconds and
+    once at the end, from a worker thread. on_playlist(url), if given, takes
+    over playlist and channel links (e.g. to open the crawler dialog);
+    otherwise all of their entries are queued.
+    """
+    def __init__(self, engine, links, time_range="Full Video", media_type="Video (Best Quality)",
+                 workers=IMPORT_WORKERS, on_progress=None, on_playlist=None):
+        self.engine = engine
+        self.links = links
+        self.time_range = time_range
+        self.media_type = media_type
+        self.workers = workers
+        self.on_progress = on_progress
+        self.on_playlist = on_playlist
+        self.queue = queue.Queue(IMPORT_BACKLOG)
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.pending = []           # (entries, source) waiting for the next add_entries
+        self.job_ids = []
+        self.counts = {"read": 0, "duplicates": 0, "done": 0, "failed": 0, "playlists": 0, "added": 0}
+        self.reading = True
+        self.running = 0
+        self.last_progress = 0
+        self.last_add = time.monotonic()
+
+    def start(self):
+        self.running = self.workers
+        threading.Thread(target=self._read, daemon=True).start()
+        for _ in range(self.workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+        return self
+
+    def cancel(self):
+        """Stops after the links being fetched; nothing more is read."""
+        self.cancelled.set()
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counts)
+            stats["total"] = None if self.reading else stats["read"] - stats["duplicates"]
+            stats["finished"] = self.finished.is_set()
+        return stats
+
+    def _read(self):
+        seen = set()
+        try:
+            for url in self.links:
+                if self.cancelled.is_set(): break
+                url = url.strip()
+                key = canonical_key(url)
+                with self.lock:
+                    self.counts["read"] += 1
+                    if key in seen:
+                        self.counts["duplicates"] += 1
+                        continue
+                seen.add(key)
+                while not self.cancelled.is_set():
+                    try:
+                        self.queue.put(url, timeout=0.2)
+                        break
+                    except queue.Full:
+                        continue
+        except OSError as e:
+            print(f"Batch import stopped reading: {e}")
+        finally:
+            with self.lock:
+                self.reading = False
+            for _ in range(self.workers):
+                self.queue.put(None)
+
+    def _worker(self):
+        while True:
+            url = self.queue.get()
+            if url is None: break
+            if self.cancelled.is_set(): continue
+            try:
+                entries, source = self._fetch(url)
+                with self.lock:
+                    self.counts["done"] += 1
+                    if entries: self.pending.append((entries, source))
+                    full = (sum(len(e) for e, _ in self.pending) >= IMPORT_ADD_BATCH
+                            or time.monotonic() - self.last_add >= IMPORT_ADD_INTERVAL)
+                if full: self._add_pending()
+            except Exception as e:
+                with self.lock:
+                    self.counts["failed"] += 1
+                print(f"Batch import failed for {url}: {e}")
+            self._progress()
+        with self.lock:
+            self.running -= 1
+            last = self.running == 0
+        if last:
+            self._add_pending()
+            self.finished.set()
+            self._progress(final=True)
+
+    def _fetch(self, url):
+        """(entries, source) for url; no entries if on_playlist took it."""
+        if not self.on_playlist:
+            title, entries = self.engine.fetch(url)
+            if title is not None:
+                with self.lock:
+                    self.counts["playlists"] += 1
+            return entries, title or ""
+        pages = self.engine.crawl(url)
+        try:
+            title, entries = next(pages, (None, []))
+        finally:
+            pages.close()
+        if title is None: return entries, ""
+        with self.lock:
+            self.counts["playlists"] += 1
+        self.on_playlist(url)
+        return [], ""
+
+    def _add_pending(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+            self.last_add = time.monotonic()
+        # Consecutive links from the same source share one transaction
+        groups = []
+        for entries, source in batch:
+            if groups and groups[-1][1] == source:
+                groups[-1][0].extend(entries)
+            else:
+                groups.append((list(entries), source))
+        for entries, source in groups:
+            jobs = self.engine.add_entries(entries, self.time_range, self.media_type, source)
+            with self.lock:
+                self.job_ids.extend(job.db_id for job in jobs)
+                self.counts["added"] += len(jobs)
+
+    def _progress(self, final=False):
+        if not self.on_progress: return
+        now = time.monotonic()
+        with self.lock:
+            if not final and now - self.last_progress < PROGRESS_INTERVAL: return
+            self.last_progress = now
+        try:
+            self.on_progress(self.stats())
+        except Exception as e:
+            print(f"Batch import progress error: {e}")
+
+
+def progress_text(stats):
+    """One-line summary of BatchImport.stats() for a status bar."""
+    total = stats["total"]
+    text = f"Importing links: {stats['done'] + stats['failed']}/{total if total is not None else '...'}"
+    if stats["finished"]:
+        text = f"Imported {stats['added']} items from {stats['done']} links"
+    extras = [f"{stats[k]} {label}" for k, label in (("duplicates", "duplicates skipped"),
+                                                      ("playlists", "playlists"), ("failed", "failed"))
+              if stats[k]]
+    return f"{text} ({', '.join(extras)})" if extras else text
@@ -0,0 +1,166 @@
+"""Offline throughput benchmark for Media Downloader Pro.
+
+Starts the synthetic origin (origin.py) in a child process, queues items that
+the bench extractor (yt_dlp_plugins/extractor/mdp_bench.py) resolves against
+it, and runs them through a real DownloadEngine: extract, download and
+postprocess stages, bandwidth limiter, progress hooks and SQLite writes. No
+network access is needed.
+
+Each scenario (media kind x worker count) reports items/s, MB/s, time to
+first byte (download dispatch to first progress report, p50/p99, from the
+job_spans timeline), CPU seconds per GB in this process (the origin runs
+in its own) and the database writes and transactions it cost.
+
+    python bench/benchmark.py
+    python bench/benchmark.py --kinds dash --workers 1,5,16 --items 64 --latency 0.05 --json run.json
+"""
+import subprocess
+import threading
+import argparse
+import tempfile
+import shutil
+import json
+import time
+import sys
+import os
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)                   # yt_dlp_plugins/ (bench extractor)
+sys.path.insert(1, os.path.dirname(BENCH_DIR))  # the app's modules
+
+from download_engine import DownloadEngine  # noqa: E402
+
+KINDS = ("progressive", "dash", "hls")
+WORKERS = (1, 5, 16)
+BATCH_TIMEOUT = 30 * 60
+
+
+def start_origin(latency, bandwidth):
+    """Runs origin.py in a child process. Returns (process, base URL)."""
+    proc = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "origin.py"), "--latency", str(latency),
+                             "--bandwidth", str(bandwidth)], stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline().strip()
+    if not line.startswith("Serving on "):
+        proc.kill()
+        raise RuntimeError(f"origin failed to start: {line!r}")
+    return proc, line[len("Serving on "):]
+
+
+def percentile(values, q):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def first_byte_times(spans):
+    """Per job: seconds from its download-stage dispatch to the first bytes."""
+    dispatched, first = {}, {}
+    for s in spans:
+        if s["stage"] != "download": continue
+        job = s["job_id"]
+        if s["name"] == "queued":
+            dispatched[job] = min(dispatched.get(job, s["finished"]), s["finished"])
+        elif s["name"] == "download":
+            first[job] = min(first.get(job, s["started"]), s["started"])
+    return [first[job] - dispatched[job] for job in first if job in dispatched]
+
+
+def run_scenario(origin, kind, workers, items, size, frags, embed_metadata=False):
+    """Downloads items of kind with workers simultaneous downloads into a scratch
+    folder and database. Returns the scenario's measurements."""
+    scratch = tempfile.mkdtemp(prefix="mdp-bench-")
+    try:
+        engine = DownloadEngine(os.path.join(scratch, "bench.db"), settings={
+            "download_folder": os.path.join(scratch, "out"), "concurrent_downloads": workers,
+            "embed_metadata": embed_metadata})
+        media_type = "Video (Best Quality)"
+        entries = [{"title": f"{kind} {n}", "url": f"{origin}/watch/{kind}/{kind}{n}?size={size}&frags={frags}"}
+                   for n in range(items)]
+        jobs = engine.add_entries(entries, "Full Video", media_type, source="bench")
+        ids = [job.db_id for job in jobs]
+
+        done = threading.Event()
+        engine.subscribe(lambda event, payload: event == "batch_finished" and done.set())
+        db_before = engine.db_stats()
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        engine.start(ids)
+        if not done.wait(BATCH_TIMEOUT):
+            engine.stop_all()
+        wall = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        db_after = engine.db_stats()
+
+        spans = engine.job_spans(ids)
+        finished = [engine.get_job(db_id) for db_id in ids]
+        done_jobs = [job for job in finished if job and job.status == "Done"]
+        nbytes = sum(os.path.getsize(job.file_path) for job in done_jobs
+                     if job.file_path and os.path.exists(job.file_path))
+        engine.close()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    ttfb = first_byte_times(spans)
+    return {
+        "kind": kind, "workers": workers, "items": items, "done": len(done_jobs),
+        "seconds": wall, "items_per_s": len(done_jobs) / wall, "mb_per_s": nbytes / wall / 1e6,
+        "ttfb_p50_ms": percentile(ttfb, 0.5) * 1000, "ttfb_p99_ms": percentile(ttfb, 0.99) * 1000,
+        "cpu_s_per_gb": cpu / (nbytes / 1e9) if nbytes else 0.0,
+        "db_writes": db_after["writes"] - db_before["writes"],
+        "db_transactions": db_after["transactions"] - db_before["transactions"],
+    }
+
+
+def print_row(r):
+    print(f"{r['kind']:<12} {r['workers']:>7} {r['done']:>4}/{r['items']:<4} {r['seconds']:>7.2f} "
+          f"{r['items_per_s']:>8.2f} {r['mb_per_s']:>8.1f} {r['ttfb_p50_ms']:>9.0f} {r['ttfb_p99_ms']:>9.0f} "
+          f"{r['cpu_s_per_gb']:>9.2f} {r['db_writes']:>9} {r['db_transactions']:>5}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline download throughput benchmark.")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="comma-separated: progressive,dash,hls")
+    parser.add_argument("--workers", default=",".join(map(str, WORKERS)), help="comma-separated worker counts")
+    parser.add_argument("--items", type=int, default=32, help="items per scenario")
+    parser.add_argument("--size", type=float, default=4, help="MB per item")
+    parser.add_argument("--frags", type=int, default=8, help="fragments per DASH/HLS item")
+    parser.add_argument("--latency", type=float, default=0.02, help="origin seconds before every response")
+    parser.add_argument("--bandwidth", type=float, default=0, help="origin MB/s per connection, 0 = unlimited")
+    parser.add_argument("--embed-metadata", action="store_true", help="keep the metadata postprocessors (needs FFmpeg)")
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON, e.g. to compare runs")
+    args = parser.parse_args(argv)
+
+    kinds = [k for k in args.kinds.split(",") if k]
+    unknown = set(kinds) - set(KINDS)
+    if unknown: parser.error(f"unknown kind: {', '.join(sorted(unknown))}")
+    workers = [int(w) for w in args.workers.split(",") if w]
+
+    proc, origin = start_origin(args.latency, args.bandwidth)
+    print(f"Origin {origin}: latency {args.latency * 1000:.0f} ms, "
+          f"{'unlimited' if not args.bandwidth else f'{args.bandwidth:g} MB/s'} per connection; "
+          f"{args.items} x {args.size:g} MB per scenario")
+    print(f"{'kind':<12} {'workers':>7} {'done':>9} {'seconds':>7} {'items/s':>8} {'MB/s':>8} "
+          f"{'TTFB p50':>9} {'TTFB p99':>9} {'CPU s/GB':>9} {'DB writes':>9} {'txns':>5}")
+    results = []
+    try:
+        for kind in kinds:
+            for n in workers:
+                result = run_scenario(origin, kind, n, args.items, int(args.size * 1e6), args.frags,
+                                      args.embed_metadata)
+                results.append(result)
+                print_row(result)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    if args.json:
+        settings = {k: getattr(args, k) for k in ("items", "size", "frags", "latency", "bandwidth", "embed_metadata")}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2)
+    return 0 if all(r["done"] == r["items"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
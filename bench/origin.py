@@ -0,0 +1,178 @@
+"""Local media origin for the Media Downloader Pro benchmarks.
+
+Serves synthetic media over HTTP on 127.0.0.1 so the real download path can
+be measured without network access:
+
+    /watch/<kind>/<id>?size=N&frags=K     page URL the bench extractor matches
+    /manifest/<kind>/<id>?size=N&frags=K  info JSON with the item's formats
+    /media/<id>.mp4?size=N                progressive file, Range requests supported
+    /frag/<id>/<n>.m4s?size=N             one DASH fragment (.ts for HLS)
+    /hls/<id>.m3u8?size=N&frags=K         HLS media playlist
+
+kind is progressive, dash or hls. Items are described entirely by their URL,
+so the origin keeps no state. Every response waits --latency seconds before
+its headers and each connection is paced to --bandwidth MB/s.
+
+    python bench/origin.py --port 8800 --latency 0.05 --bandwidth 10
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import argparse
+import json
+import time
+import re
+
+BLOCK = bytes(range(256)) * 256  # 64 KiB repeated to make any body
+SEGMENT_SECONDS = 4              # nominal duration of one fragment
+
+
+def body(offset, length):
+    """length bytes of the synthetic stream starting at offset."""
+    start = offset % len(BLOCK)
+    data = BLOCK[start:] + BLOCK * ((length - (len(BLOCK) - start)) // len(BLOCK) + 1)
+    return data[:length]
+
+
+def fragment_sizes(size, frags):
+    """Splits size bytes into frags fragments; the last takes the remainder."""
+    frags = max(1, frags)
+    base = size // frags
+    return [base] * (frags - 1) + [size - base * (frags - 1)]
+
+
+def manifest(origin, kind, item_id, size, frags):
+    """yt-dlp info dict for one item, with a single muxed format of the given kind."""
+    fmt = {"format_id": kind, "ext": "mp4", "vcodec": "avc1.4d401f", "acodec": "mp4a.40.2",
+           "width": 1280, "height": 720, "filesize": size}
+    if kind == "progressive":
+        fmt.update(url=f"{origin}/media/{item_id}.mp4?size={size}")
+    elif kind == "dash":
+        fmt.update(url=f"{origin}/frag/{item_id}/", protocol="http_dash_segments",
+                   fragment_base_url=f"{origin}/frag/{item_id}/",
+                   fragments=[{"path": f"{n}.m4s?size={part}", "duration": SEGMENT_SECONDS}
+                              for n, part in enumerate(fragment_sizes(size, frags))])
+    else:
+        fmt.update(url=f"{origin}/hls/{item_id}.m3u8?size={size}&frags={frags}", protocol="m3u8_native")
+    return {"id": str(item_id), "title": f"Bench {kind} {item_id}", "duration": SEGMENT_SECONDS * frags,
+            "webpage_url": f"{origin}/watch/{kind}/{item_id}?size={size}&frags={frags}",
+            "formats": [fmt]}
+
+
+def playlist(item_id, size, frags):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{SEGMENT_SECONDS}", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for n, part in enumerate(fragment_sizes(size, frags)):
+        lines += [f"#EXTINF:{SEGMENT_SECONDS}.0,", f"/frag/{item_id}/{n}.ts?size={part}"]
+    return "\n".join(lines + ["#EXT-X-ENDLIST", ""])
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like a real CDN
+    latency = 0.0
+    bandwidth = 0  # bytes/s per connection, 0 = unlimited
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.handle_request(head=True)
+
+    def do_GET(self):
+        self.handle_request()
+
+    def handle_request(self, head=False):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        size = int(query.get("size", 1024 * 1024))
+        frags = int(query.get("frags", 8))
+        origin = f"http://{self.headers.get('Host', '127.0.0.1')}"
+        if self.latency: time.sleep(self.latency)
+
+        match = re.match(r"/(watch|manifest)/(progressive|dash|hls)/(\w+)$", url.path)
+        if match:
+            page, kind, item_id = match.groups()
+            if page == "watch":
+                return self.send_body(b"<html><body>bench item</body></html>", "text/html", head)
+            data = json.dumps(manifest(origin, kind, item_id, size, frags)).encode()
+            return self.send_body(data, "application/json", head)
+        match = re.match(r"/hls/(\w+)\.m3u8$", url.path)
+        if match:
+            return self.send_body(playlist(match.group(1), size, frags).encode(),
+                                  "application/vnd.apple.mpegurl", head)
+        if re.match(r"/(media/\w+\.mp4|frag/\w+/\d+\.(m4s|ts))$", url.path):
+            return self.send_media(size, head)
+        self.send_error(404)
+
+    def send_body(self, data, content_type, head=False):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if not head: self.wfile.write(data)
+
+    def send_media(self, size, head=False):
+        start, end = 0, size - 1
+        ranged = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range", ""))
+        if ranged and (ranged.group(1) or ranged.group(2)):
+            if ranged.group(1):
+                start = int(ranged.group(1))
+                end = min(int(ranged.group(2)), size - 1) if ranged.group(2) else size - 1
+            else:  # suffix range: the last N bytes
+                start = max(0, size - int(ranged.group(2)))
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if head: return
+
+        chunk = 64 * 1024
+        began = time.monotonic()
+        sent = 0
+        try:
+            for offset in range(start, end + 1, chunk):
+                data = body(offset, min(chunk, end + 1 - offset))
+                self.wfile.write(data)
+                sent += len(data)
+                if self.bandwidth:
+                    ahead = sent / self.bandwidth - (time.monotonic() - began)
+                    if ahead > 0: time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client cancelled or has enough
+
+
+def make_origin(port=0, latency=0.0, bandwidth=0):
+    """A ThreadingHTTPServer on 127.0.0.1:port (0 picks a free one). bandwidth is
+    bytes/s per connection."""
+    handler = type("Handler", (OriginHandler,), {"latency": latency, "bandwidth": bandwidth})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic media origin for benchmarks.")
+    parser.add_argument("--port", type=int, default=0, help="listen port (default: any free port)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every response")
+    parser.add_argument("--bandwidth", type=float, default=0, help="MB/s per connection, 0 = unlimited")
+    args = parser.parse_args(argv)
+
+    server = make_origin(args.port, args.latency, int(args.bandwidth * 1024 * 1024))
+    print(f"Serving on http://127.0.0.1:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,16 @@
+"""yt-dlp extractor for the benchmark origin (bench/origin.py).
+
+Loaded as a yt-dlp plugin only when bench/ is on sys.path, i.e. when running
+bench/benchmark.py; the app itself never sees it.
+"""
+from yt_dlp.extractor.common import InfoExtractor
+
+
+class MediaDownloaderBenchIE(InfoExtractor):
+    IE_NAME = 'mdpbench'
+    _VALID_URL = r'https?://(?:127\.0\.0\.1|localhost):\d+/watch/(?P<kind>progressive|dash|hls)/(?P<id>\w+)'
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        # The origin describes the item (formats, fragments) from the same URL parameters
+        return self._download_json(url.replace('/watch/', '/manifest/', 1), video_id, note='Downloading bench manifest')
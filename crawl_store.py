@@ -0,0 +1,90 @@
+"""Playlist and channel crawl checkpoints for Media Downloader Pro.
+
+Every page a crawl reads is saved with the number of listing entries read so
+far from its source (the playlist itself or one channel tab). Crawling the
+same URL again replays the saved pages from the database and continues each
+source from its position, so a stopped or crashed crawl does not start over.
+A finished crawl's checkpoint is deleted; one left untouched for longer than
+the maximum age is discarded, since the listing has likely changed.
+"""
+import sqlite3
+import json
+import zlib
+import time
+
+from yt_dlp import YoutubeDL
+
+DEFAULT_MAX_AGE = 24 * 3600
+
+
+class CrawlStore:
+    def __init__(self, db_path, writer=None, max_age=DEFAULT_MAX_AGE):
+        self.db_path = db_path
+        self.writer = writer  # DBWriter to queue writes on, or None to write directly
+        self.max_age = max_age
+        self.init_db()
+
+    def init_db(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS crawl_pages (
+                    url TEXT,
+                    source TEXT,
+                    page INTEGER,
+                    position INTEGER,
+                    done INTEGER,
+                    saved REAL,
+                    entries BLOB,
+                    PRIMARY KEY (url, source, page)
+                )
+            ''')
+            stale = time.time() - self.max_age
+            conn.execute('DELETE FROM crawl_pages WHERE url IN (SELECT url FROM crawl_pages GROUP BY url '
+                         'HAVING MAX(saved) < ?)', (stale,))
+            conn.commit()
+
+    def _write(self, sql, params):
+        if self.writer:
+            self.writer.submit(sql, params)
+            return
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(sql, params)
+            conn.commit()
+
+    # --- Public API ---
+    def load(self, url):
+        """The checkpoint of a crawl of url: {source: {"pages": [entries, ...],
+        "position": n, "next_page": n, "done": bool}}, empty if there is none or
+        it is stale. Pages without entries are left out of "pages" but still
+        count towards "next_page", the number to save the source's next page as."""
+        if self.writer: self.writer.flush()
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute('SELECT source, page, position, done, saved, entries FROM crawl_pages '
+                                'WHERE url=? ORDER BY source, page', (url,)).fetchall()
+        if not rows: return {}
+        if time.time() - max(row[4] for row in rows) > self.max_age:
+            self.clear(url)
+            return {}
+        sources = {}
+        for source, page, position, done, _, data in rows:
+            state = sources.setdefault(source, {"pages": [], "position": 0, "next_page": 0, "done": False})
+            try:
+                entries = json.loads(zlib.decompress(data))
+            except Exception:
+                return {}  # a damaged checkpoint is no better than none
+            if entries: state["pages"].append(entries)
+            state["position"] = max(state["position"], position)
+            state["next_page"] = max(state["next_page"], page + 1)
+            state["done"] = state["done"] or bool(done)
+        return sources
+
+    def save(self, url, source, page, position, entries, done=False):
+        """Records page number page of source, position listing entries in."""
+        clean = [YoutubeDL.sanitize_info(dict(e), remove_private_keys=True) for e in entries]
+        self._write('INSERT OR REPLACE INTO crawl_pages (url, source, page, position, done, saved, entries) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (url, source, page, position, 1 if done else 0, time.time(),
+                     zlib.compress(json.dumps(clean).encode('utf-8'))))
+
+    def clear(self, url):
+        self._write('DELETE FROM crawl_pages WHERE url=?', (url,))
@@ -0,0 +1,214 @@
+"""Single-writer SQLite persistence for Media Downloader Pro.
+
+Every write to the history database goes through one background thread that
+owns the only writing connection. Writes queued close together are committed
+in one transaction, so a burst of status changes costs a single fsync instead
+of one per row. The database runs in WAL mode, so readers on other
+connections never block behind the writer.
+"""
+from collections import deque
+import threading
+import sqlite3
+import queue
+import time
+
+BATCH_WINDOW = 0.05     # seconds to keep gathering writes after the first one
+BATCH_MAX = 1000        # statements per transaction
+LATENCY_SAMPLES = 1000  # enqueue-to-commit latencies kept for stats()
+
+
+def connect(db_path):
+    """Opens db_path in WAL mode with synchronous=NORMAL."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class _Op:
+    __slots__ = ("sql", "params", "many", "fn", "queued", "done", "result", "error")
+
+    def __init__(self, sql=None, params=(), many=False, fn=None, wait=False):
+        self.sql = sql
+        self.params = params
+        self.many = many
+        self.fn = fn
+        self.queued = time.perf_counter()
+        self.done = threading.Event() if wait else None
+        self.result = None
+        self.error = None
+
+
+class DBWriter:
+    """Serializes all writes to one SQLite database on a dedicated thread.
+
+    submit() queues a statement and returns immediately. call() runs a function
+    with the writer's connection inside the current batch and returns its
+    result, e.g. to read back lastrowid. flush() waits until everything queued
+    so far is committed; close() flushes and stops the thread.
+    """
+
+    def __init__(self, db_path, batch_window=BATCH_WINDOW, batch_max=BATCH_MAX):
+        self.db_path = db_path
+        self.batch_window = batch_window
+        self.batch_max = batch_max
+        self.queue = queue.Queue()
+        self.closed = False
+
+        # Metrics
+        self.stats_lock = threading.Lock()
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.writes = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_commit_ms = 0.0
+        self.latency_total_ms = 0.0  # over every write, not just the kept samples
+
+        self.conn = None
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(ready,), name="db-writer", daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    # --- Public API ---
+    def submit(self, sql, params=()):
+        """Queues one write statement."""
+        self._put(_Op(sql, params))
+
+    def submit_many(self, sql, seq):
+        """Queues sql for every parameter tuple in seq."""
+        seq = list(seq)
+        if seq: self._put(_Op(sql, seq, many=True))
+
+    def call(self, fn):
+        """Runs fn(conn) on the writer thread as part of the next transaction and
+        returns its result once committed. Exceptions are re-raised here."""
+        if threading.current_thread() is self.thread:
+            return fn(self.conn)
+        op = _Op(fn=fn, wait=True)
+        self._put(op)
+        op.done.wait()
+        if op.error: raise op.error
+        return op.result
+
+    def flush(self, timeout=None):
+        """Blocks until every write queued before this call is committed."""
+        if self.closed or threading.current_thread() is self.thread: return True
+        op = _Op(wait=True)
+        self._put(op)
+        return op.done.wait(timeout)
+
+    def close(self, timeout=10):
+        """Commits pending writes and stops the writer thread."""
+        if self.closed: return
+        self.flush(timeout)
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def stats(self, quantiles=(0.5, 0.95, 0.99)):
+        """Queue depth, batch sizes and enqueue-to-commit latency in milliseconds."""
+        with self.stats_lock:
+            samples = sorted(self.latencies)
+            batches = self.batches
+            pick = lambda q: samples[max(0, int(len(samples) * q) - 1)] if samples else 0.0
+            return {
+                "pending": self.queue.qsize(),
+                "writes": self.writes,
+                "transactions": batches,
+                "failures": self.failures,
+                "avg_batch": self.writes / batches if batches else 0.0,
+                "last_commit_ms": self.last_commit_ms,
+                "latency_avg_ms": sum(samples) / len(samples) if samples else 0.0,
+                "latency_p95_ms": pick(0.95),
+                "latency_max_ms": samples[-1] if samples else 0.0,
+                "latency_quantiles_ms": {q: pick(q) for q in quantiles},
+                "latency_total_ms": self.latency_total_ms,
+            }
+
+    # --- Writer Thread ---
+    def _put(self, op):
+        if self.closed:
+            raise RuntimeError("database writer is closed")
+        self.queue.put(op)
+
+    def _gather(self, first):
+        """Collects the batch that starts with first. Keeps waiting up to the
+        batch window for more writes unless a caller is blocked on this batch."""
+        batch = [first]
+        deadline = time.perf_counter() + self.batch_window
+        waiting = first.done is not None
+        while len(batch) < self.batch_max:
+            remaining = deadline - time.perf_counter()
+            try:
+                if waiting or remaining <= 0:
+                    op = self.queue.get_nowait()
+                else:
+                    op = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if op is None:
+                self.queue.put(None)  # stop after this batch
+                break
+            batch.append(op)
+            waiting = waiting or op.done is not None
+        return batch
+
+    def _apply(self, op):
+        if op.fn:
+            op.result = op.fn(self.conn)
+        elif op.sql and op.many:
+            self.conn.executemany(op.sql, op.params)
+        elif op.sql:
+            self.conn.execute(op.sql, op.params)
+
+    def _rollback(self):
+        if self.conn.in_transaction:
+            self.conn.execute('ROLLBACK')
+
+    def _commit(self, batch):
+        if not any(op.sql or op.fn for op in batch):  # only flush markers
+            for op in batch: op.done.set()
+            return
+        started = time.perf_counter()
+        try:
+            self.conn.execute('BEGIN')
+            for op in batch:
+                self._apply(op)
+            self.conn.execute('COMMIT')
+        except Exception as e:
+            # One bad statement must not take the rest of the batch with it
+            self._rollback()
+            print(f"Database batch failed, retrying writes one by one: {e}")
+            for op in batch:
+                try:
+                    self.conn.execute('BEGIN')
+                    self._apply(op)
+                    self.conn.execute('COMMIT')
+                except Exception as e:
+                    self._rollback()
+                    op.error = e
+                    with self.stats_lock:
+                        self.failures += 1
+                    if not op.done: print(f"Database write failed: {e}")
+        finished = time.perf_counter()
+
+        with self.stats_lock:
+            self.batches += 1
+            self.writes += sum(1 for op in batch if op.sql or op.fn)
+            self.last_commit_ms = (finished - started) * 1000
+            latencies = [(finished - op.queued) * 1000 for op in batch if op.sql or op.fn]
+            self.latencies.extend(latencies)
+            self.latency_total_ms += sum(latencies)
+        for op in batch:
+            if op.done: op.done.set()
+
+    def _run(self, ready):
+        self.conn = connect(self.db_path)
+        self.conn.isolation_level = None  # transactions are managed in _commit
+        ready.set()
+        while True:
+            op = self.queue.get()
+            if op is None: break
+            self._commit(self._gather(op))
+        self.conn.close()
@@ -0,0 +1,1908 @@
+"""Headless download engine for Media Downloader Pro.
+
+The engine owns the job list, the download workers and the progress events.
+It never touches Tk: the CTk window and the remote server subscribe to its
+events and render them. It can also run on its own as a console daemon:
+
+    python download_engine.py URL [URL ...] --type "Audio (mp3 - 320k)"
+"""
+import yt_dlp
+from yt_dlp.utils import download_range_func
+import argparse
+import threading
+import heapq
+import queue
+import itertools
+import glob
+import json
+import random
+from urllib.parse import urlparse
+import os
+import sys
+import re
+import sqlite3
+import datetime
+import time
+
+from metadata_store import MetadataStore
+from crawl_store import CrawlStore
+from snapshot_store import SnapshotStore
+from db_writer import DBWriter, connect
+from toolchain import probe_toolchain, AUDIO_ENCODERS
+from metrics import EngineMetrics
+from job_trace import JobTrace, chrome_trace
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "downloader_history.db")
+
+# Engine settings and their defaults. The UI pushes changes via configure().
+DEFAULT_SETTINGS = {
+    "download_folder": os.path.join(os.path.expanduser("~"), "Downloads"),
+    "embed_metadata": True,
+    "download_subs": False,
+    "speed_limit": 0,            # MB/s, 0 = unlimited
+    "browser_cookie": "None",
+    "concurrent_downloads": 1,
+    "use_aria2": False,
+    "proxy_url": "",
+    "ffmpeg_preset": "medium",
+    "remote_host": "0.0.0.0",    # remote control bind address
+    "remote_port": 5000,
+}
+
+SEL_ON = "☑"
+
+# Statuses a job can only be left in by a crash mid-download
+INTERRUPTED_STATUSES = ("Starting...", "Downloading", "Finalizing/Converting...", "Trimming (No Progress Bar)...")
+# yt-dlp leftovers: .part files, fragment parts and the .ytdl fragment-resume state
+PARTIAL_FILE_RE = re.compile(r'\.part(-Frag\d+(\.part)?)?$|\.ytdl$')
+
+# --- Failure Classification ---
+# Checked in order against yt-dlp's error text; anything unmatched is "unknown"
+ERROR_PATTERNS = [
+    ("throttled", re.compile(r"HTTP Error (429|403)|Too Many Requests|rate.?limit|confirm you.re not a bot", re.I)),
+    ("unavailable", re.compile(r"Video unavailable|Private video|has been removed|HTTP Error (404|410)|"
+                               r"not available in your country|members.only|copyright|terminated|"
+                               r"Unsupported URL|does not exist|Premieres in|live event will begin", re.I)),
+    ("network", re.compile(r"timed? ?out|Connection (reset|refused|aborted)|Remote end closed|IncompleteRead|"
+                           r"name resolution|Name or service not known|getaddrinfo failed|Network is unreachable|"
+                           r"HTTP Error 5\d\d|SSL|urlopen error|bytes read", re.I)),
+    ("extractor", re.compile(r"Unable to (extract|parse)|please report this issue|nsig extraction failed|"
+                             r"Signature extraction failed|Requested format is not available", re.I)),
+]
+ERROR_LABELS = {"throttled": "Throttled", "unavailable": "Unavailable", "network": "Network",
+                "extractor": "Extractor", "unknown": "Unknown"}
+TRANSIENT_ERRORS = ("network", "throttled")
+RETRY_LIMIT = 5
+RETRY_BASE_DELAY = 10       # seconds, doubled per attempt and jittered
+RETRY_MAX_DELAY = 15 * 60
+HOST_COOLDOWN = 2 * 60      # minimum rest for a host that throttled us
+
+# --- Pipeline ---
+# Extraction runs ahead of the downloads, FFmpeg postprocessing behind them,
+# each stage on its own pool so an encode never holds a network slot.
+EXTRACT_WORKERS = 2
+EXTRACT_LOOKAHEAD = 2       # extracted jobs waiting per download worker
+RESERVED_CORES = 1          # kept free for the UI and the network stages
+CPU_SAMPLE_MIN = 0.5        # seconds of CPU time per core a load reading spans at least
+POSTPROCESS_MAX_WORKERS = 4
+
+# Cached info younger than this is handed straight to the downloader; format
+# URLs from most sites stay valid well past it.
+INFO_REUSE_AGE = 30 * 60
+
+# History search ranks matches by relevance only when there are at most this many
+SEARCH_RANK_LIMIT = 1000
+
+# Playlist and channel entries are handed to the UI in pages of this size
+CRAWL_PAGE_SIZE = 200
+CRAWL_WORKERS = 2           # channel tabs read at once
+CRAWL_PREFETCH = 2          # pages read ahead of the caller per reader
+CRAWL_RETRIES = 3
+
+
+class StopDownloadException(Exception):
+    """Custom exception to stop yt-dlp download gracefully."""
+    pass
+
+class Counters:
+    """Thread-safe named event counters, e.g. how many extractions a batch cost."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.values[name] = self.values.get(name, 0) + n
+
+    def get(self, name):
+        return self.values.get(name, 0)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+class CountingYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL that counts every extractor run, including the ones
+    process_ie_result triggers internally for url/url_transparent results."""
+    def __init__(self, params=None, counters=None, **kwargs):
+        super().__init__(params, **kwargs)
+        self.counters = counters
+
+    def extract_info(self, url, *args, **kwargs):
+        if self.counters: self.counters.incr("extract_info")
+        return super().extract_info(url, *args, **kwargs)
+
+class YTDLLogger:
+    """Custom logger that checks for cancellation at every message."""
+    def __init__(self, engine, job_id):
+        self.engine = engine
+        self.job_id = job_id
+        self.errors = 0
+        self.last_error = None
+
+    def debug(self, msg): self._check_cancel()
+    def info(self, msg):
+        # print(f"YT-DLP Info: {msg}") # Uncomment to see all info logs
+        self._check_cancel()
+
+    def warning(self, msg): self._check_cancel()
+
+    def error(self, msg):
+        print(f"YT-DLP Error: {msg}")
+        self.errors += 1
+        self.last_error = msg
+        self._check_cancel()
+
+    def _check_cancel(self):
+        if self.engine.is_cancelled(self.job_id):
+            print(f"YTDLLogger: Cancel detected for {self.job_id}")
+            raise StopDownloadException()
+
+
+def get_ffmpeg_path():
+    """Locates and returns the path to the ffmpeg executable, or None. Uses the
+    memoized toolchain probe, so no process is spawned per call."""
+    return probe_toolchain().ffmpeg
+
+def parse_time(time_str):
+    """Converts hh:mm:ss or mm:ss into total seconds for yt-dlp."""
+    if not time_str or time_str.strip().lower() == "end":
+        return None
+    parts = time_str.strip().split(':')
+    parts.reverse()
+    total_seconds = 0
+    for i, part in enumerate(parts):
+        total_seconds += int(part) * (60 ** i)
+    return total_seconds
+
+def format_bytes_per_sec(b):
+    if b < 1024: return f"{b:.1f} B/s"
+    if b < 1024 * 1024: return f"{b/1024:.1f} KB/s"
+    return f"{b/(1024*1024):.1f} MB/s"
+
+def format_size_simple(b):
+    if b is None: return "---"
+    if b < 1024 * 1024: return f"{b/1024:.1f} KB"
+    if b < 1024 * 1024 * 1024: return f"{b/(1024*1024):.1f} MB"
+    return f"{b/(1024*1024*1024):.1f} GB"
+
+def estimate_size(info, media_type):
+    """Attempts to estimate file size based on selected media_type."""
+    if not info or 'formats' not in info:
+        return "---"
+
+    formats = info.get('formats', [])
+    if not formats: return "---"
+
+    try:
+        # Audio Mode
+        if "Audio" in media_type:
+            audio_formats = [f for f in formats if f.get('vcodec') == 'none' or f.get('acodec') != 'none']
+            if not audio_formats: return "---"
+
+            # Try to find a format with filesize
+            with_size = [f for f in audio_formats if f.get('filesize') or f.get('filesize_approx')]
+            if not with_size: return "---"
+
+            best_audio = max(with_size, key=lambda f: f.get('abr', 0) or 0)
+            size = best_audio.get('filesize') or best_audio.get('filesize_approx')
+            return format_size_simple(size)
+
+        # Video Mode
+        elif "Video" in media_type:
+            res_str = re.search(r'\((.*?)\)', media_type).group(1)
+            res_val = int(res_str.replace("p", ""))
+
+            # Find best video format for this resolution
+            video_formats = [f for f in formats if f.get('height') == res_val]
+            if not video_formats:
+                video_formats = [f for f in formats if f.get('height') and f.get('height') <= res_val]
+
+            if not video_formats: return "---"
+
+            # Sort by height then bitrate
+            video_formats.sort(key=lambda f: (f.get('height', 0), f.get('tbr', 0)), reverse=True)
+            best_video = video_formats[0]
+
+            v_size = best_video.get('filesize') or best_video.get('filesize_approx')
+
+            # Find an audio format to add to it if it's video-only
+            if best_video.get('vcodec') != 'none' and best_video.get('acodec') == 'none':
+                audio_formats = [f for f in formats if f.get('vcodec') == 'none']
+                if audio_formats:
+                    best_audio = max(audio_formats, key=lambda f: f.get('abr', 0) or 0)
+                    a_size = best_audio.get('filesize') or best_audio.get('filesize_approx')
+                    if v_size and a_size:
+                        return format_size_simple(v_size + a_size)
+
+            return format_size_simple(v_size) if v_size else "---"
+    except:
+        return "---"
+
+    return "---"
+
+def classify_error(message):
+    """Maps a yt-dlp error message to one of ERROR_LABELS' keys."""
+    for kind, pattern in ERROR_PATTERNS:
+        if message and pattern.search(message):
+            return kind
+    return "unknown"
+
+def cpu_cores():
+    if PSUTIL_AVAILABLE:
+        return psutil.cpu_count(logical=True) or 2
+    return os.cpu_count() or 2
+
+def postprocess_workers(cores=None):
+    """FFmpeg pool size: half the usable cores, at most POSTPROCESS_MAX_WORKERS."""
+    usable = max(1, (cores or cpu_cores()) - RESERVED_CORES)
+    return max(1, min(POSTPROCESS_MAX_WORKERS, usable // 2))
+
+def downloaded_files(info):
+    """Paths yt-dlp reports as written for info that exist on disk."""
+    paths = [dl.get('filepath') for dl in (info or {}).get('requested_downloads') or []]
+    return [p for p in paths if p and os.path.exists(p)]
+
+def entries_from(entries, position):
+    """Iterator over a playlist's entries from index position on. A paged list
+    (sites with numbered API pages) starts at the page holding position;
+    continuation-based listings have to be read up to it."""
+    if isinstance(entries, yt_dlp.utils.PagedList):
+        return entries._getslice(position, None)
+    return itertools.islice(entries or [], position, None)
+
+def entry_url(entry):
+    """Best-effort watch URL for a yt-dlp info dict or flat playlist entry."""
+    vid_url = entry.get('webpage_url') or entry.get('original_url') or entry.get('url')
+    if not vid_url and entry.get('id'): vid_url = f"https://www.youtube.com/watch?v={entry['id']}"
+    return vid_url
+
+
+class Job:
+    """One queue entry: a row of the downloads table plus its live progress."""
+    DB_FIELDS = ("sel", "title", "url", "time_range", "media_type", "status", "file_path", "file_size",
+                 "source", "priority")
+
+    def __init__(self, db_id, sel=SEL_ON, title="", url="", time_range="Full Video", media_type="",
+                 status="Queued", file_path="", file_size="", timestamp="", source="", priority=0):
+        self.db_id = db_id
+        self.sel = sel
+        self.title = title
+        self.url = url
+        self.time_range = time_range
+        self.media_type = media_type
+        self.status = status
+        self.file_path = file_path
+        self.file_size = file_size
+        self.timestamp = timestamp
+        self.source = source or ""      # Playlist/channel the job came from; fair-share key
+        self.priority = priority or 0   # Higher runs first
+        # Live progress, never persisted
+        self.progress = 0.0
+        self.speed = 0.0
+        self.speed_str = ""
+        self.downloaded_bytes = 0
+
+    @property
+    def display_status(self):
+        """Status text as shown in the queue, with live progress while downloading."""
+        if self.status == "Downloading":
+            return f"{self.progress:.1f}% ({self.speed_str})"
+        return self.status
+
+    def to_dict(self):
+        return {
+            "id": self.db_id,
+            "sel": self.sel,
+            "title": self.title,
+            "url": self.url,
+            "time_range": self.time_range,
+            "media_type": self.media_type,
+            "status": self.status,
+            "file_path": self.file_path,
+            "size": self.file_size,
+            "timestamp": self.timestamp,
+            "source": self.source,
+            "priority": self.priority,
+            "progress": self.progress,
+            "speed": self.speed_str,
+            "speed_bps": self.speed,
+            "downloaded_bytes": self.downloaded_bytes,
+        }
+
+
+class JobScheduler:
+    """Persistent worker pool fed by per-source priority queues.
+
+    Higher priority runs first. Among sources tied on priority, the one with
+    the fewest running jobs (then the least recently served) goes next, so a
+    long channel crawl cannot starve a single link queued after it. Jobs
+    submitted with a delay wait aside until they are due.
+    """
+
+    def __init__(self, worker_fn, max_workers=1, on_idle=None, name=""):
+        self.worker_fn = worker_fn
+        self.on_idle = on_idle
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.cond = threading.Condition()
+        self.queues = {}          # source -> heap of [-priority, seq, db_id, source]
+        self.entries = {}         # db_id -> live heap entry, pending jobs only
+        self.running = {}         # db_id -> source
+        self.started = {}         # db_id -> time.monotonic() its run began
+        self.queued_at = {}       # db_id -> time.time() it was submitted, pending jobs only
+        self.waited = {}          # db_id -> (submitted, dispatched) wall times, running jobs only
+        self.busy_seconds = 0.0   # worker time spent in finished runs
+        self.source_running = {}  # source -> running count
+        self.last_served = {}     # source -> dispatch number
+        self.delayed = []         # heap of [due time, seq, entry] not yet dispatchable
+        self.seq = 0
+        self.dispatched = 0
+        self.workers = []
+        self.resize(self.max_workers)
+
+    def resize(self, max_workers):
+        """Changes the pool size live; surplus workers exit after their current job."""
+        with self.cond:
+            self.max_workers = max(1, int(max_workers))
+            while len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self._worker_loop, daemon=True)
+                self.workers.append(worker)
+                worker.start()
+            self.cond.notify_all()
+
+    def submit(self, db_id, priority=0, source="", delay=0):
+        """Queues db_id, dispatchable after delay seconds. Returns True if newly
+        queued, False if it was already pending or running. A running job may
+        requeue itself with a delay (retries, cooldowns)."""
+        with self.cond:
+            if db_id in self.running and not delay:
+                return False
+            is_new = db_id not in self.entries
+            if not is_new:
+                self._discard(db_id)
+            self.queued_at.setdefault(db_id, time.time())
+            self.seq += 1
+            entry = [-priority, self.seq, db_id, source]
+            if delay > 0:
+                heapq.heappush(self.delayed, [time.monotonic() + delay, self.seq, entry])
+            else:
+                heapq.heappush(self.queues.setdefault(source, []), entry)
+            self.entries[db_id] = entry
+            self.cond.notify()
+            return is_new
+
+    def discard(self, db_ids):
+        """Drops pending jobs. Returns the db_ids that were actually pending."""
+        with self.cond:
+            for db_id in db_ids: self.queued_at.pop(db_id, None)
+            return [db_id for db_id in db_ids if self._discard(db_id)]
+
+    def clear(self):
+        """Drops every pending job and returns their db_ids."""
+        with self.cond:
+            self.queued_at.clear()
+            return [db_id for db_id in list(self.entries) if self._discard(db_id)]
+
+    def _discard(self, db_id):
+        entry = self.entries.pop(db_id, None)
+        if entry is None:
+            return False
+        entry[2] = None  # Lazy deletion, skipped when it reaches the heap top
+        return True
+
+    def is_pending(self, db_id):
+        return db_id in self.entries
+
+    def is_running(self, db_id):
+        return db_id in self.running
+
+    def wait_span(self, db_id):
+        """(submitted, dispatched) wall times of db_id's current run, or None."""
+        return self.waited.get(db_id)
+
+    def stats(self):
+        with self.cond:
+            now = time.monotonic()
+            return {"pending": len(self.entries), "running": len(self.running),
+                    "workers": self.max_workers,
+                    "busy_seconds": self.busy_seconds + sum(now - t for t in self.started.values())}
+
+    def _next(self):
+        """Pops the next dispatchable job, or returns the seconds until a delayed one is due."""
+        now = time.monotonic()
+        while self.delayed and (self.delayed[0][0] <= now or self.delayed[0][2][2] is None):
+            _, _, entry = heapq.heappop(self.delayed)
+            if entry[2] is not None:
+                heapq.heappush(self.queues.setdefault(entry[3], []), entry)
+        best = None
+        for source, heap in self.queues.items():
+            while heap and heap[0][2] is None:
+                heapq.heappop(heap)
+            if not heap: continue
+            key = (heap[0][0], self.source_running.get(source, 0), self.last_served.get(source, 0))
+            if best is None or key < best[0]:
+                best = (key, source)
+        # Forget drained sources so the scan stays proportional to active ones
+        for source in [s for s, heap in self.queues.items() if not heap]:
+            del self.queues[source]
+        if best is None:
+            return self.delayed[0][0] - now if self.delayed else None
+        source = best[1]
+        _, _, db_id, _ = heapq.heappop(self.queues[source])
+        del self.entries[db_id]
+        return db_id, source
+
+    def _worker_loop(self):
+        me = threading.current_thread()
+        while True:
+            with self.cond:
+                while True:
+                    if len(self.workers) > self.max_workers:
+                        self.workers.remove(me)
+                        return
+                    item = self._next()
+                    if isinstance(item, tuple): break
+                    self.cond.wait(item)
+                db_id, source = item
+                self.dispatched += 1
+                self.running[db_id] = source
+                self.started[db_id] = time.monotonic()
+                now = time.time()
+                self.waited[db_id] = (self.queued_at.pop(db_id, now), now)
+                self.source_running[source] = self.source_running.get(source, 0) + 1
+                self.last_served[source] = self.dispatched
+
+            try:
+                self.worker_fn(db_id)
+            except Exception as e:
+                print(f"Scheduler worker error for {db_id}: {e}")
+            finally:
+                with self.cond:
+                    del self.running[db_id]
+                    self.busy_seconds += time.monotonic() - self.started.pop(db_id)
+                    self.waited.pop(db_id, None)
+                    self.source_running[source] -= 1
+                    if not self.source_running[source]:
+                        del self.source_running[source]
+                    idle = not self.running and not self.entries
+                if idle and self.on_idle:
+                    self.on_idle()
+
+
+class BandwidthLimiter:
+    """Process-wide token bucket that every download draws from.
+
+    The bucket refills at rate bytes/s, so concurrent downloads together never
+    exceed the configured cap. Within that cap each registered consumer is paced
+    to its weighted share of the rate among consumers that drew recently, so a
+    prioritized job gets more of the link without starving the rest.
+    """
+    BURST = 0.5     # seconds of rate the bucket can bank
+    IDLE = 2.0      # consumers silent this long stop counting toward shares
+
+    def __init__(self, rate=0):
+        self.cond = threading.Condition()
+        self.rate = 0
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+        self.consumers = {}  # key -> {"weight", "next", "seen"}
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """Changes the cap live; 0 disables limiting. Waiting downloads re-pace at once."""
+        with self.cond:
+            self._refill()
+            self.rate = max(0, rate or 0)
+            self.tokens = min(self.tokens, self.rate * self.BURST)
+            self.cond.notify_all()
+
+    def register(self, key, weight=1):
+        with self.cond:
+            now = time.monotonic()
+            self.consumers[key] = {"weight": max(weight, 0.01), "next": now, "seen": now}
+
+    def set_weight(self, key, weight):
+        with self.cond:
+            if key in self.consumers:
+                self.consumers[key]["weight"] = max(weight, 0.01)
+                self.cond.notify_all()
+
+    def unregister(self, key):
+        with self.cond:
+            self.consumers.pop(key, None)
+            self.cond.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.tokens + (now - self.stamp) * self.rate, self.rate * self.BURST)
+        self.stamp = now
+        return now
+
+    def _share(self, key, now):
+        active = [c["weight"] for k, c in self.consumers.items() if k == key or now - c["seen"] < self.IDLE]
+        return self.rate * self.consumers[key]["weight"] / sum(active)
+
+    def consume(self, key, nbytes, cancelled=None):
+        """Blocks until nbytes may be counted against key's share and the bucket.
+        A chunk larger than the bucket is let through as debt that later calls repay."""
+        if nbytes <= 0: return
+        with self.cond:
+            if key not in self.consumers:
+                self.register(key)
+            consumer = self.consumers[key]
+            while self.rate:
+                now = self._refill()
+                consumer["seen"] = now
+                wait = consumer["next"] - now
+                if wait <= 0 and self.tokens >= 0:
+                    self.tokens -= nbytes
+                    share = self._share(key, now)
+                    consumer["next"] = max(consumer["next"], now - self.BURST) + nbytes / share
+                    return
+                if cancelled and cancelled(): return
+                wait = max(wait, -self.tokens / self.rate)
+                self.cond.wait(min(wait, 0.25))
+
+
+class DownloadEngine:
+    """Owns jobs, workers and progress events. Safe to drive from any thread.
+
+    Subscribers are called as ``callback(event, payload)`` on whichever thread
+    produced the event, so UI subscribers must marshal to their own loop.
+    Events: job_added, job_updated, job_removed (payload: Job), jobs_updated
+    (payload: list of Jobs), jobs_reloaded, status (payload: text),
+    batch_progress and batch_finished (payload: dict).
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, settings=None):
+        self.db_path = db_path
+        self.init_db()
+        self.db = DBWriter(self.db_path)  # every write after init_db goes through here
+
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.load_settings()
+        if settings: self.settings.update(settings)
+
+        self.jobs = {}
+        self.lock = threading.RLock()
+        self.subscribers = []
+        self.status_text = "Ready"
+        self.counters = Counters()
+        self.metrics = EngineMetrics()  # scraped through the remote server's /metrics
+        self.bandwidth = BandwidthLimiter(self.settings["speed_limit"] * 1024 * 1024)
+        self.bandwidth_weights = {}
+        self.retry_attempts = {}    # db_id -> failed attempts in a row
+        self.host_cooldowns = {}    # host -> time.time() before which its jobs wait
+        # Pipeline stages: extract -> download -> postprocess
+        self.extract_stage = JobScheduler(self._extract_job, EXTRACT_WORKERS, on_idle=self._on_stage_idle,
+                                          name="extract")
+        self.scheduler = JobScheduler(self._download_job, self.settings["concurrent_downloads"],
+                                      on_idle=self._on_stage_idle, name="download")
+        self.postprocess_stage = JobScheduler(self._postprocess_job, postprocess_workers(),
+                                              on_idle=self._on_stage_idle, name="postprocess")
+        self.stages = (self.extract_stage, self.scheduler, self.postprocess_stage)
+        self.converting = {}        # db_id -> download results awaiting the postprocess stage
+        self.encode_threads = {}    # db_id -> ffmpeg -threads of a running conversion
+        self.encode_history = []    # (input bytes, seconds) of recent conversions
+        self.cpu_sample = psutil.cpu_times() if PSUTIL_AVAILABLE else None  # baseline for cpu_busy()
+        self.cpu_busy_last = 0.0
+        self.batch_open = False
+
+        # Download State Tracking
+        self.active_downloads = {}
+        self.stop_all_flag = False
+        self.metadata = MetadataStore(self.db_path, writer=self.db)
+        self.crawls = CrawlStore(self.db_path, writer=self.db)
+        self.completed_items = 0
+        self.total_items = 0
+
+        # Dashboard State
+        self.active_speeds = {}
+        self.active_downloaded = {}
+        self.session_downloaded_finished = 0
+
+        self.load_jobs()
+        self.snapshots = SnapshotStore(self)  # versioned job state for the remote API
+
+    # --- Events ---
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def emit(self, event, payload=None):
+        for callback in list(self.subscribers):
+            try:
+                callback(event, payload)
+            except Exception as e:
+                print(f"Engine subscriber error ({event}): {e}")
+
+    def set_status_text(self, text):
+        self.status_text = text
+        self.emit("status", text)
+
+    def configure(self, **settings):
+        """Update engine settings. Download options apply to the next job started;
+        concurrent_downloads and speed_limit take effect immediately."""
+        self.settings.update(settings)
+        if "concurrent_downloads" in settings:
+            self.scheduler.resize(self.settings["concurrent_downloads"])
+        if "speed_limit" in settings:
+            self.bandwidth.set_rate(self.settings["speed_limit"] * 1024 * 1024)
+
+    # --- Database Methods ---
+    def init_db(self):
+        with connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            # Settings Table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            # Downloads Table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS downloads (
+                    db_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sel TEXT,
+                    title TEXT,
+                    url TEXT,
+                    time_range TEXT,
+                    media_type TEXT,
+                    status TEXT,
+                    file_path TEXT,
+                    timestamp TEXT
+                )
+            ''')
+
+            # Migration: Add file_size column if it doesn't exist
+            cursor.execute("PRAGMA table_info(downloads)")
+            columns = [info[1] for info in cursor.fetchall()]
+            if 'file_size' not in columns:
+                try:
+                    cursor.execute('ALTER TABLE downloads ADD COLUMN file_size TEXT')
+                except Exception as e:
+                    print(f"Migration Error: {e}")
+            # Migration: scheduler columns
+            for column, ddl in [('source', 'TEXT'), ('priority', 'INTEGER DEFAULT 0')]:
+                if column not in columns:
+                    try:
+                        cursor.execute(f'ALTER TABLE downloads ADD COLUMN {column} {ddl}')
+                    except Exception as e:
+                        print(f"Migration Error: {e}")
+
+            # Indexes for lookups by url, status and date
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_url ON downloads (url)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_status ON downloads (status)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_timestamp ON downloads (timestamp)')
+
+            # Stage timeline of every run of a job (see job_trace.py)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS job_spans (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id INTEGER,
+                    attempt INTEGER,
+                    stage TEXT,
+                    name TEXT,
+                    started REAL,
+                    finished REAL,
+                    detail TEXT
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_spans_job ON job_spans (job_id)')
+            self.fts_available = self._init_search_index(cursor)
+
+            conn.commit()
+
+    def _init_search_index(self, cursor):
+        """Creates the downloads_fts full-text index and the triggers that keep it in
+        sync with downloads. Returns False if this SQLite build lacks FTS5."""
+        exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name='downloads_fts'").fetchone()
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS downloads_fts USING fts5(
+                    title, url, status, content='downloads', content_rowid='db_id'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable, falling back to LIKE: {e}")
+            return False
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS downloads_fts_insert AFTER INSERT ON downloads BEGIN
+                INSERT INTO downloads_fts (rowid, title, url, status) VALUES (new.db_id, new.title, new.url, new.status);
+            END;
+            CREATE TRIGGER IF NOT EXISTS downloads_fts_delete AFTER DELETE ON downloads BEGIN
+                INSERT INTO downloads_fts (downloads_fts, rowid, title, url, status)
+                VALUES ('delete', old.db_id, old.title, old.url, old.status);
+            END;
+            CREATE TRIGGER IF NOT EXISTS downloads_fts_update AFTER UPDATE OF title, url, status ON downloads BEGIN
+                INSERT INTO downloads_fts (downloads_fts, rowid, title, url, status)
+                VALUES ('delete', old.db_id, old.title, old.url, old.status);
+                INSERT INTO downloads_fts (rowid, title, url, status) VALUES (new.db_id, new.title, new.url, new.status);
+            END;
+        ''')
+        if not exists:
+            # Index the history recorded before the index existed
+            cursor.execute("INSERT INTO downloads_fts (downloads_fts) VALUES ('rebuild')")
+        return True
+
+    def close(self):
+        """Commits every pending database write. Call once before exiting."""
+        self.db.close()
+
+    def db_stats(self):
+        """Write queue depth, transaction count and commit latency of the history database."""
+        return self.db.stats()
+
+    def save_setting(self, key, value):
+        self.db.submit('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def get_setting(self, key, default=None):
+        try:
+            self.db.flush()
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute('SELECT value FROM settings WHERE key=?', (key,)).fetchone()
+                return row[0] if row else default
+        except Exception:
+            return default
+
+    def load_settings(self):
+        """Reads persisted settings, converting them to the types in DEFAULT_SETTINGS."""
+        for key, default in DEFAULT_SETTINGS.items():
+            raw = self.get_setting(key)
+            if raw is None: continue
+            if isinstance(default, bool):
+                self.settings[key] = raw == "True"
+            elif isinstance(default, int):
+                self.settings[key] = int(raw) if raw.isdigit() else default
+            else:
+                self.settings[key] = raw
+
+    def load_jobs(self):
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute('SELECT db_id, sel, title, url, time_range, media_type, status, file_path, file_size, timestamp, source, priority FROM downloads').fetchall()
+        with self.lock:
+            self.jobs = {row[0]: Job(*row) for row in rows}
+
+    def search(self, query):
+        """Returns the jobs whose title, url or status contain words starting with
+        each word of query, best matches first when there are few enough to rank."""
+        query = query.strip()
+        if not query:
+            return self.list_jobs()
+        # Every word must start a word of the row, e.g. "lofi hip" finds "Lofi Hip Hop Radio"
+        words = re.findall(r'\w+', query)
+        self.db.flush()
+        with sqlite3.connect(self.db_path) as conn:
+            if self.fts_available and words:
+                match = " ".join(f'"{word}"*' for word in words)
+                rows = conn.execute('SELECT rowid FROM downloads_fts WHERE downloads_fts MATCH ?', (match,)).fetchall()
+                # Ranking costs more than the match itself, so broad queries keep queue order
+                if len(rows) <= SEARCH_RANK_LIMIT:
+                    rows = conn.execute('SELECT rowid FROM downloads_fts WHERE downloads_fts MATCH ? ORDER BY rank',
+                                        (match,)).fetchall()
+            else:
+                rows = conn.execute('SELECT db_id FROM downloads WHERE title LIKE ? OR url LIKE ? OR status LIKE ?',
+                                    (f'%{query}%', f'%{query}%', f'%{query}%')).fetchall()
+        return [self.jobs[r[0]] for r in rows if r[0] in self.jobs]
+
+    # --- Stage Timelines ---
+    def job_spans(self, db_ids):
+        """Recorded spans of db_ids as dicts, oldest first."""
+        db_ids = list(db_ids)
+        if not db_ids: return []
+        self.db.flush()
+        spans = []
+        with sqlite3.connect(self.db_path) as conn:
+            for i in range(0, len(db_ids), 500):  # stay under SQLite's bound-parameter limit
+                chunk = db_ids[i:i + 500]
+                spans += conn.execute(
+                    'SELECT job_id, attempt, stage, name, started, finished, detail FROM job_spans '
+                    f'WHERE job_id IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+        keys = ("job_id", "attempt", "stage", "name", "started", "finished", "detail")
+        return [dict(zip(keys, row)) for row in sorted(spans, key=lambda row: row[4])]
+
+    def export_trace(self, db_ids, path):
+        """Writes the spans of db_ids to path as Chrome trace JSON. Returns the span count."""
+        spans = self.job_spans(db_ids)
+        titles = {db_id: job.title for db_id, job in self.jobs.items() if db_id in set(db_ids)}
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(chrome_trace(spans, titles))
+        return len(spans)
+
+    def _trace(self, db_id, stage):
+        """A JobTrace for this run of db_id on stage, starting with its time in the queue."""
+        attempt = self.retry_attempts.get(db_id, 0) + 1
+        trace = JobTrace(db_id, stage.name, attempt)
+        waited = stage.wait_span(db_id)
+        if waited: trace.add("queued", *waited, detail="retry backoff" if attempt > 1 else "")
+        return trace
+
+    @staticmethod
+    def _traced(ydl_opts, trace):
+        """ydl_opts with trace's download and postprocessor hooks added."""
+        return dict(ydl_opts, progress_hooks=ydl_opts.get('progress_hooks', []) + [trace.on_download],
+                    postprocessor_hooks=ydl_opts.get('postprocessor_hooks', []) + [trace.on_postprocess])
+
+    def _save_trace(self, trace):
+        rows = trace.rows()
+        if rows:
+            self.db.submit_many('INSERT INTO job_spans (job_id, attempt, stage, name, started, finished, detail) '
+                                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def _finish(self, job, trace, **fields):
+        """Records job's final update and waits for its commit, timed as the finalize span."""
+        with trace.span("finalize"):
+            self.update_job(job.db_id, **fields)
+            self.db.flush()
+
+    # --- Job Management ---
+    def get_job(self, db_id):
+        return self.jobs.get(db_id)
+
+    def list_jobs(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def add_job(self, title, url, time_range, media_type, file_size="---", source=""):
+        return self._insert_jobs([(title, url, time_range, media_type, file_size, source)])[0]
+
+    def _insert_jobs(self, rows):
+        """Inserts (title, url, time_range, media_type, file_size, source) rows in one
+        transaction and returns the new jobs."""
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        def insert(conn):
+            ids = []
+            for title, url, time_range, media_type, file_size, source in rows:
+                cursor = conn.execute('''
+                    INSERT INTO downloads (sel, title, url, time_range, media_type, status, file_path, file_size, timestamp, source, priority)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+                ''', (SEL_ON, title, url, time_range, media_type, "Queued", "", file_size, timestamp, source))
+                ids.append(cursor.lastrowid)
+            return ids
+        db_ids = self.db.call(insert) if rows else []
+
+        jobs = []
+        for db_id, (title, url, time_range, media_type, file_size, source) in zip(db_ids, rows):
+            job = Job(db_id, SEL_ON, title, url, time_range, media_type, "Queued", "", file_size, timestamp, source)
+            with self.lock:
+                self.jobs[db_id] = job
+            jobs.append(job)
+        for job in jobs:
+            self.emit("job_added", job)
+        return jobs
+
+    def add_entries(self, entries, range_str, media_type, source=""):
+        """Queues yt-dlp info dicts or flat playlist entries. Returns the new jobs.
+
+        source names the playlist or channel the entries came from; jobs with
+        different sources share the worker pool fairly.
+        """
+        rows = []
+        for entry in entries:
+            vid_url = entry_url(entry)
+            if not vid_url: continue
+            size_str = entry.get('size_str') or estimate_size(entry, media_type)
+            rows.append((entry.get('title', 'Unknown Title'), vid_url, range_str, media_type, size_str, source))
+        return self._insert_jobs(rows)
+
+    def update_job(self, db_id, **fields):
+        """Updates a job in memory and the database, then emits job_updated."""
+        self.update_jobs({db_id: fields})
+
+    def update_jobs(self, changes):
+        """Applies {db_id: {field: value}} in a single transaction."""
+        updated = []
+        with self.lock:
+            for db_id, fields in changes.items():
+                job = self.jobs.get(db_id)
+                if not job: continue
+                for key, value in fields.items():
+                    setattr(job, key, value)
+                updated.append((job, fields))
+        for job, fields in updated:
+            db_fields = [k for k in fields if k in Job.DB_FIELDS]
+            if db_fields:
+                assignments = ", ".join(f"{k}=?" for k in db_fields)
+                self.db.submit(f'UPDATE downloads SET {assignments} WHERE db_id=?',
+                               (*[fields[k] for k in db_fields], job.db_id))
+        for job, _ in updated:
+            self.emit("job_updated", job)
+
+    def _set_live(self, job, **fields):
+        """Updates non-persisted progress fields and notifies subscribers."""
+        for key, value in fields.items():
+            setattr(job, key, value)
+        self.emit("job_updated", job)
+
+    def set_all_selected(self, sel):
+        self.db.submit('UPDATE downloads SET sel=?', (sel,))
+        with self.lock:
+            jobs = list(self.jobs.values())
+            for job in jobs:
+                job.sel = sel
+        self.emit("jobs_updated", jobs)
+
+    def remove_jobs(self, db_ids):
+        self.db.submit_many('DELETE FROM downloads WHERE db_id=?', [(db_id,) for db_id in db_ids])
+        self.db.submit_many('DELETE FROM job_spans WHERE job_id=?', [(db_id,) for db_id in db_ids])
+        for db_id in db_ids:
+            with self.lock:
+                job = self.jobs.pop(db_id, None)
+            if job: self.emit("job_removed", job)
+
+    def clear_jobs(self):
+        self.db.submit('DELETE FROM downloads')
+        self.db.submit('DELETE FROM job_spans')
+        with self.lock:
+            self.jobs = {}
+        self.metadata.clear()
+        self.emit("jobs_reloaded")
+
+    def refresh_file_status(self):
+        """Re-checks finished files on disk. Returns the number of jobs updated."""
+        changes = {}
+        for job in self.list_jobs():
+            if job.status == "Done" or job.status == "File Missing":
+                # Normalize path for robust checking
+                norm_path = os.path.normpath(job.file_path).strip() if job.file_path else None
+                new_status = "Done" if norm_path and os.path.exists(norm_path) else "File Missing"
+                if new_status != job.status:
+                    changes[job.db_id] = {"status": new_status}
+        self.update_jobs(changes)
+        return len(changes)
+
+    # --- Metadata ---
+    def apply_cookies(self, ydl_opts):
+        """Apply browser cookie settings to yt-dlp opts."""
+        browser = self.settings["browser_cookie"]
+        if browser != "None":
+            ydl_opts['cookiesfrombrowser'] = (browser,)
+
+    def fetch(self, url, quiet=True):
+        """Extracts url without downloading.
+
+        Returns (playlist_title, entries) for playlists and channels, or
+        (None, [info]) for a single video. If part of a channel fails, the
+        entries of the rest are returned; fetching url again retries the part.
+        """
+        playlist_title, entries = None, []
+        try:
+            for playlist_title, page in self.crawl(url, quiet=quiet):
+                entries.extend(page)
+        except yt_dlp.utils.DownloadError as e:
+            if not entries: raise
+            print(f"Incomplete crawl of {url}, keeping {len(entries)} entries: {e}")
+        return playlist_title, entries
+
+    def crawl(self, url, page_size=CRAWL_PAGE_SIZE, quiet=True):
+        """Extracts url page by page, yielding (playlist_title, entries).
+
+        Playlist and channel entries are flat and read lazily: each source (the
+        playlist, or a channel's tabs) is read on its own thread, at most
+        CRAWL_PREFETCH pages ahead of the caller, so the first page arrives
+        after the first request and closing the generator stops the crawl.
+        Pages are checkpointed as they are read; crawling url again replays
+        them and continues where the last crawl stopped. Transient errors are
+        retried from the checkpoint; a source that still fails raises
+        DownloadError once the others are done.
+
+        A single video is fully extracted and yielded once as (None, [info]).
+        """
+        ydl_opts = {'extract_flat': True, 'quiet': quiet, 'no_warnings': True}
+        self.apply_cookies(ydl_opts)
+
+        with CountingYoutubeDL(ydl_opts, counters=self.counters) as ydl:
+            info = self._listing(ydl, url)
+            if not info:
+                raise yt_dlp.utils.DownloadError(f"Nothing found at {url}")
+
+            if info.get('_type') != 'playlist':
+                info = ydl.process_ie_result(info, download=False)
+                self.metadata.put(info, entry_url(info))
+                yield None, [info]
+                return
+
+            playlist_title = info.get('title', 'Unknown Playlist')
+            entries = info.get('entries')
+            if not isinstance(entries, (list, yt_dlp.utils.PagedList, yt_dlp.utils.LazyList)):
+                entries = yt_dlp.utils.LazyList(entries or [])  # re-readable after the tab check below
+            head = list(itertools.islice(entries_from(entries, 0), page_size))
+
+            # Channel Detection: If we only find sub-playlists (tabs like Videos, Shorts)
+            # we should try to extract the videos from them instead.
+            tabs = [e for e in head if e and e.get('_type') == 'url' and e.get('title') in ["Videos", "Shorts", "Live"]]
+            if tabs:
+                self.set_status_text("Expanding channel tabs...")
+                # Prioritize 'Videos' tab, then add others if needed
+                sources = [(tab['url'], tab['title'], None) for tab in tabs[:2]]
+            else:
+                sources = [(url, playlist_title, entries)]
+            yield from ((playlist_title, page) for page in self._crawl_sources(url, sources, page_size, ydl_opts))
+
+    @staticmethod
+    def _listing(ydl, url):
+        """Unprocessed info for url, following redirects (e.g. a channel handle)
+        to the page that has the entries."""
+        info = ydl.extract_info(url, download=False, process=False)
+        for _ in range(5):
+            if not info or info.get('_type') not in ('url', 'url_transparent'): break
+            info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+        return info
+
+    def _crawl_sources(self, url, sources, page_size, ydl_opts):
+        """Pages of (source URL, title, entries or None) sources, replayed from the
+        checkpoint of url and then read by up to CRAWL_WORKERS threads."""
+        checkpoint = self.crawls.load(url)
+        replayed = sum(len(page) for state in checkpoint.values() for page in state["pages"])
+        if replayed:
+            self.set_status_text(f"Resuming crawl: {replayed} entries from the last checkpoint")
+        for source, _, _ in sources:
+            yield from checkpoint.get(source, {}).get("pages", [])
+
+        todo = [s for s in sources if not checkpoint.get(s[0], {}).get("done")]
+        if not todo:
+            self.crawls.clear(url)
+            return
+        work = queue.Queue()
+        for s in todo:
+            work.put(s)
+        workers = min(CRAWL_WORKERS, len(todo))
+        results = queue.Queue(maxsize=CRAWL_PREFETCH * workers)
+        stop = threading.Event()
+
+        def deliver(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.2)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read_source(source, title, entries):
+            state = checkpoint.get(source, {})
+            position, page_no = state.get("position", 0), state.get("next_page", 0)
+            seen = {entry_url(e) for page in state.get("pages", []) for e in page}
+            for attempt in range(CRAWL_RETRIES + 1):
+                ydl = None
+                try:
+                    if entries is None:
+                        ydl = CountingYoutubeDL(ydl_opts, counters=self.counters)
+                        entries = (self._listing(ydl, source) or {}).get('entries')
+                    for consumed, page in self._pages(entries_from(entries, position), page_size):
+                        position += consumed
+                        page = [e for e in page if entry_url(e) not in seen]
+                        seen.update(entry_url(e) for e in page)
+                        self.crawls.save(url, source, page_no, position, page)
+                        page_no += 1
+                        if page and not deliver(("page", source, page)): return
+                    self.crawls.save(url, source, page_no, position, [], done=True)
+                    deliver(("done", source, None))
+                    return
+                except Exception as e:
+                    if stop.is_set(): return
+                    kind = classify_error(str(e))
+                    if kind not in TRANSIENT_ERRORS or attempt == CRAWL_RETRIES:
+                        deliver(("error", source, f"{title}: {e}"))
+                        return
+                    entries = None  # the listing is dead; extract it again and skip to position
+                    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.75, 1.25)
+                    print(f"Crawl of {title} failed ({ERROR_LABELS[kind]}), retrying in {delay:.0f}s: {e}")
+                    if stop.wait(delay): return
+                finally:
+                    if ydl: ydl.close()
+
+        def worker():
+            while not stop.is_set():
+                try:
+                    source = work.get_nowait()
+                except queue.Empty:
+                    return
+                read_source(*source)
+
+        for _ in range(workers):
+            threading.Thread(target=worker, daemon=True).start()
+        failures = []
+        try:
+            pending = len(todo)
+            while pending:
+                kind, source, value = results.get()
+                if kind == "page":
+                    yield value
+                    continue
+                pending -= 1
+                if kind == "error":
+                    print(f"Could not crawl {value}")
+                    failures.append(value)
+        finally:
+            stop.set()  # readers stop before their next page
+        if failures:
+            raise yt_dlp.utils.DownloadError("; ".join(failures))
+        self.crawls.clear(url)
+
+    def _pages(self, entries, page_size):
+        """(listing entries read, entries) pages of up to page_size from a (lazy)
+        entries iterable, recorded in the metadata store as they arrive."""
+        entries = iter(entries)
+        while True:
+            chunk = list(itertools.islice(entries, page_size))
+            if not chunk: return
+            page = [e for e in chunk if e]
+            self.metadata.put_many(page, [entry_url(e) for e in page])
+            yield len(chunk), page
+
+    def lookup(self, url):
+        """Info for url from the metadata store, extracting (flat) on a miss."""
+        info = self.metadata.get(url)
+        if info and (info.get('formats') or info.get('duration')): return info
+        ydl_opts = {'quiet': True, 'extract_flat': True, 'no_warnings': True}
+        self.apply_cookies(ydl_opts)
+        with CountingYoutubeDL(ydl_opts, counters=self.counters) as ydl:
+            info = ydl.extract_info(url, download=False)
+        self.metadata.put(info, url)
+        return info
+
+    # --- Download Control ---
+    def is_cancelled(self, db_id):
+        return self.stop_all_flag or self.active_downloads.get(db_id, False)
+
+    def resume(self, db_ids):
+        changes = {}
+        for db_id in db_ids:
+            self.active_downloads[db_id] = False # Reset cancel flag
+            self.retry_attempts.pop(db_id, None)
+            job = self.jobs.get(db_id)
+            if job and job.status != "Done":
+                changes[db_id] = {"status": "Queued"}
+        self.update_jobs(changes)
+        self.stop_all_flag = False
+        self.start(db_ids)
+
+    def pause(self, db_ids):
+        """Cancels active jobs and unqueues pending ones. Returns how many were affected."""
+        count = 0
+        for db_id in db_ids:
+            if db_id in self.active_downloads:
+                self.active_downloads[db_id] = True
+                count += 1
+                job = self.jobs.get(db_id)
+                if job: self._set_live(job, status="Pausing...")
+        dropped = [db_id for db_id in db_ids if self._discard_pending(db_id)]
+        self._unqueue(dropped, "Paused")
+        return count + len(dropped)
+
+    def stop_all(self):
+        self.stop_all_flag = True
+        self._unqueue([db_id for stage in self.stages for db_id in stage.clear()], "Stopped")
+        self.converting.clear()
+        for db_id in list(self.active_downloads):
+            self.active_downloads[db_id] = True
+        self.set_status_text("Stopping all active downloads...")
+
+    # --- Crash Recovery ---
+    def partial_files(self, job):
+        """Leftovers of job's unfinished attempt in the download folder (.part,
+        fragment and .ytdl files), which yt-dlp resumes from."""
+        _, _, final_file_path = self.build_ydl_opts(job)
+        if not final_file_path: return []
+        base = os.path.splitext(final_file_path)[0]
+        return [p for p in glob.glob(glob.escape(base) + ".*") if PARTIAL_FILE_RE.search(p)]
+
+    @staticmethod
+    def resume_point(paths):
+        """(bytes on disk, next fragment index or None) for a job's partial files."""
+        saved_bytes, fragment = 0, None
+        for path in paths:
+            try:
+                if path.endswith(".ytdl"):
+                    with open(path, encoding="utf-8") as f:
+                        state = json.load(f)
+                    index = state["downloader"]["current_fragment"]["index"]
+                    fragment = max(fragment or 0, index)
+                else:
+                    saved_bytes += os.path.getsize(path)
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+        return saved_bytes, fragment
+
+    def recover(self):
+        """Reconciles jobs a crash left mid-download with what is on disk.
+
+        Jobs whose file was completed are marked Done; the rest become
+        "Interrupted" and keep their partial files, so starting them again
+        resumes at the saved byte or fragment offset. Returns the db_ids to resume.
+        """
+        changes, resumable, saved_total = {}, [], 0
+        for job in self.list_jobs():
+            if job.status not in INTERRUPTED_STATUSES and not job.status.startswith("Retry"):
+                continue
+            if job.db_id in self.active_downloads or self.in_pipeline(job.db_id):
+                continue
+            partials = self.partial_files(job)
+            _, _, final_file_path = self.build_ydl_opts(job)
+            if not partials and final_file_path and os.path.exists(final_file_path):
+                changes[job.db_id] = {"status": "Done", "file_path": final_file_path}
+                continue
+            saved_bytes, fragment = self.resume_point(partials)
+            saved_total += saved_bytes
+            job.downloaded_bytes = saved_bytes
+            changes[job.db_id] = {"status": "Interrupted"}
+            resumable.append(job.db_id)
+            if partials:
+                where = f"fragment {fragment}" if fragment is not None else format_size_simple(saved_bytes)
+                print(f"Recovery: {job.title} resumes at {where}")
+        self.update_jobs(changes)
+        if resumable:
+            self.set_status_text(f"Resuming {len(resumable)} interrupted downloads "
+                                 f"({format_size_simple(saved_total)} already on disk)")
+        return resumable
+
+    def _unqueue(self, db_ids, status):
+        self.update_jobs({db_id: {"status": status} for db_id in db_ids})
+        for _ in db_ids:
+            self._increment_global_progress()
+        if db_ids:
+            self._on_stage_idle()
+
+    def _discard_pending(self, db_id):
+        """Drops db_id from whichever stage it waits in. Returns True if it was waiting."""
+        dropped = any([stage.discard([db_id]) for stage in self.stages])
+        if dropped: self.converting.pop(db_id, None)
+        return dropped
+
+    def in_pipeline(self, db_id):
+        return any(stage.is_pending(db_id) or stage.is_running(db_id) for stage in self.stages)
+
+    def pipeline_stats(self):
+        """{stage name: scheduler stats} for the extract, download and postprocess stages."""
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def start(self, db_ids, extract_ahead=True):
+        """Queues db_ids on the pipeline. Jobs already queued or running are not
+        duplicated; waiting ones are re-sorted with their current priority."""
+        self.stop_all_flag = False
+        added = 0
+        first_stage = self.extract_stage if extract_ahead else self.scheduler
+        for db_id in db_ids:
+            job = self.jobs.get(db_id)
+            if job is None or job.status == "Done": continue
+            if self.in_pipeline(db_id):
+                for stage in self.stages:
+                    if stage.is_pending(db_id): stage.submit(db_id, job.priority, job.source)
+                continue
+            if first_stage.submit(db_id, job.priority, job.source):
+                added += 1
+        if not added: return
+
+        with self.lock:
+            self.total_items += added
+            self.batch_open = True
+            completed, total = self.completed_items, self.total_items
+        self.set_status_text("Processing Batch...")
+        self.emit("batch_progress", {"completed": completed, "total": total})
+
+    def prioritize(self, db_ids):
+        """Moves db_ids to the front of the queue, queueing them if needed."""
+        top = max((job.priority for job in self.list_jobs()), default=0) + 1
+        self.update_jobs({db_id: {"priority": top} for db_id in db_ids})
+        for db_id in db_ids:
+            self.bandwidth.set_weight(db_id, self.bandwidth_weight(self.jobs.get(db_id)))
+        # Straight to the download stage; it extracts for itself if nothing is cached
+        self.start(db_ids, extract_ahead=False)
+
+    def bandwidth_weight(self, job):
+        """Share of the speed limit a job gets relative to others: an explicit
+        per-item weight, else 2 for prioritized jobs and 1 for the rest."""
+        if job is None: return 1
+        return self.bandwidth_weights.get(job.db_id) or (2 if job.priority > 0 else 1)
+
+    def set_bandwidth_weight(self, db_ids, weight):
+        """Gives db_ids a fixed bandwidth weight; None restores the priority-based default."""
+        for db_id in db_ids:
+            if weight: self.bandwidth_weights[db_id] = weight
+            else: self.bandwidth_weights.pop(db_id, None)
+            self.bandwidth.set_weight(db_id, self.bandwidth_weight(self.jobs.get(db_id)))
+
+    def _on_stage_idle(self):
+        # A stage drained; the batch is over once all of them have
+        for stats in self.pipeline_stats().values():
+            if stats["pending"] or stats["running"]: return
+        with self.lock:
+            if not self.batch_open: return
+            self.batch_open = False
+        self._on_queue_idle()
+
+    def _on_queue_idle(self):
+        # Every queued job has finished: close out the batch counters
+        stopped = self.stop_all_flag
+        with self.lock:
+            total = self.total_items
+            self.completed_items = 0
+            self.total_items = 0
+        self.set_status_text("Stopped" if stopped else "All downloads in queue complete!")
+        self.emit("batch_finished", {"stopped": stopped, "total": total})
+
+    def _increment_global_progress(self):
+        with self.lock:
+            self.completed_items += 1
+            completed, total = self.completed_items, self.total_items
+        self.status_text = f"Completed {completed} of {total} files"
+        self.emit("batch_progress", {"completed": completed, "total": total})
+
+    def build_ydl_opts(self, job):
+        """Builds the yt-dlp options for job. Returns (ydl_opts, ext_choice, final_file_path)."""
+        settings = self.settings
+        media_type = job.media_type
+        time_range = job.time_range
+        safe_title = re.sub(r'[\\/*?:"<>|]', "", job.title).strip()
+        download_folder = settings["download_folder"]
+
+        # --- Base Options ---
+        toolchain = probe_toolchain()
+        ffmpeg_exe = toolchain.ffmpeg
+        ffmpeg_dir = os.path.dirname(ffmpeg_exe) if ffmpeg_exe and os.path.isabs(ffmpeg_exe) else None
+
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'logger': YTDLLogger(self, job.db_id),
+            'ffmpeg_location': ffmpeg_dir if ffmpeg_dir else None,
+            'ignoreerrors': True,
+            'continuedl': True, # resume .part files and fragments left by an earlier attempt
+            'progress_hooks': [self.create_progress_hook(job)],
+            'concurrent_fragment_downloads': 5,
+            'prefer_ffmpeg': True,
+            'postprocessor_args': {
+                'ffmpeg': ['-threads', str(self.ffmpeg_threads())]
+            },
+        }
+
+        if "Video" in media_type:
+            ydl_opts['postprocessor_args']['ffmpeg'].extend(['-preset', settings["ffmpeg_preset"]])
+
+        # Extensions and paths logic...
+        ext_choice = "mp4"
+        if "Thumb" in media_type:
+            ext_choice = re.search(r'\((.*?)\)', media_type).group(1)
+        elif "Audio" in media_type:
+            if "wav" in media_type: ext_choice = "wav"
+            elif "m4a" in media_type: ext_choice = "m4a"
+            else: ext_choice = "mp3"
+
+        final_file_path = ""
+        if time_range != "Full Video":
+            try:
+                if time_range.startswith("*"): # Visual Trimmer Range: *HH:MM:SS-HH:MM:SS
+                    range_clean = time_range[1:]
+                    start_str, end_str = range_clean.split("-")
+                else: # Manual Range: HH:MM:SS to HH:MM:SS
+                    start_str, end_str = time_range.split(" to ")
+
+                start_sec = parse_time(start_str)
+                end_sec = parse_time(end_str)
+                s = start_sec if start_sec is not None else 0
+                e = end_sec if end_sec is not None else float('inf')
+
+                # Standard yt-dlp range logic requires ffmpeg_location to be a directory
+                ydl_opts['download_ranges'] = download_range_func(None, [(s, e)])
+                ydl_opts['force_keyframes_at_cuts'] = True
+
+                # Ensure external downloader args are clean
+                if 'external_downloader' in ydl_opts:
+                    del ydl_opts['external_downloader']
+            except Exception as ex:
+                print(f"Error parsing range {time_range}: {ex}")
+
+        self.apply_cookies(ydl_opts)
+        if settings["speed_limit"] > 0:
+            # The cap is enforced by the shared bandwidth limiter in the progress hook;
+            # small fixed blocks keep its pacing smooth
+            ydl_opts['buffersize'] = 64 * 1024
+            ydl_opts['noresizebuffer'] = True
+
+        # --- NEW: Native Aggressive Concurrency ---
+        if settings["use_aria2"]:
+            ydl_opts['concurrent_fragment_downloads'] = 16
+        else:
+            ydl_opts['concurrent_fragment_downloads'] = 5 # Default
+
+        # --- NEW: Proxy Support ---
+        if settings["proxy_url"].strip():
+            ydl_opts['proxy'] = settings["proxy_url"].strip()
+
+        if settings["download_subs"] and "Thumb" not in media_type:
+            ydl_opts['writesubtitles'] = True
+            ydl_opts['writeautomaticsub'] = True
+            ydl_opts['subtitleslangs'] = ['en']
+
+        if "Thumb" in media_type:
+            final_file_path = os.path.join(download_folder, f'{safe_title}.{ext_choice}')
+            ydl_opts['outtmpl'] = final_file_path
+            ydl_opts['skip_download'] = True
+            ydl_opts['writethumbnail'] = True
+            ydl_opts['postprocessors'] = [{'key': 'FFmpegThumbnailsConvertor', 'format': ext_choice, 'when': 'before_dl'}]
+        elif "Audio" in media_type:
+            final_file_path = os.path.join(download_folder, f'{safe_title}.{ext_choice}')
+            ydl_opts['outtmpl'] = final_file_path
+            bitrate = re.search(r'- (\d+)k', media_type).group(1)
+            ydl_opts['format'] = 'bestaudio/best'
+            preferred_codec = ext_choice
+            if toolchain.ffmpeg and toolchain.encoders and not toolchain.can_encode(AUDIO_ENCODERS.get(ext_choice)):
+                print(f"FFmpeg has no {AUDIO_ENCODERS.get(ext_choice)} encoder; keeping the original audio codec")
+                preferred_codec = 'best'
+            ydl_opts['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': preferred_codec,
+                'preferredquality': bitrate,
+            }]
+            if settings["embed_metadata"]:
+                ydl_opts['writethumbnail'] = True
+                ydl_opts['postprocessors'].extend([{'key': 'EmbedThumbnail'}, {'key': 'FFmpegMetadata'}])
+        else:
+            res = re.search(r'\((.*?)\)', media_type).group(1)
+            final_file_path = os.path.join(download_folder, f'{safe_title}_{res}.{ext_choice}')
+            ydl_opts['outtmpl'] = final_file_path
+
+            if res.lower() == "best quality":
+                ydl_opts['format'] = 'bestvideo+bestaudio/best'
+            else:
+                res_map = {"4K": 2160, "1440p": 1440, "1080p": 1080, "720p": 720, "480p": 480, "360p": 360, "240p": 240}
+                target_height = 1080
+                for key, val in res_map.items():
+                    if key in media_type:
+                        target_height = val
+                        break
+                # Video format selection: prioritize best quality up to target height, allowing modern codecs
+                # Fallback 1: Pre-muxed video up to target height
+                # Fallback 2: Best video + best audio (ignores height filter, prevents failing on vertical videos)
+                # Fallback 3: Best pre-muxed video (ignores height filter)
+                # Fallback 4: Any video / any audio
+                ydl_opts['format'] = f'bestvideo[height<={target_height}]+bestaudio/best[height<={target_height}]/bestvideo+bestaudio/best/bestvideo/bestaudio'
+
+            ydl_opts['merge_output_format'] = 'mp4' if not toolchain.muxers or toolchain.can_mux('mp4') else 'mkv'
+            if settings["embed_metadata"]:
+                ydl_opts['writethumbnail'] = True
+                ydl_opts['postprocessors'] = [{'key': 'EmbedThumbnail'}, {'key': 'FFmpegMetadata'}]
+
+        return ydl_opts, ext_choice, final_file_path
+
+    # --- Pipeline Stages ---
+    def _extract_job(self, db_id):
+        """Extract stage: resolves a job's info ahead of the download stage."""
+        job = self.jobs.get(db_id)
+        if job is None or job.status == "Done":
+            self._increment_global_progress()
+            return
+
+        self.active_downloads[db_id] = False
+        trace = self._trace(db_id, self.extract_stage)
+        logger = None
+        finished = True
+        try:
+            # Backpressure: stay only a few jobs ahead of the downloaders so cached info is fresh when used
+            waiting_since = time.time()
+            while (self.scheduler.stats()["pending"] >= EXTRACT_LOOKAHEAD * self.scheduler.max_workers
+                   and not self.is_cancelled(db_id)):
+                time.sleep(0.25)
+            if time.time() - waiting_since > 0.1:
+                trace.add("lookahead wait", waiting_since, time.time())
+            if not self.metadata.get(job.url, max_age=INFO_REUSE_AGE, complete=True):
+                self._set_live(job, status="Extracting...")
+                ydl_opts, _, _ = self.build_ydl_opts(job)
+                logger = ydl_opts['logger']
+                started = time.monotonic()
+                with CountingYoutubeDL(ydl_opts, counters=self.counters) as ydl, trace.span("extract_info"):
+                    info = ydl.extract_info(job.url, download=False, process=False)
+                if self.is_cancelled(db_id):
+                    raise StopDownloadException()
+                if not info:
+                    raise yt_dlp.utils.DownloadError(logger.last_error or "Extraction failed")
+                self.metrics.observe("extract", time.monotonic() - started)
+                self.metadata.put(info, job.url)
+                self.update_job(db_id, status="Queued", file_size=estimate_size(info, job.media_type))
+            if self.is_cancelled(db_id):
+                raise StopDownloadException()
+            # Hand over while still running here, so the pipeline never looks idle in between
+            self.scheduler.submit(db_id, job.priority, job.source)
+            finished = False
+        except StopDownloadException:
+            self.update_job(db_id, status="Stopped" if self.stop_all_flag else "Paused")
+        except Exception as e:
+            finished = not self._retry_or_park(job, (logger and logger.last_error) or str(e), self.extract_stage)
+        finally:
+            self.active_downloads.pop(db_id, None)
+            self._save_trace(trace)
+
+        if finished:
+            self._increment_global_progress()
+
+    def _download_job(self, db_id):
+        """Download stage: transfers (and merges) the media; FFmpeg postprocessors
+        are handed to the postprocess stage so they never hold a network slot."""
+        job = self.jobs.get(db_id)
+        if job is None or job.status == "Done" or job.status == "Pausing...":
+            self._increment_global_progress()
+            return
+
+        # A host that throttled us rests before any of its jobs run again
+        host = urlparse(job.url).hostname or ""
+        cooldown = self.host_cooldowns.get(host, 0) - time.time()
+        if cooldown > 0:
+            self.scheduler.submit(db_id, job.priority, job.source, delay=cooldown)
+            self._set_live(job, status=f"Waiting for {host} ({int(cooldown)}s)")
+            return
+
+        self.update_job(db_id, status="Starting...")
+        trace = self._trace(db_id, self.scheduler)
+
+        # Track as active
+        self.active_downloads[db_id] = False
+        self.bandwidth.register(db_id, self.bandwidth_weight(job))
+        url = job.url
+        media_type = job.media_type
+
+        logger = None
+        finished = True
+        started = time.monotonic()
+        try:
+            ydl_opts, ext_choice, final_file_path = self.build_ydl_opts(job)
+            if 'download_ranges' in ydl_opts:
+                # Update UI to indicate progress is blind during trimming
+                self._set_live(job, status="Trimming (No Progress Bar)...")
+            self.counters.incr("download_jobs")
+            logger = ydl_opts['logger']
+
+            # FFmpeg postprocessors that run after the download move to the postprocess stage
+            later = [pp for pp in ydl_opts.get('postprocessors', []) if pp.get('when', 'post_process') == 'post_process']
+            dl_opts = dict(ydl_opts, postprocessors=[pp for pp in ydl_opts.get('postprocessors', []) if pp not in later])
+            dl_opts = self._traced(dl_opts, trace)
+
+            with CountingYoutubeDL(dl_opts, counters=self.counters) as ydl:
+                # Resolve the page once (unprocessed), or reuse a fresh cached extraction,
+                # size it for the selected quality, then hand the same info dict to
+                # format selection and the download
+                info = self.metadata.get(url, max_age=INFO_REUSE_AGE, complete=True)
+                reused = info is not None
+                if reused:
+                    self.counters.incr("metadata_reused")
+                else:
+                    with trace.span("extract_info"):
+                        info = ydl.extract_info(url, download=False, process=False)
+                    self.metadata.put(info, url)
+                self.update_job(db_id, file_size=estimate_size(info, media_type))
+
+                info = ydl.process_ie_result(info, download=True)
+                if reused and logger.errors and not self.is_cancelled(db_id) and not downloaded_files(info):
+                    # Cached format URLs may have expired; extract once more and retry
+                    logger.errors = 0
+                    with trace.span("extract_info", "cached formats expired"):
+                        info = ydl.extract_info(url, download=False, process=False)
+                    self.metadata.put(info, url)
+                    info = ydl.process_ie_result(info, download=True)
+
+                # Check if we stopped mid-download. ignoreerrors turns failures into
+                # log lines, so an error with nothing on disk means the attempt failed
+                if self.is_cancelled(db_id):
+                    raise StopDownloadException()
+                if not info or (logger.errors and not downloaded_files(info) and "Thumb" not in media_type):
+                    raise yt_dlp.utils.DownloadError(logger.last_error or "Download failed")
+
+            self.retry_attempts.pop(db_id, None)
+            self.metrics.observe("download", time.monotonic() - started)
+            if later and downloaded_files(info):
+                self.converting[db_id] = (ydl_opts, info, ext_choice, final_file_path)
+                self._set_live(job, status="Waiting to convert...", progress=100.0)
+                self.postprocess_stage.submit(db_id, job.priority, job.source)
+                finished = False
+            else:
+                self._finish(job, trace, status="Done", file_path=self._final_path(info, ext_choice, final_file_path))
+        except StopDownloadException:
+            new_status = "Stopped" if self.stop_all_flag else "Paused"
+            self.update_job(db_id, status=new_status)
+        except Exception as e:
+            finished = not self._retry_or_park(job, (logger and logger.last_error) or str(e), self.scheduler)
+        finally:
+            self.active_downloads.pop(db_id, None)
+            self.active_speeds.pop(db_id, None)
+            self.bandwidth.unregister(db_id)
+            self._save_trace(trace)
+
+        if finished:
+            self._increment_global_progress()
+
+    def _postprocess_job(self, db_id):
+        """Postprocess stage: runs the deferred FFmpeg postprocessors (audio
+        extraction, thumbnail and metadata embedding) on the downloaded files."""
+        job = self.jobs.get(db_id)
+        context = self.converting.pop(db_id, None)
+        if job is None or context is None:
+            self._increment_global_progress()
+            return
+        ydl_opts, info, ext_choice, final_file_path = context
+
+        # Size this encode's -threads for the CPU that is free right now
+        threads = self.ffmpeg_threads()
+        ffmpeg_args = list(ydl_opts['postprocessor_args']['ffmpeg'])
+        ffmpeg_args[ffmpeg_args.index('-threads') + 1] = str(threads)
+        ydl_opts = dict(ydl_opts, postprocessor_args=dict(ydl_opts['postprocessor_args'], ffmpeg=ffmpeg_args))
+        trace = self._trace(db_id, self.postprocess_stage)
+        ydl_opts = self._traced(ydl_opts, trace)
+        input_bytes = sum(os.path.getsize(p) for p in downloaded_files(info))
+        started = time.time()
+
+        self.active_downloads[db_id] = False
+        self.encode_threads[db_id] = threads
+        self._set_live(job, status="Finalizing/Converting...", progress=100.0)
+        try:
+            with CountingYoutubeDL(ydl_opts, counters=self.counters) as ydl:
+                for dl in info.get('requested_downloads') or []:
+                    if dl.get('filepath') and os.path.exists(dl['filepath']):
+                        # yt-dlp strips keys shared with the parent from each download; put them back
+                        pp_info = dict(info, **dl)
+                        pp_info.pop('requested_downloads', None)
+                        dl.update(ydl.post_process(dl['filepath'], pp_info))
+            if self.is_cancelled(db_id):
+                raise StopDownloadException()
+            seconds = time.time() - started
+            self.encode_history = (self.encode_history + [(input_bytes, seconds)])[-10:]
+            self.metrics.observe("postprocess", seconds)
+            self._finish(job, trace, status="Done", file_path=self._final_path(info, ext_choice, final_file_path))
+        except StopDownloadException:
+            self.update_job(db_id, status="Stopped" if self.stop_all_flag else "Paused")
+        except Exception as e:
+            # As before the split, a failed conversion keeps the downloaded file
+            print(f"Conversion failed: {job.title}: {e}")
+            if downloaded_files(info):
+                self.update_job(db_id, status="Done", file_path=self._final_path(info, ext_choice, final_file_path))
+            else:
+                self.update_job(db_id, status="Error (Conversion)")
+        finally:
+            self.active_downloads.pop(db_id, None)
+            self.encode_threads.pop(db_id, None)
+            self._save_trace(trace)
+
+        self._increment_global_progress()
+
+    def ffmpeg_threads(self):
+        """-threads for one FFmpeg job: the usable cores split across the postprocess
+        pool, shrunk by load from outside this app (our own encodes are already
+        budgeted)."""
+        cores = cpu_cores()
+        usable = max(1, cores - RESERVED_CORES)
+        busy = self.cpu_busy()
+        own = sum(self.encode_threads.values()) / cores
+        outside = min(1.0, max(0.0, busy - own))
+        return max(1, int(usable * (1 - outside)) // self.postprocess_stage.max_workers)
+
+    def cpu_busy(self):
+        """Share (0-1) of all cores busy since the previous call, measured against
+        the engine's own cpu_times() baseline so other psutil.cpu_percent() callers
+        (the dashboard) don't shift the window. Calls less than CPU_SAMPLE_MIN
+        seconds apart repeat the last reading."""
+        if not PSUTIL_AVAILABLE: return 0.0
+        with self.lock:
+            now = psutil.cpu_times()
+            total = sum(now) - sum(self.cpu_sample)
+            if total < CPU_SAMPLE_MIN * cpu_cores(): return self.cpu_busy_last
+            idle = (now.idle + getattr(now, 'iowait', 0)) - (self.cpu_sample.idle + getattr(self.cpu_sample, 'iowait', 0))
+            self.cpu_sample = now
+            self.cpu_busy_last = min(1.0, max(0.0, 1 - idle / total))
+            return self.cpu_busy_last
+
+    def postprocess_metrics(self):
+        """Queue depth and throughput of the FFmpeg postprocess pool, for the dashboard."""
+        stats = self.postprocess_stage.stats()
+        history = self.encode_history
+        seconds = sum(s for _, s in history)
+        stats["threads"] = sum(self.encode_threads.values())
+        stats["encode_speed"] = sum(b for b, _ in history) / seconds if seconds else 0.0
+        stats["encode_seconds"] = seconds / len(history) if history else 0.0
+        return stats
+
+    @staticmethod
+    def _final_path(info, ext_choice, final_file_path):
+        # Capture the ACTUAL final path from info dict
+        if 'requested_downloads' in info and info['requested_downloads']:
+            # Prioritize the file that matches our ext_choice or is the largest
+            downloads = info['requested_downloads']
+            best_dl = downloads[0]
+            for dl in downloads:
+                if dl.get('ext') == ext_choice:
+                    best_dl = dl
+                    break
+            final_file_path = best_dl.get('filepath', final_file_path)
+        elif '_filename' in info:
+            final_file_path = info['_filename']
+
+        # Final check: if we got a webp but expected mp4/mp3, and video exists, use it
+        if final_file_path.endswith(".webp") and not ext_choice.endswith("webp"):
+            base_p = final_file_path.rsplit(".", 1)[0]
+            if os.path.exists(base_p + "." + ext_choice):
+                final_file_path = base_p + "." + ext_choice
+        return final_file_path
+
+    def _retry_or_park(self, job, message, stage):
+        """Classifies a failed attempt. Transient failures are requeued on stage with
+        jittered exponential backoff (throttling also cools the host down); the rest
+        are parked with their class in the status. Returns True if a retry was queued."""
+        kind = classify_error(message)
+        label = ERROR_LABELS[kind]
+        attempt = self.retry_attempts.get(job.db_id, 0) + 1
+        print(f"Download failed ({label}): {job.title}: {message}")
+        if kind not in TRANSIENT_ERRORS or attempt > RETRY_LIMIT or self.stop_all_flag:
+            self.retry_attempts.pop(job.db_id, None)
+            self.metrics.failure(kind)
+            self.update_job(job.db_id, status="Error" if kind == "unknown" else f"Error ({label})")
+            return False
+
+        self.retry_attempts[job.db_id] = attempt
+        self.metrics.retry(stage.name, kind)
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+        if kind == "throttled":
+            delay = max(delay * 3, HOST_COOLDOWN)
+            host = urlparse(job.url).hostname or ""
+            self.host_cooldowns[host] = max(self.host_cooldowns.get(host, 0), time.time() + delay)
+        delay = random.uniform(delay / 2, delay)
+        self.update_job(job.db_id, status=f"Retry {attempt}/{RETRY_LIMIT} ({label})")
+        stage.submit(job.db_id, job.priority, job.source, delay=delay)
+        return True
+
+    def create_progress_hook(self, job):
+        db_id = job.db_id
+        host = urlparse(job.url).hostname or ""
+        seen = {}  # filename -> bytes already counted against the bandwidth limiter
+        def hook(d):
+            # Check for cancellation
+            if self.is_cancelled(db_id):
+                print(f"Hook: Cancel detected for {db_id}")
+                raise StopDownloadException()
+
+            if d['status'] == 'downloading':
+                dl_bytes = d.get('downloaded_bytes')
+                if dl_bytes is not None:
+                    # The first report of a file only sets the baseline, so resumed
+                    # .part bytes are not charged to the limiter
+                    name = d.get('filename')
+                    counted = seen.get(name, dl_bytes)
+                    seen[name] = dl_bytes
+                    if dl_bytes > counted:
+                        self.metrics.add_bytes(host, dl_bytes - counted)
+                        self.bandwidth.consume(db_id, dl_bytes - counted, lambda: self.is_cancelled(db_id))
+
+                # Safely get native float values from yt-dlp
+                raw_speed = d.get('speed')
+                if raw_speed is not None:
+                    self.active_speeds[db_id] = float(raw_speed)
+
+                if dl_bytes is not None:
+                    self.active_downloaded[db_id] = float(dl_bytes)
+
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                percent = (dl_bytes or 0) / total * 100 if total else job.progress
+                self._set_live(job, status="Downloading", progress=percent,
+                               speed=float(raw_speed or 0), downloaded_bytes=dl_bytes or 0,
+                               speed_str=d.get('_speed_str', 'N/A').strip())
+
+            elif d['status'] == 'finished':
+                self.active_speeds.pop(db_id, None)
+                if db_id in self.active_downloaded:
+                    self.session_downloaded_finished += self.active_downloaded.pop(db_id, 0)
+                self._set_live(job, status="Finalizing/Converting...", progress=100.0)
+        return hook
+
+
+def main(argv=None):
+    """Console entry point: queue URLs and download them without a display."""
+    parser = argparse.ArgumentParser(description="Media Downloader Pro headless engine")
+    parser.add_argument("urls", nargs="*", help="video, playlist or channel URLs to queue")
+    parser.add_argument("--type", default="Video (Best Quality)", dest="media_type",
+                        help='queue format, e.g. "Audio (mp3 - 320k)", "Video (1080p)", "Thumb (jpg)"')
+    parser.add_argument("--range", default="Full Video", dest="time_range")
+    parser.add_argument("--workers", type=int, help="simultaneous downloads")
+    parser.add_argument("--folder", help="download folder")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="history database path")
+    parser.add_argument("--links", metavar="FILE", help="also queue the links in a .txt, .csv or .jsonl file")
+    parser.add_argument("--queued", action="store_true", help="also download items queued in earlier sessions")
+    parser.add_argument("--serve", action="store_true", help="serve the remote control UI and keep running")
+    parser.add_argument("--host", help="remote control bind address (default 0.0.0.0)")
+    parser.add_argument("--port", type=int, help="remote control port (default 5000)")
+    parser.add_argument("--trace", metavar="FILE", help="save this run's stage timelines as Chrome trace JSON")
+    args = parser.parse_args(argv)
+
+    engine = DownloadEngine(args.db)
+    if args.workers: engine.configure(concurrent_downloads=args.workers)
+    if args.folder: engine.configure(download_folder=args.folder)
+
+    done = threading.Event()
+    def on_event(event, payload):
+        if event == "status":
+            print(payload)
+        elif event == "job_updated" and payload.status.startswith(("Done", "Error", "Paused", "Stopped", "Retry")):
+            print(f"[{payload.status}] {payload.title}")
+        elif event == "batch_finished":
+            done.set()
+    engine.subscribe(on_event)
+
+    from batch_import import BatchImport, read_links, progress_text
+    links = itertools.chain(args.urls, read_links(args.links) if args.links else [])
+    batch = BatchImport(engine, links, args.time_range, args.media_type,
+                        on_progress=lambda stats: stats["finished"] and print(progress_text(stats))).start()
+    batch.wait()
+    new_ids = list(batch.job_ids)
+    if args.queued:
+        new_ids.extend(job.db_id for job in engine.list_jobs()
+                       if job.status not in ("Done", "File Missing") and job.db_id not in new_ids)
+    new_ids.extend(db_id for db_id in engine.recover() if db_id not in new_ids)
+
+    server = None
+    if args.serve:
+        from remote_server import RemoteServer, SERVER_AVAILABLE
+        if not SERVER_AVAILABLE:
+            parser.error("--serve requires flask")
+        server = RemoteServer(engine, host=args.host, port=args.port)
+        threading.Thread(target=server.run, daemon=True).start()
+        print(f"Remote Server started on {server.host}:{server.port}")
+
+    fetch_extractions = engine.counters.get("extract_info")
+    if new_ids:
+        engine.start(new_ids)
+    elif not args.serve:
+        print("Nothing to download.")
+        engine.close()
+        return 0
+    try:
+        while not done.is_set() or args.serve:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        engine.stop_all()
+    if server: server.stop()
+    if args.trace:
+        try:
+            print(f"Trace: {engine.export_trace(new_ids, args.trace)} spans written to {args.trace}")
+        except OSError as e:
+            print(f"Could not write trace: {e}")
+    engine.close()
+    counts = engine.counters.snapshot()
+    print(f"Extractions: {counts.get('extract_info', 0) - fetch_extractions} for "
+          f"{counts.get('download_jobs', 0)} downloads")
+    db = engine.db_stats()
+    print(f"Database: {db['writes']} writes in {db['transactions']} transactions, "
+          f"p95 commit latency {db['latency_p95_ms']:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Per-job stage timelines for Media Downloader Pro.
+
+Each stage run of a job records timestamped spans: time spent queued, the
+extraction, every file yt-dlp downloads, every postprocessor (merge, audio
+extraction, thumbnail embedding) and the final database update. The engine
+stores them in the job_spans table, where they can be shown for one job or
+exported as Chrome trace JSON (chrome://tracing, ui.perfetto.dev) for many.
+"""
+from contextlib import contextmanager
+import threading
+import json
+import time
+import os
+
+
+class JobTrace:
+    """Spans of one stage run of one job. Thread-safe: yt-dlp hooks may fire
+    from its fragment download threads."""
+    def __init__(self, db_id, stage, attempt=0):
+        self.db_id = db_id
+        self.stage = stage
+        self.attempt = attempt
+        self.lock = threading.Lock()
+        self.spans = []   # (name, started, finished, detail), wall clock seconds
+        self.open = {}    # key -> (name, started, detail)
+
+    def add(self, name, started, finished, detail=""):
+        with self.lock:
+            self.spans.append((name, started, finished, detail))
+
+    def begin(self, key, name, detail=""):
+        with self.lock:
+            if key not in self.open:
+                self.open[key] = (name, time.time(), detail)
+
+    def end(self, key, detail=None):
+        with self.lock:
+            name, started, opened_detail = self.open.pop(key, (None, 0, ""))
+            if name:
+                self.spans.append((name, started, time.time(), opened_detail if detail is None else detail))
+
+    @contextmanager
+    def span(self, name, detail=""):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, started, time.time(), detail)
+
+    # --- yt-dlp Hooks ---
+    def on_download(self, d):
+        """progress_hooks entry: one span per downloaded file."""
+        name = d.get('filename')
+        if d['status'] == 'downloading':
+            fmt = (d.get('info_dict') or {}).get('format_id')
+            self.begin(("download", name), "download", f"format {fmt}" if fmt else os.path.basename(name or ""))
+        elif d['status'] in ('finished', 'error'):
+            self.end(("download", name))
+
+    def on_postprocess(self, d):
+        """postprocessor_hooks entry: one span per postprocessor run."""
+        key = ("postprocess", d.get('postprocessor'))
+        if d['status'] == 'started':
+            self.begin(key, d.get('postprocessor') or "postprocessor")
+        elif d['status'] == 'finished':
+            self.end(key)
+
+    def rows(self):
+        """job_spans rows, closing spans the run abandoned (errors, cancels)."""
+        now = time.time()
+        with self.lock:
+            spans = self.spans + [(name, started, now, "interrupted") for name, started, _ in self.open.values()]
+            self.spans, self.open = [], {}
+        return [(self.db_id, self.attempt, self.stage, name, started, finished, detail)
+                for name, started, finished, detail in spans]
+
+
+def chrome_trace(spans, titles=None):
+    """Chrome trace JSON for span dicts from DownloadEngine.job_spans(). Each
+    job becomes one track, named after its title."""
+    titles = titles or {}
+    events = []
+    for db_id in sorted({s["job_id"] for s in spans}):
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": db_id,
+                       "args": {"name": f"#{db_id} {titles.get(db_id, '')}".strip()}})
+    for s in spans:
+        events.append({
+            "name": s["name"], "cat": s["stage"], "ph": "X", "pid": 1, "tid": s["job_id"],
+            "ts": round(s["started"] * 1e6), "dur": round((s["finished"] - s["started"]) * 1e6),
+            "args": {"attempt": s["attempt"], "detail": s["detail"]},
+        })
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+def timeline_text(spans):
+    """Plain-text timeline of one job's spans, offsets relative to its first span."""
+    if not spans: return "No timeline recorded yet."
+    origin = spans[0]["started"]
+    lines = []
+    for s in spans:
+        label = f"{s['stage']}/{s['name']}"
+        line = f"+{s['started'] - origin:8.2f}s  {s['finished'] - s['started']:8.2f}s  {label:<34} #{s['attempt']}"
+        lines.append(f"{line}  {s['detail']}" if s["detail"] else line)
+    return "\n".join(lines)
@@ -0,0 +1,135 @@
+"""On-disk yt-dlp metadata cache for Media Downloader Pro.
+
+Info dicts are stored as zlib-compressed JSON in the history database, keyed
+by extractor and video id, with a small in-memory LRU in front. Records older
+than the TTL are treated as missing and purged on startup.
+"""
+from collections import OrderedDict
+import copy
+import threading
+import sqlite3
+import json
+import zlib
+import time
+
+from yt_dlp import YoutubeDL
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MEMORY_ITEMS = 64
+
+
+def info_key(info):
+    """Cache key for an info dict or flat entry, e.g. 'Youtube:dQw4w9WgXcQ'."""
+    video_id = info.get('id')
+    if not video_id: return None
+    extractor = info.get('extractor_key') or info.get('ie_key') or 'Generic'
+    return f"{extractor}:{video_id}"
+
+
+class MetadataStore:
+    def __init__(self, db_path, ttl=DEFAULT_TTL, memory_items=DEFAULT_MEMORY_ITEMS, writer=None):
+        self.db_path = db_path
+        self.writer = writer  # DBWriter to queue writes on, or None to write directly
+        self.ttl = ttl
+        self.memory_items = memory_items
+        self.lock = threading.Lock()
+        self.memory = OrderedDict() # key -> (fetched, info)
+        self.url_keys = {}
+        self.init_db()
+
+    def init_db(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    url TEXT,
+                    full INTEGER,
+                    fetched REAL,
+                    data BLOB
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_metadata_url ON metadata (url)')
+            conn.execute('DELETE FROM metadata WHERE fetched < ?', (time.time() - self.ttl,))
+            conn.commit()
+
+    def _write(self, sql, seq):
+        if self.writer:
+            self.writer.submit_many(sql, seq)
+            return
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(sql, seq)
+            conn.commit()
+
+    # --- Memory Front ---
+    def _remember(self, key, url, fetched, info):
+        with self.lock:
+            self.memory[key] = (fetched, info)
+            self.memory.move_to_end(key)
+            if url: self.url_keys[url] = key
+            while len(self.memory) > self.memory_items:
+                old_key, _ = self.memory.popitem(last=False)
+                for u in [u for u, k in self.url_keys.items() if k == old_key]:
+                    del self.url_keys[u]
+
+    def _recall(self, url):
+        with self.lock:
+            key = self.url_keys.get(url)
+            if key not in self.memory: return None
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+    # --- Public API ---
+    def get(self, url, max_age=None, complete=False):
+        """Returns the cached info dict for url, or None if missing or older than
+        max_age seconds (defaults to the TTL). complete skips flat playlist entries.
+        The dict is a copy: yt-dlp processing changes the info it is given."""
+        if not url: return None
+        max_age = self.ttl if max_age is None else min(max_age, self.ttl)
+        cached = self._recall(url)
+        if cached is None:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute('SELECT key, fetched, data FROM metadata WHERE url=? ORDER BY full DESC, fetched DESC',
+                                   (url,)).fetchone()
+            if not row: return None
+            key, fetched, data = row
+            try:
+                info = json.loads(zlib.decompress(data))
+            except Exception:
+                return None
+            cached = (fetched, info)
+            self._remember(key, url, fetched, info)
+        fetched, info = cached
+        if time.time() - fetched > max_age: return None
+        if complete and info.get('_type', 'video') != 'video': return None
+        return copy.deepcopy(info)
+
+    def put(self, info, url=None):
+        """Caches a single info dict. url defaults to the dict's webpage URL."""
+        self.put_many([info], [url])
+
+    def put_many(self, infos, urls=None):
+        """Caches info dicts or flat entries in one transaction. A flat entry never
+        replaces a full extraction of the same video."""
+        rows = []
+        now = time.time()
+        for i, info in enumerate(infos):
+            key = info_key(info) if info else None
+            if not key: continue
+            url = (urls[i] if urls else None) or info.get('webpage_url') or info.get('url')
+            clean = YoutubeDL.sanitize_info(dict(info), remove_private_keys=True)
+            full = 1 if clean.get('_type') == 'video' else 0
+            rows.append((key, url, full, now, zlib.compress(json.dumps(clean).encode('utf-8'))))
+            if full: self._remember(key, url, now, clean)
+        if not rows: return
+        self._write('''
+            INSERT INTO metadata (key, url, full, fetched, data) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET url=excluded.url, full=excluded.full,
+                fetched=excluded.fetched, data=excluded.data
+            WHERE excluded.full >= metadata.full OR metadata.fetched < ?
+        ''', [row + (now - self.ttl,) for row in rows])
+
+    def clear(self):
+        self._write('DELETE FROM metadata', [()])
+        with self.lock:
+            self.memory.clear()
+            self.url_keys.clear()
@@ -0,0 +1,198 @@
+"""Prometheus metrics for Media Downloader Pro.
+
+EngineMetrics accumulates what the dashboard only shows live: bytes per host,
+stage latencies and retries. render() formats them, together with gauges read
+from the engine at scrape time (speeds, queue depth, worker use, database
+write latency), in the Prometheus text exposition format.
+"""
+from urllib.parse import urlparse
+import threading
+import bisect
+import re
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram upper bounds in seconds. Extraction is a few HTTP round trips;
+# downloads and conversions take seconds to an hour.
+EXTRACT_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TRANSFER_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+STAGE_BUCKETS = {"extract": EXTRACT_BUCKETS, "download": TRANSFER_BUCKETS, "postprocess": TRANSFER_BUCKETS}
+DB_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def copy(self):
+        other = Histogram(self.buckets)
+        other.counts, other.sum, other.count = list(self.counts), self.sum, self.count
+        return other
+
+
+class EngineMetrics:
+    """Counters and histograms the engine feeds from its workers. Thread-safe."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.host_bytes = {}  # host -> bytes received
+        self.stage_seconds = {stage: Histogram(buckets) for stage, buckets in STAGE_BUCKETS.items()}
+        self.retries = {}     # (stage, error class) -> retries queued
+        self.failures = {}    # error class -> jobs parked with an error
+
+    def add_bytes(self, host, nbytes):
+        with self.lock:
+            self.host_bytes[host] = self.host_bytes.get(host, 0) + nbytes
+
+    def observe(self, stage, seconds):
+        """Records one successful run of stage."""
+        with self.lock:
+            self.stage_seconds[stage].observe(seconds)
+
+    def retry(self, stage, kind):
+        with self.lock:
+            self.retries[(stage, kind)] = self.retries.get((stage, kind), 0) + 1
+
+    def failure(self, kind):
+        with self.lock:
+            self.failures[kind] = self.failures.get(kind, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "host_bytes": dict(self.host_bytes),
+                "stage_seconds": {stage: h.copy() for stage, h in self.stage_seconds.items()},
+                "retries": dict(self.retries),
+                "failures": dict(self.failures),
+            }
+
+
+# --- Exposition ---
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    if not labels: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value):
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Writer:
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help_text):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name, value, **labels):
+        self.lines.append(f"{name}{_labels(**labels)} {_number(value)}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def status_group(status):
+    """Bounded label for a job status: 'Retry 2/5 (Network)' -> 'Retry'."""
+    match = re.match(r"[A-Za-z]+", status or "")
+    return match.group(0) if match else "Other"
+
+
+def _host(job):
+    return (urlparse(job.url).hostname or "") if job else ""
+
+
+def render(engine, gauges=None):
+    """The engine's metrics in the Prometheus text format. gauges adds
+    {name: (help, value)} from the caller, e.g. the remote server's own state."""
+    snap = engine.metrics.snapshot()
+    out = _Writer()
+
+    # Throughput
+    host_speeds = {}
+    for db_id, speed in list(engine.active_speeds.items()):
+        host = _host(engine.get_job(db_id))
+        host_speeds[host] = host_speeds.get(host, 0.0) + speed
+    out.family("mdp_download_speed_bytes_per_second", "gauge", "Current download speed of all jobs.")
+    out.sample("mdp_download_speed_bytes_per_second", float(sum(host_speeds.values())))
+    out.family("mdp_host_download_speed_bytes_per_second", "gauge", "Current download speed per host.")
+    for host, speed in sorted(host_speeds.items()):
+        out.sample("mdp_host_download_speed_bytes_per_second", float(speed), host=host)
+    out.family("mdp_downloaded_bytes_total", "counter", "Bytes received since start.")
+    out.sample("mdp_downloaded_bytes_total", sum(snap["host_bytes"].values()))
+    out.family("mdp_host_downloaded_bytes_total", "counter", "Bytes received since start, per host.")
+    for host, nbytes in sorted(snap["host_bytes"].items()):
+        out.sample("mdp_host_downloaded_bytes_total", nbytes, host=host)
+
+    # Queue
+    groups = {}
+    for job in engine.list_jobs():
+        group = status_group(job.status)
+        groups[group] = groups.get(group, 0) + 1
+    out.family("mdp_jobs", "gauge", "Jobs in the queue by status.")
+    for group, count in sorted(groups.items()):
+        out.sample("mdp_jobs", count, status=group)
+
+    # Workers
+    stats = engine.pipeline_stats()
+    out.family("mdp_stage_pending_jobs", "gauge", "Jobs waiting for a worker.")
+    for stage, s in stats.items():
+        out.sample("mdp_stage_pending_jobs", s["pending"], stage=stage)
+    out.family("mdp_stage_workers", "gauge", "Worker pool size.")
+    for stage, s in stats.items():
+        out.sample("mdp_stage_workers", s["workers"], stage=stage)
+    out.family("mdp_stage_busy_workers", "gauge", "Workers running a job.")
+    for stage, s in stats.items():
+        out.sample("mdp_stage_busy_workers", s["running"], stage=stage)
+    out.family("mdp_stage_busy_seconds_total", "counter",
+               "Worker time spent on jobs; rate() over mdp_stage_workers is utilization.")
+    for stage, s in stats.items():
+        out.sample("mdp_stage_busy_seconds_total", round(s["busy_seconds"], 3), stage=stage)
+
+    # Latency and retries
+    out.family("mdp_stage_duration_seconds", "histogram", "Duration of successful stage runs.")
+    for stage, hist in snap["stage_seconds"].items():
+        cumulative = 0
+        for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+            cumulative += count
+            out.sample("mdp_stage_duration_seconds_bucket", cumulative, stage=stage, le=_number(float(bound)))
+        out.sample("mdp_stage_duration_seconds_sum", round(hist.sum, 6), stage=stage)
+        out.sample("mdp_stage_duration_seconds_count", hist.count, stage=stage)
+    out.family("mdp_retries_total", "counter", "Failed attempts queued for a retry.")
+    for (stage, kind), count in sorted(snap["retries"].items()):
+        out.sample("mdp_retries_total", count, stage=stage, reason=kind)
+    out.family("mdp_job_failures_total", "counter", "Jobs parked with an error.")
+    for kind, count in sorted(snap["failures"].items()):
+        out.sample("mdp_job_failures_total", count, reason=kind)
+
+    # Database
+    db = engine.db_stats()
+    out.family("mdp_db_write_latency_seconds", "summary",
+               "Time from queueing a write to its commit, over recent writes.")
+    for q in DB_QUANTILES:
+        out.sample("mdp_db_write_latency_seconds", db["latency_quantiles_ms"][q] / 1000, quantile=str(q))
+    out.sample("mdp_db_write_latency_seconds_sum", round(db["latency_total_ms"] / 1000, 6))
+    out.sample("mdp_db_write_latency_seconds_count", db["writes"])
+    out.family("mdp_db_transactions_total", "counter", "Committed write transactions.")
+    out.sample("mdp_db_transactions_total", db["transactions"])
+    out.family("mdp_db_write_failures_total", "counter", "Writes that failed.")
+    out.sample("mdp_db_write_failures_total", db["failures"])
+    out.family("mdp_db_pending_writes", "gauge", "Writes waiting for the writer thread.")
+    out.sample("mdp_db_pending_writes", db["pending"])
+
+    for name, (help_text, value) in (gauges or {}).items():
+        out.family(name, "gauge", help_text)
+        out.sample(name, value)
+    return out.text()
@@ -0,0 +1,502 @@
+"""Remote control web server for Media Downloader Pro.
+
+A thin subscriber of the DownloadEngine: it serves the phone UI and maps
+HTTP actions onto engine calls, so it works the same under the CTk window
+and the headless daemon.
+"""
+import logging
+import threading
+import queue
+import gzip
+import json
+import time
+
+from metrics import render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+try:
+    from flask import Flask, Response, request, jsonify, render_template_string
+    from werkzeug.serving import make_server
+    SERVER_AVAILABLE = True
+except ImportError:
+    SERVER_AVAILABLE = False
+
+try:
+    from waitress import create_server
+    WAITRESS_AVAILABLE = True
+except ImportError:
+    WAITRESS_AVAILABLE = False
+
+# Serving
+REMOTE_THREADS = 8             # request workers; bounded so phones cannot starve downloads
+REMOTE_CONNECTION_LIMIT = 100  # open sockets before new ones wait
+GZIP_MIN_SIZE = 512            # smaller bodies are sent as-is
+
+# Push channel (/api/events)
+SSE_MIN_INTERVAL = 0.25  # seconds between events to one client
+SSE_HEARTBEAT = 15       # seconds of silence before a keep-alive comment
+SSE_RETRY_MS = 3000      # browser reconnect delay
+SSE_MAX_STREAMS = REMOTE_THREADS - 2  # each stream holds a worker; the rest poll
+SSE_MAX_AGE = 300        # seconds before a stream ends; the browser resumes it
+
+# REST listing and bulk endpoints
+PAGE_DEFAULT = 100
+PAGE_MAX = 1000
+BULK_MAX_IDS = 10000
+INGEST_WORKERS = 2       # URLs fetched at once
+INGEST_CAPACITY = 500    # URLs waiting to be fetched before callers get 429
+BULK_ACTIONS = ("start", "pause", "resume", "remove", "prioritize")
+
+# --- HTML TEMPLATE FOR REMOTE ---
+REMOTE_HTML = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
+    <title>MDP Remote</title>
+    <style>
+        :root { --bg: #0F0F14; --panel: #1A1A24; --accent: #2196F3; --text: #FFFFFF; --text-dim: #A0A0A0; --danger: #F44336; --success: #4CAF50;}
+        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; background: var(--bg); color: var(--text); margin: 0; padding: 15px; }
+        .header { text-align: center; margin-bottom: 20px; }
+        .header h2 { margin: 0; font-size: 22px; color: var(--accent); }
+        .card { background: var(--panel); border-radius: 12px; padding: 15px; margin-bottom: 15px; box-shadow: 0 4px 6px rgba(0,0,0,0.3); }
+        input[type="text"] { width: 100%; box-sizing: border-box; padding: 12px; border-radius: 8px; border: 1px solid #333; background: #000; color: #fff; margin-bottom: 10px; font-size: 16px; }
+        button { background: var(--accent); color: white; border: none; padding: 12px; border-radius: 8px; font-size: 16px; font-weight: bold; width: 100%; cursor: pointer; transition: 0.2s; }
+        button:active { opacity: 0.8; }
+        .btn-group { display: flex; gap: 10px; margin-top: 10px; }
+        .btn-danger { background: var(--danger); }
+        .btn-success { background: var(--success); }
+        .item { border-bottom: 1px solid #333; padding: 12px 0; }
+        .item:last-child { border-bottom: none; }
+        .item-title { font-weight: 500; font-size: 14px; margin-bottom: 5px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; display: block; }
+        .item-meta { font-size: 12px; color: var(--text-dim); display: flex; justify-content: space-between; }
+        .progress-bar { height: 4px; background: #333; border-radius: 2px; margin-top: 8px; overflow: hidden; }
+        .progress-fill { height: 100%; background: var(--accent); width: 0%; transition: width 0.3s; }
+        .status-badge { font-size: 10px; padding: 2px 6px; border-radius: 4px; background: #333; }
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h2>🚀 Media Downloader Pro</h2>
+        <div id="global_status" style="font-size: 12px; color: var(--text-dim); margin-top: 5px;">Connecting...</div>
+    </div>
+    
+    <div class="card">
+        <input type="text" id="url_input" placeholder="Paste YouTube link here...">
+        <button onclick="addLink()">🔗 Add Download</button>
+    </div>
+    
+    <div class="card">
+        <div style="font-size: 14px; font-weight: bold; margin-bottom: 10px;">Control Panel</div>
+        <div class="btn-group">
+            <button class="btn-success" onclick="sendCommand('resume_all')">⏵ Resume</button>
+            <button style="background: #FF9800;" onclick="sendCommand('pause_all')">⏸ Pause</button>
+            <button class="btn-danger" onclick="sendCommand('stop_all')">⏹ Stop</button>
+        </div>
+    </div>
+
+    <div class="card" id="queue_container" style="display: none;">
+        <div style="font-size: 14px; font-weight: bold; margin-bottom: 10px;">📁 Queue</div>
+        <div id="items_list"></div>
+    </div>
+
+    <script>
+        function sendCommand(cmd, item_id=null, url=null) {
+            fetch('/api/action', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({command: cmd, item_id: item_id, url: url})
+            });
+        }
+        
+        function addLink() {
+            const input = document.getElementById('url_input');
+            const url = input.value.trim();
+            if (url) {
+                sendCommand('add_link', null, url);
+                input.value = ''; // clear
+            }
+        }
+
+        // Jobs by id, kept current from /api/events (or /api/status) deltas
+        let jobs = new Map();
+        let version = null;
+
+        function setText(el, text) {
+            if (el.textContent !== text) el.textContent = text;
+        }
+
+        function itemNode(id) {
+            let node = document.getElementById(`item-${id}`);
+            if (node) return node;
+            node = document.createElement('div');
+            node.className = 'item';
+            node.id = `item-${id}`;
+            node.dataset.id = id;
+            node.innerHTML = `
+                <div class="item-title"></div>
+                <div class="item-meta">
+                    <span class="item-size"></span>
+                    <div style="display: flex; align-items: center;">
+                        <span class="status-badge"></span>
+                        <span class="item-action"></span>
+                    </div>
+                </div>
+                <div class="progress-bar"><div class="progress-fill"></div></div>`;
+            // Keep queue order: new jobs almost always go last
+            const list = document.getElementById('items_list');
+            let next = null;
+            for (let el = list.lastElementChild; el && Number(el.dataset.id) > id; el = el.previousElementSibling) next = el;
+            list.insertBefore(node, next);
+            return node;
+        }
+
+        function patchItem(item) {
+            const node = itemNode(item.id);
+            const isDone = item.status.includes('Done');
+            const isError = item.status.includes('Error');
+            const isDownloading = item.status.includes('Downloading');
+            const color = isDone ? 'var(--success)' : (isError ? 'var(--danger)' : 'var(--accent)');
+
+            setText(node.querySelector('.item-title'), item.title || 'Fetching...');
+            setText(node.querySelector('.item-size'), item.size || '---');
+            const badge = node.querySelector('.status-badge');
+            setText(badge, item.status);
+            if (badge.style.color !== color) badge.style.color = color;
+            const fill = node.querySelector('.progress-fill');
+            const width = `${item.progress}%`;
+            if (fill.style.width !== width) fill.style.width = width;
+            if (fill.style.background !== color) fill.style.background = color;
+
+            const action = isDone || isError ? '' : (isDownloading ? 'pause' : 'resume');
+            const slot = node.querySelector('.item-action');
+            if (slot.dataset.action !== action) {
+                slot.dataset.action = action;
+                slot.innerHTML = !action ? '' : (action === 'pause'
+                    ? `<button onclick="sendCommand('pause_item', '${item.id}')" style="width: auto; padding: 4px 10px; font-size: 10px; background: #FF9800; margin-left: 5px;">⏸</button>`
+                    : `<button onclick="sendCommand('resume_item', '${item.id}')" style="width: auto; padding: 4px 10px; font-size: 10px; background: var(--success); margin-left: 5px;">⏵</button>`);
+            }
+        }
+
+        function applyDelta(data) {
+            if (data.full) {
+                const ids = new Set(data.items.map(item => item.id));
+                jobs.forEach((_, id) => { if (!ids.has(id)) data.removed.push(id); });
+                jobs = new Map();
+            }
+            data.items.forEach(item => { jobs.set(item.id, item); patchItem(item); });
+            data.removed.forEach(id => {
+                jobs.delete(id);
+                const node = document.getElementById(`item-${id}`);
+                if (node) node.remove();
+            });
+            version = data.version;
+            setText(document.getElementById('global_status'), data.global_status || 'Ready');
+            document.getElementById('queue_container').style.display = jobs.size ? 'block' : 'none';
+        }
+
+        async function updateStatus() {
+            try {
+                const res = version === null ? await fetch('/api/status')
+                    : await fetch(`/api/status?since=${version}`, {headers: {'If-None-Match': `"${version}"`}});
+                if (res.status === 304) return; // nothing changed
+                applyDelta(await res.json());
+            } catch (e) {
+                document.getElementById('global_status').innerText = 'Connection Lost';
+            }
+        }
+
+        if (window.EventSource) {
+            // The server pushes deltas as they happen. On reconnect the browser sends
+            // Last-Event-ID, so the stream resumes from the last version we applied.
+            const events = new EventSource('/api/events');
+            events.onmessage = e => applyDelta(JSON.parse(e.data));
+            events.onerror = () => {
+                if (events.readyState === EventSource.CLOSED) {
+                    // Refused (every stream slot busy): poll instead
+                    setInterval(updateStatus, 1500);
+                    updateStatus();
+                } else {
+                    setText(document.getElementById('global_status'), 'Reconnecting...');
+                }
+            };
+        } else {
+            // Poll every 1.5 seconds
+            setInterval(updateStatus, 1500);
+            updateStatus(); // Initial call
+        }
+    </script>
+</body>
+</html>
+"""
+
+class IngestQueue:
+    """Bounded queue of URLs that a few workers fetch and add to the engine.
+    put_many accepts only what fits, so a flood of links gets pushed back to the
+    caller instead of piling up as threads."""
+    def __init__(self, engine, workers=INGEST_WORKERS, capacity=INGEST_CAPACITY):
+        self.engine = engine
+        self.queue = queue.Queue(capacity)
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.added = 0
+        self.failed = 0
+        for _ in range(workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def put_many(self, urls, time_range="Full Video", media_type="Video (Best Quality)"):
+        """Queues as many of urls as fit. Returns how many were accepted."""
+        accepted = 0
+        for url in urls:
+            try:
+                self.queue.put_nowait((url, time_range, media_type))
+            except queue.Full:
+                break
+            accepted += 1
+        return accepted
+
+    def stats(self):
+        return {"pending": self.queue.qsize(), "capacity": self.capacity,
+                "added": self.added, "failed": self.failed}
+
+    def _worker(self):
+        while True:
+            url, time_range, media_type = self.queue.get()
+            try:
+                _, entries = self.engine.fetch(url)
+                added = len(self.engine.add_entries(entries, time_range, media_type))
+                with self.lock:
+                    self.added += added
+            except Exception as e:
+                with self.lock:
+                    self.failed += 1
+                print(f"Remote add failed for {url}: {e}")
+
+
+class RemoteServer:
+    def __init__(self, engine, on_add_link=None, host=None, port=None):
+        self.engine = engine
+        # Called with the URL for 'add_link'; defaults to queueing every entry headlessly
+        self.on_add_link = on_add_link or self._add_link
+        self.host = host or engine.settings["remote_host"]
+        self.port = port or engine.settings["remote_port"]
+        self.server = None
+        self.thread = None  # the one running run()
+        self.stopping = threading.Event()
+        self.streams = 0
+        self.streams_lock = threading.Lock()
+        self.ingest = IngestQueue(engine)
+        self.flask_app = Flask(__name__)
+        self.setup_routes()
+
+    def _add_link(self, url):
+        if not self.ingest.put_many([url]):
+            print(f"Remote add dropped, ingest queue full: {url}")
+
+    def setup_routes(self):
+        @self.flask_app.after_request
+        def compress(response):
+            """gzips HTML and JSON for clients that accept it."""
+            if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+                    or response.mimetype not in ('text/html', 'application/json')
+                    or 'gzip' not in request.headers.get('Accept-Encoding', '')):
+                return response
+            data = response.get_data()
+            if len(data) < GZIP_MIN_SIZE: return response
+            response.set_data(gzip.compress(data, compresslevel=5))
+            response.headers['Content-Encoding'] = 'gzip'
+            response.vary.add('Accept-Encoding')
+            return response
+
+        @self.flask_app.route('/')
+        def index():
+            return render_template_string(REMOTE_HTML)
+
+        @self.flask_app.route('/api/status')
+        def status():
+            """Job state from the engine's snapshot store. ?since=<version> returns only
+            what changed after that version; an unchanged version answers 304."""
+            snapshots = self.engine.snapshots
+            etag = str(snapshots.current_version())
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                since = request.args.get('since', type=int)
+                response = jsonify(snapshots.full() if since is None else snapshots.since(since))
+            response.set_etag(etag, weak=True) # the gzipped body is equivalent, not identical
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        @self.flask_app.route('/api/events')
+        def events():
+            """Server-Sent Events stream of /api/status deltas. Each event's id is its
+            version, so a reconnecting EventSource resumes via Last-Event-ID."""
+            snapshots = self.engine.snapshots
+            resume = request.headers.get('Last-Event-ID', type=int)
+            if resume is None: resume = request.args.get('since', type=int)
+            with self.streams_lock:
+                if self.streams >= SSE_MAX_STREAMS:
+                    # All stream slots taken: the page falls back to polling /api/status
+                    return Response("Too many live dashboards", status=503, headers={'Retry-After': '30'})
+                self.streams += 1
+
+            def stream(version):
+                yield f"retry: {SSE_RETRY_MS}\n\n"
+                ends = time.time() + SSE_MAX_AGE
+                while not self.stopping.is_set() and time.time() < ends:
+                    if version != snapshots.current_version():
+                        payload = snapshots.full() if version is None else snapshots.since(version)
+                        version = payload["version"]
+                        yield f"id: {version}\ndata: {json.dumps(payload)}\n\n"
+                        time.sleep(SSE_MIN_INTERVAL) # coalesce bursts of progress into one event
+                    elif not snapshots.wait(version, SSE_HEARTBEAT, self.stopping):
+                        yield ": heartbeat\n\n" # keeps proxies and phones from dropping the stream
+
+            released = []
+            def release():
+                # The server closes the response even if the stream never started
+                with self.streams_lock:
+                    if not released:
+                        released.append(True)
+                        self.streams -= 1
+
+            response = Response(stream(resume), mimetype='text/event-stream')
+            response.call_on_close(release)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
+
+        @self.flask_app.route('/api/jobs')
+        def list_jobs():
+            """One page of jobs in queue order.
+            ?status=Downloading,Error  only jobs whose status starts with one of these
+            ?fields=id,progress        only these keys of each job
+            ?limit=50&after=<id>       page size and the last id of the previous page"""
+            snapshot = self.engine.snapshots.full()
+            items = snapshot["items"]
+            statuses = tuple(s for s in request.args.get('status', '').split(',') if s)
+            fields = [f for f in request.args.get('fields', '').split(',') if f]
+            limit = request.args.get('limit', PAGE_DEFAULT, type=int)
+            after = request.args.get('after', type=int)
+            if items and fields and not set(fields) <= set(items[0]):
+                return jsonify({"error": f"unknown fields: {', '.join(sorted(set(fields) - set(items[0])))}"}), 400
+            if not 1 <= limit <= PAGE_MAX:
+                return jsonify({"error": f"limit must be 1-{PAGE_MAX}"}), 400
+
+            if statuses: items = [item for item in items if item["status"].startswith(statuses)]
+            total = len(items)
+            if after is not None: items = [item for item in items if item["id"] > after]
+            page = items[:limit]
+            next_after = page[-1]["id"] if len(items) > limit else None
+            if fields: page = [{f: item[f] for f in fields} for item in page]
+            return jsonify({"version": snapshot["version"], "total": total, "items": page, "next": next_after})
+
+        @self.flask_app.route('/api/jobs', methods=['POST'])
+        def add_jobs():
+            """Queues many URLs: {"urls": [...], "media_type": ..., "time_range": ...}.
+            Answers 202 with the number accepted, or 429 once the ingest queue is full."""
+            data = request.get_json(silent=True) or {}
+            urls = [u.strip() for u in data.get('urls', []) if isinstance(u, str) and u.strip()]
+            if not urls:
+                return jsonify({"error": "urls must be a non-empty list"}), 400
+            accepted = self.ingest.put_many(urls, data.get('time_range', "Full Video"),
+                                            data.get('media_type', "Video (Best Quality)"))
+            body = dict(self.ingest.stats(), accepted=accepted, rejected=len(urls) - accepted)
+            if accepted < len(urls):
+                return jsonify(body), 429, {'Retry-After': '10'}
+            return jsonify(body), 202
+
+        @self.flask_app.route('/api/jobs/actions', methods=['POST'])
+        def bulk_action():
+            """Applies one action to many jobs: {"action": "pause", "ids": [1, 2, 3]}."""
+            data = request.get_json(silent=True) or {}
+            action, ids = data.get('action'), data.get('ids')
+            if action not in BULK_ACTIONS:
+                return jsonify({"error": f"action must be one of {', '.join(BULK_ACTIONS)}"}), 400
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids) or len(ids) > BULK_MAX_IDS:
+                return jsonify({"error": f"ids must be a list of at most {BULK_MAX_IDS} integers"}), 400
+            engine = self.engine
+            ids = [i for i in ids if engine.get_job(i)]
+            if action == 'start': engine.start(ids)
+            elif action == 'pause': engine.pause(ids)
+            elif action == 'resume': engine.resume(ids)
+            elif action == 'remove': engine.remove_jobs(ids)
+            elif action == 'prioritize': engine.prioritize(ids)
+            return jsonify({"action": action, "applied": len(ids)})
+
+        @self.flask_app.route('/metrics')
+        def metrics():
+            """Prometheus scrape target."""
+            ingest = self.ingest.stats()
+            text = render_metrics(self.engine, gauges={
+                "mdp_ingest_pending_urls": ("URLs queued through the API awaiting extraction.", ingest["pending"]),
+                "mdp_remote_event_streams": ("Open /api/events streams.", self.streams),
+            })
+            return Response(text, mimetype=METRICS_CONTENT_TYPE)
+
+        @self.flask_app.route('/api/action', methods=['POST'])
+        def action():
+            data = request.json
+            cmd = data.get('command')
+            item_id = data.get('item_id') # Optional, for specific item
+            engine = self.engine
+            jobs = engine.list_jobs()
+
+            if cmd == 'stop_all': engine.stop_all()
+            elif cmd == 'pause_all':
+                engine.pause([j.db_id for j in jobs if j.status in ("Starting...", "Downloading")])
+            elif cmd == 'resume_all':
+                engine.resume([j.db_id for j in jobs if j.status.startswith(("Paused", "Queued", "Error", "Stopped", "Interrupted"))])
+            elif cmd == 'pause_item' and item_id:
+                engine.pause([int(item_id)])
+            elif cmd == 'resume_item' and item_id:
+                engine.resume([int(item_id)])
+            elif cmd == 'add_link':
+                url = data.get('url')
+                if url: self.on_add_link(url)
+            return jsonify({"status": "ok"})
+
+    def run(self):
+        """Serves until stop(). Uses waitress's bounded worker pool when installed,
+        otherwise Werkzeug's threaded server. Binds 0.0.0.0 by default for LAN access."""
+        log = logging.getLogger('werkzeug')
+        log.setLevel(logging.ERROR) # Quiet the output
+        try:
+            if WAITRESS_AVAILABLE:
+                self.server = create_server(self.flask_app, host=self.host, port=self.port,
+                                            threads=REMOTE_THREADS, connection_limit=REMOTE_CONNECTION_LIMIT,
+                                            channel_timeout=SSE_HEARTBEAT * 4, ident="Media Downloader Pro")
+            else:
+                self.server = make_server(self.host, self.port, self.flask_app, threaded=True)
+        except OSError as e:
+            print(f"Remote server could not listen on {self.host}:{self.port}: {e}")
+            return
+        if self.stopping.is_set(): return
+        self.thread = threading.current_thread()
+        if WAITRESS_AVAILABLE:
+            self.server.run()
+        else:
+            self.server.serve_forever()
+
+    def stop(self):
+        """Ends live event streams, closes every connection and waits for run() to return."""
+        self.stopping.set()
+        self.engine.snapshots.wake()
+        # Let the streams send their last chunk before the sockets close
+        deadline = time.time() + 2
+        while self.streams and time.time() < deadline:
+            time.sleep(0.05)
+        server = self.server
+        if not server: return
+        if WAITRESS_AVAILABLE:
+            # close() only drops the listener; run() keeps looping while any client
+            # connection is open, so close them all on the server's own thread
+            def close_all():
+                for channel in list(server._map.values()):
+                    channel.close()
+            server.trigger.pull_trigger(close_all)
+            server.task_dispatcher.shutdown()
+        else:
+            server.shutdown()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(5)
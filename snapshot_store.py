@@ -0,0 +1,117 @@
+"""Versioned job state for Media Downloader Pro's remote API.
+
+The store subscribes to a DownloadEngine and records the version at which
+each job last changed. Readers get immutable snapshots: the full job list,
+built at most once per version, or just the jobs changed and removed since
+a version the client already has. Polling clients can then be answered with
+a 304 or a small diff instead of the whole queue.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+MAX_TOMBSTONES = 10000  # removed ids remembered for deltas; older clients get a full list
+
+
+class SnapshotStore:
+    def __init__(self, engine):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)  # notified on every new version
+        # Start from the clock so versions a client kept from an earlier session
+        # fall below the floor and get a full list instead of a wrong diff
+        self.version = int(time.time() * 1000000)
+        self.floor = 0                  # deltas can only start at or after this version
+        self.items = {}                 # db_id -> job dict, never mutated once stored
+        self.changed = OrderedDict()    # db_id -> version it last changed, oldest first
+        self.removed = OrderedDict()    # db_id -> version it was removed, oldest first
+        self.globals = {}
+        self.full_cache = None
+        self._reload()
+        engine.subscribe(self.on_event)
+
+    # --- Engine Events ---
+    def on_event(self, event, payload):
+        with self.lock:
+            self.version += 1
+            if event in ("job_added", "job_updated"):
+                self._touch(payload)
+            elif event == "jobs_updated":
+                for job in payload:
+                    self._touch(job)
+            elif event == "job_removed":
+                self.items.pop(payload.db_id, None)
+                self.changed.pop(payload.db_id, None)
+                self.removed[payload.db_id] = self.version
+                while len(self.removed) > MAX_TOMBSTONES:
+                    _, self.floor = self.removed.popitem(last=False)
+            elif event == "jobs_reloaded":
+                self._reload()
+            self._update_globals()
+            self.cond.notify_all()
+
+    def _touch(self, job):
+        if self.engine.get_job(job.db_id) is not job: return  # late progress for a removed job
+        self.items[job.db_id] = job.to_dict()
+        self.changed[job.db_id] = self.version
+        self.changed.move_to_end(job.db_id)
+        self.removed.pop(job.db_id, None)
+
+    def _reload(self):
+        jobs = self.engine.list_jobs()
+        self.items = {job.db_id: job.to_dict() for job in jobs}
+        self.changed = OrderedDict((job.db_id, self.version) for job in jobs)
+        self.removed.clear()
+        self.floor = self.version
+        self._update_globals()
+
+    def _update_globals(self):
+        total = self.engine.total_items
+        self.globals = {
+            "global_progress": self.engine.completed_items / total if total else 0,
+            "global_status": self.engine.status_text,
+        }
+
+    # --- Readers ---
+    def current_version(self):
+        return self.version
+
+    def wait(self, version, timeout=None, stop=None):
+        """Blocks until the store moves past version or the stop Event is set.
+        Returns False on timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.version != version or (stop and stop.is_set()), timeout)
+
+    def wake(self):
+        """Releases every wait() so callers can re-check their stop Event."""
+        with self.cond:
+            self.cond.notify_all()
+
+    def full(self):
+        """Every job at the current version, in queue order."""
+        with self.lock:
+            if self.full_cache is None or self.full_cache["version"] != self.version:
+                self.full_cache = dict(self.globals, version=self.version, full=True,
+                                       items=list(self.items.values()), removed=[])
+            return self.full_cache
+
+    def since(self, version):
+        """Jobs changed and ids removed after version. Falls back to the full list
+        when version is too old (or from another session) to diff against."""
+        with self.lock:
+            if not self.floor <= version <= self.version:
+                stale = True
+            else:
+                stale = False
+                items = []
+                for db_id, changed_at in reversed(self.changed.items()):
+                    if changed_at <= version: break
+                    items.append(self.items[db_id])
+                items.reverse()
+                removed = []
+                for db_id, removed_at in reversed(self.removed.items()):
+                    if removed_at <= version: break
+                    removed.append(db_id)
+                delta = dict(self.globals, version=self.version, full=False, since=version,
+                             items=items, removed=removed)
+        return self.full() if stale else delta
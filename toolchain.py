@@ -0,0 +1,155 @@
+"""FFmpeg toolchain discovery for Media Downloader Pro.
+
+Finds ffmpeg and ffprobe once, asks ffmpeg for its version, encoders and
+muxers, and caches the answer on disk keyed by the binary's path, size and
+mtime. Later runs (and every worker in this one) reuse it without spawning
+ffmpeg again; replacing the binary invalidates the cache.
+"""
+import threading
+import subprocess
+import shutil
+import json
+import sys
+import os
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def user_cache_dir():
+    """Per-user cache folder. Unlike APP_DIR it survives updates and one-file
+    builds, which unpack to a new temporary folder on every launch."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+        return os.path.join(base, "Media Downloader Pro")
+    if sys.platform == "darwin":
+        return os.path.join(os.path.expanduser("~"), "Library", "Caches", "Media Downloader Pro")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "media-downloader-pro")
+
+
+TOOLCHAIN_CACHE_PATH = os.path.join(user_cache_dir(), "toolchain_cache.json")
+
+# Encoder yt-dlp's FFmpegExtractAudio needs for each audio target
+AUDIO_ENCODERS = {"mp3": "libmp3lame", "m4a": "aac", "wav": "pcm_s16le", "opus": "libopus", "flac": "flac"}
+
+
+class Toolchain:
+    """What the local FFmpeg install can do."""
+    def __init__(self, ffmpeg=None, ffprobe=None, version="", encoders=(), muxers=()):
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.version = version
+        self.encoders = set(encoders)
+        self.muxers = set(muxers)
+        self.key = None  # binary path|size|mtime this probe belongs to
+
+    def can_encode(self, codec):
+        return codec in self.encoders
+
+    def can_mux(self, fmt):
+        return fmt in self.muxers
+
+    def to_dict(self):
+        return {"ffmpeg": self.ffmpeg, "ffprobe": self.ffprobe, "version": self.version,
+                "encoders": sorted(self.encoders), "muxers": sorted(self.muxers)}
+
+
+def find_binary(name):
+    """Path of name (e.g. 'ffmpeg') next to the app, in bin/ or ffmpeg/, or on PATH."""
+    base_dir = sys._MEIPASS if hasattr(sys, '_MEIPASS') else APP_DIR
+
+    # Priority: 1. Application Directory, 2. 'bin' subdirectory
+    for path in (base_dir, os.path.join(base_dir, 'bin'), os.path.join(base_dir, 'ffmpeg')):
+        for exe_name in (name + '.exe', name):
+            exe = os.path.join(path, exe_name)
+            if os.path.isfile(exe):
+                return os.path.abspath(exe)
+
+    # Check system PATH without spawning anything
+    found = shutil.which(name)
+    return os.path.abspath(found) if found else None
+
+
+def _binary_key(path):
+    st = os.stat(path)
+    return f"{os.path.realpath(path)}|{st.st_size}|{int(st.st_mtime)}"
+
+
+def _run(args):
+    flags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+    return subprocess.run(args, capture_output=True, text=True, errors='replace',
+                          creationflags=flags, timeout=30).stdout
+
+
+def _parse_table(output):
+    """Names from `ffmpeg -encoders` / `-muxers` listings (flags column, then name)."""
+    names = []
+    in_table = False
+    for line in output.splitlines():
+        if line.strip().startswith("--"):
+            in_table = True
+            continue
+        parts = line.split()
+        if in_table and len(parts) >= 2:
+            names.extend(parts[1].split(","))
+    return names
+
+
+def _probe(ffmpeg):
+    version_line = _run([ffmpeg, '-hide_banner', '-version']).splitlines()
+    return Toolchain(
+        ffmpeg=ffmpeg,
+        ffprobe=find_binary('ffprobe'),
+        version=version_line[0] if version_line else "",
+        encoders=_parse_table(_run([ffmpeg, '-hide_banner', '-encoders'])),
+        muxers=_parse_table(_run([ffmpeg, '-hide_banner', '-muxers'])),
+    )
+
+
+_lock = threading.Lock()
+_memo = None
+
+
+def probe_toolchain(refresh=False, cache_path=TOOLCHAIN_CACHE_PATH):
+    """Returns the Toolchain, probing ffmpeg only if the binary changed since the
+    cached probe. Safe to call from any worker; the result is memoized."""
+    global _memo
+    with _lock:
+        ffmpeg = find_binary('ffmpeg')
+        if not ffmpeg:
+            _memo = Toolchain()
+            return _memo
+        try:
+            key = _binary_key(ffmpeg)
+        except OSError:
+            key = None
+        if _memo is not None and not refresh and _memo.key == key:
+            return _memo
+
+        cache = {}
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, encoding='utf-8') as f:
+                    cache = json.load(f)
+            except (OSError, ValueError):
+                cache = {}
+
+        if key and not refresh and key in cache:
+            toolchain = Toolchain(**cache[key])
+        else:
+            try:
+                toolchain = _probe(ffmpeg)
+            except (OSError, subprocess.SubprocessError) as e:
+                print(f"FFmpeg probe failed: {e}")
+                toolchain = Toolchain(ffmpeg=ffmpeg, ffprobe=find_binary('ffprobe'))
+            if key:
+                cache = {key: toolchain.to_dict()}  # stale binaries drop out
+                try:
+                    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                    with open(cache_path, 'w', encoding='utf-8') as f:
+                        json.dump(cache, f)
+                except OSError as e:
+                    print(f"Could not save toolchain cache: {e}")
+        toolchain.key = key
+        _memo = toolchain
+        return toolchain